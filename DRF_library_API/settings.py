@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 
 from pathlib import Path
 from dotenv import load_dotenv
+from importlib.util import find_spec
 import os
 
 from datetime import timedelta
@@ -48,21 +49,33 @@ INSTALLED_APPS = [
 
     'books',
     'accounts',
+    'api',
+    'tasks',
    
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
+    'api.throttling.AdmissionControlMiddleware',
+    'api.replicas.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.LoginUnavailableMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'DRF_library_API.urls'
 
+# Serve the catalogue read endpoints with the async views in api.async_views. Only worth it
+# under asgi.py when the database or cache is slow to answer: otherwise the thread hops cost
+# more than they save (see `manage.py benchmark_concurrency`). Under WSGI every async view
+# would need its own event loop, so leave it off there.
+API_ASYNC_VIEWS = os.environ.get("API_ASYNC_VIEWS", "0") == "1"
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -81,17 +94,131 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'DRF_library_API.wsgi.application'
 
+TEST_RUNNER = 'DRF_library_API.test_runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before reuse. asgi.py turns
+# persistence off: async requests hop between threads and would each leave one behind.
+#
+# DATABASE_REPLICA_NAME adds a "replica" alias with the same engine, which api.replicas
+# routes safe-request reads of books and accounts to. A client that writes keeps reading
+# from the primary for DATABASE_REPLICA_PIN_SECONDS; the pins live in the
+# DATABASE_REPLICA_PIN_CACHE_ALIAS cache. API response cache misses of data written in that
+# window read from the primary too. Locally, a copy of db.sqlite3 works as a replica.
+#
+# SQLITE_PROFILE=production serves SQLite through DRF_library_API.sqlite: WAL journal,
+# synchronous=NORMAL, SQLITE_MMAP_SIZE bytes of memory-mapped I/O and a SQLITE_CACHE_SIZE KiB
+# page cache per connection, and writes serialized through an in-process lock, waiting up
+# to SQLITE_BUSY_TIMEOUT seconds. Measure it with `manage.py benchmark_writes`.
+
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "default")
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 20))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", 64 * 1024))
+
+_SQLITE_PROFILES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    'production': {
+        'ENGINE': 'DRF_library_API.sqlite',
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': SQLITE_MMAP_SIZE,
+                'cache_size': -SQLITE_CACHE_SIZE,
+            },
+        },
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        **_SQLITE_PROFILES[SQLITE_PROFILE],
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+DATABASE_REPLICA_NAME = os.environ.get("DATABASE_REPLICA_NAME")
+if DATABASE_REPLICA_NAME:
+    DATABASES['replica'] = {**DATABASES['default'], 'NAME': DATABASE_REPLICA_NAME, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICA_ALIAS = 'replica' if DATABASE_REPLICA_NAME else None
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get("DATABASE_REPLICA_PIN_SECONDS", 10))
+DATABASE_REPLICA_PIN_CACHE_ALIAS = 'auth'
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# The "api" alias holds cached catalogue responses. Local memory is per process; point
+# API_CACHE_BACKEND/API_CACHE_LOCATION at a shared backend (e.g. Redis) to share it.
+# The "auth" alias holds token revocation markers (see api.authentication) and replica pins
+# (see api.replicas), and must be shared by every web process; configure it with
+# AUTH_CACHE_BACKEND/AUTH_CACHE_LOCATION.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': os.environ.get("API_CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get("API_CACHE_LOCATION", 'api-responses'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    'auth': {
+        'BACKEND': os.environ.get("AUTH_CACHE_BACKEND", 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get("AUTH_CACHE_LOCATION", 'auth-revocations'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+API_CACHE_ALIAS = 'api'
+AUTH_CACHE_ALIAS = 'auth'
+# Seconds a write request may reuse a User row loaded by an earlier request in this process.
+AUTH_USER_CACHE_TTL = 30
+
+# Reviews embedded in a book's detail; the rest are paginated at `all_reviews`.
+API_BOOK_DETAIL_REVIEWS = int(os.environ.get("API_BOOK_DETAIL_REVIEWS", "5"))
+
+# Samples per view kept by api.metrics for the percentiles served at /api/_metrics/.
+API_METRICS_WINDOW = int(os.environ.get("API_METRICS_WINDOW", "1024"))
+
+
+# Background tasks
+# "thread" runs queued tasks in a pool inside the web process, "worker" leaves them to
+# `manage.py run_tasks`, "immediate" runs them inline. The test runner
+# (DRF_library_API.test_runner) uses "immediate" because pool threads cannot see rows
+# written inside a test's transaction.
+
+TASKS_MODE = os.environ.get("TASKS_MODE", "thread")
+TASKS_THREADS = int(os.environ.get("TASKS_THREADS", 2))
+
+
+# Leaderboards (books.rankings)
+# Periods in days of review history (None for all time). Entries need LEADERBOARD_MIN_REVIEWS
+# reviews in the period; the Bayesian average counts the period's mean rating as
+# LEADERBOARD_PRIOR_WEIGHT extra votes. Reads queue an incremental refresh at most every
+# LEADERBOARD_REFRESH_INTERVAL seconds, and a refresh rebuilds a period from scratch once it
+# is LEADERBOARD_FULL_REFRESH_INTERVAL seconds old. Cron can run `manage.py refresh_rankings`.
+
+LEADERBOARD_PERIODS = {"all": None, "year": 365, "month": 30, "week": 7}
+LEADERBOARD_MIN_REVIEWS = int(os.environ.get("LEADERBOARD_MIN_REVIEWS", 3))
+LEADERBOARD_PRIOR_WEIGHT = int(os.environ.get("LEADERBOARD_PRIOR_WEIGHT", 10))
+LEADERBOARD_REFRESH_INTERVAL = int(os.environ.get("LEADERBOARD_REFRESH_INTERVAL", 300))
+LEADERBOARD_FULL_REFRESH_INTERVAL = int(os.environ.get("LEADERBOARD_FULL_REFRESH_INTERVAL", 86400))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -112,6 +239,39 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/4.0/topics/auth/passwords/
+# PASSWORD_HASHER picks the algorithm for new hashes: "pbkdf2", "scrypt" or "argon2" (needs
+# argon2-cffi). Costs come from PASSWORD_HASHER_PARAMS; hashes made with another algorithm
+# or cost are upgraded when their owner next logs in. Compare settings with
+# `manage.py benchmark_passwords`.
+
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "pbkdf2")
+
+PASSWORD_HASHER_PARAMS = {
+    'pbkdf2': {'iterations': int(os.environ.get("PBKDF2_ITERATIONS", 600000))},
+    'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 1},
+    'argon2': {'time_cost': 2, 'memory_cost': 65536, 'parallelism': 1},
+}
+
+_PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'accounts.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'accounts.hashers.ScryptPasswordHasher',
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+}
+
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+]
+
+AUTHENTICATION_BACKENDS = ['accounts.backends.PooledModelBackend']
+
+# Login password checks run in a pool with this many threads; once LOGIN_HASH_QUEUE more
+# are waiting, further logins get 503 until the pool catches up.
+LOGIN_HASH_THREADS = int(os.environ.get("LOGIN_HASH_THREADS", os.cpu_count() or 1))
+LOGIN_HASH_QUEUE = int(os.environ.get("LOGIN_HASH_QUEUE", 64))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
@@ -139,12 +299,55 @@ MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Throttling and admission control (api.throttling)
+# Views with a throttle_scope get a token bucket per client (user, or IP when anonymous)
+# at the scope's rate in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']. The buckets live in each
+# process unless API_THROTTLE_CACHE_ALIAS names a cache shared by all of them. The test
+# runner turns throttling off: its clients all share one IP address.
+# Each process answers 503 to requests beyond API_MAX_CONCURRENT_REQUESTS in flight, or
+# API_MAX_CONCURRENT_WRITES unsafe ones (0 for no limit).
+
+API_THROTTLING = os.environ.get("API_THROTTLING", "1") == "1"
+API_THROTTLE_CACHE_ALIAS = os.environ.get("API_THROTTLE_CACHE_ALIAS") or None
+API_MAX_CONCURRENT_REQUESTS = int(os.environ.get("API_MAX_CONCURRENT_REQUESTS", 64))
+API_MAX_CONCURRENT_WRITES = int(os.environ.get("API_MAX_CONCURRENT_WRITES", 16))
+API_ADMISSION_RETRY_AFTER = 1
+
+
+# JSON_BACKEND picks the JSON renderer and parser: "orjson" (needs orjson, several times
+# faster on large pages) or "json" (the standard library, DRF's default). Compare them
+# with `manage.py benchmark_json`.
+
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "orjson" if find_spec("orjson") else "json")
+
+_JSON_CLASSES = {
+    'orjson': ('api.renderers.ORJSONRenderer', 'api.renderers.ORJSONParser'),
+    'json': ('rest_framework.renderers.JSONRenderer', 'rest_framework.parsers.JSONParser'),
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-
-    ]
+        'api.authentication.StatelessJWTAuthentication',
+
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        _JSON_CLASSES[JSON_BACKEND][0],
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        _JSON_CLASSES[JSON_BACKEND][1],
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'register': '10/hour',
+        'login': '20/min',
+        'reviews': '60/min',
+    },
 }
 
 AUTH_USER_MODEL = 'accounts.User'
@@ -0,0 +1,110 @@
+"""
+SQLite backend for serving concurrent requests, enabled by `SQLITE_PROFILE=production`.
+
+Every new connection runs the PRAGMAs of `OPTIONS["pragmas"]`: a WAL journal, so readers
+no longer block the writer and the other way round, synchronous=NORMAL (durable against
+crashes of the process, fsyncs only at checkpoints), memory-mapped reads and a bigger
+page cache. The sqlite3 `timeout` option is the busy timeout.
+
+SQLite allows a single writer per database file. Stock Django starts `atomic` blocks
+with a deferred BEGIN, so a transaction that reads before it writes has to upgrade its
+lock halfway, which fails at once with "database is locked" when another connection wrote
+in the meantime; the busy timeout does not apply to that case. Here transactions begin
+with BEGIN IMMEDIATE, and the writes of this process queue on a lock per database file
+first: `atomic` blocks hold it until they commit or roll back, and INSERT, UPDATE and
+DELETE statements outside of them for the statement. Threads then wait their turn in
+Python instead of polling SQLite's busy handler, which leaves it to arbitrate between
+processes. Waiting longer than the timeout raises OperationalError.
+"""
+import threading
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_write_locks = {}
+_write_locks_lock = threading.Lock()
+
+
+def write_lock(name):
+    """The process-wide lock serializing writes to the database file `name`."""
+    with _write_locks_lock:
+        return _write_locks.setdefault(str(name), threading.Lock())
+
+
+def is_write(sql):
+    return sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.holds_write_lock = False
+        self.execute_wrappers.append(self.serialize_write)
+
+    @property
+    def write_lock(self):
+        return write_lock(self.settings_dict["NAME"])
+
+    @property
+    def write_lock_timeout(self):
+        return self.settings_dict["OPTIONS"].get("timeout", 5)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pragmas", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict["OPTIONS"].get("pragmas", {}).items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire_write_lock(self):
+        if not self.write_lock.acquire(timeout=self.write_lock_timeout):
+            raise OperationalError("database is locked")
+        self.holds_write_lock = True
+
+    def release_write_lock(self):
+        if self.holds_write_lock:
+            self.holds_write_lock = False
+            self.write_lock.release()
+
+    def serialize_write(self, execute, sql, params, many, context):
+        if self.holds_write_lock or not is_write(sql):
+            return execute(sql, params, many, context)
+        self.acquire_write_lock()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # A statement that opened a transaction (autocommit turned off by hand)
+            # keeps the lock until it ends.
+            if self.connection is None or not self.connection.in_transaction:
+                self.release_write_lock()
+
+    def _start_transaction_under_autocommit(self):
+        self.acquire_write_lock()
+        try:
+            self.cursor().execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.release_write_lock()
+            raise
+
+    def _commit(self):
+        result = super()._commit()
+        self.release_write_lock()
+        return result
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
@@ -0,0 +1,24 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+# Settings the test suite runs with, whatever the environment says.
+TEST_SETTINGS = {
+    # Pool threads cannot see rows written inside a test's transaction.
+    "TASKS_MODE": "immediate",
+    # Every test client has the same IP address; ThrottlingTests turn it back on.
+    "API_THROTTLING": False,
+}
+
+
+class TestRunner(DiscoverRunner):
+    """`DiscoverRunner` that applies TEST_SETTINGS for the whole run."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -20,5 +20,5 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("api/", include("api.urls")),
+    path("api/", include("api.async_urls" if settings.API_ASYNC_VIEWS else "api.urls")),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,36 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+
+from .hashers import run_hashing
+from .models import User
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    `ModelBackend` whose password checks run in the hashing pool. Hashes made with an
+    outdated algorithm or cost are replaced after a successful login of an active user,
+    like Django does. `HashingPoolBusy` propagates: the token view answers it with 503,
+    and `LoginUnavailableMiddleware` does for the other login views.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway so unknown users take as long as wrong passwords (#20760).
+            run_hashing(make_password, password)
+            return None
+
+        outdated = []
+        if not run_hashing(check_password, password, user.password, outdated.append):
+            return None
+        if not self.user_can_authenticate(user):
+            return None
+        if outdated:
+            user.password = run_hashing(make_password, password)
+            user.save(update_fields=["password"])
+        return user
@@ -0,0 +1,73 @@
+"""
+Password hashers with configurable cost, and the thread pool logins hash in.
+
+Each hasher reads its cost from `settings.PASSWORD_HASHER_PARAMS[<name>]` when Django
+first loads it; keyword arguments override the settings (used by `benchmark_passwords`).
+The first entry of `PASSWORD_HASHERS` hashes new passwords, and Django upgrades hashes
+made with another algorithm or cost the next time their owner logs in.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class ConfigurableCostMixin:
+    name = None
+    cost_attributes = ()
+
+    def __init__(self, **params):
+        configured = getattr(settings, "PASSWORD_HASHER_PARAMS", {}).get(self.name, {})
+        for attribute in self.cost_attributes:
+            value = params.get(attribute, configured.get(attribute))
+            if value is not None:
+                setattr(self, attribute, value)
+
+
+class PBKDF2PasswordHasher(ConfigurableCostMixin, hashers.PBKDF2PasswordHasher):
+    name = "pbkdf2"
+    cost_attributes = ("iterations",)
+
+
+class ScryptPasswordHasher(ConfigurableCostMixin, hashers.ScryptPasswordHasher):
+    name = "scrypt"
+    cost_attributes = ("work_factor", "block_size", "parallelism")
+
+
+class Argon2PasswordHasher(ConfigurableCostMixin, hashers.Argon2PasswordHasher):
+    """Needs the optional argon2-cffi package."""
+    name = "argon2"
+    cost_attributes = ("time_cost", "memory_cost", "parallelism")
+
+
+class HashingPoolBusy(Exception):
+    """Every hashing thread is busy and the wait queue is full."""
+
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.LOGIN_HASH_THREADS, thread_name_prefix="hashing")
+            _slots = threading.BoundedSemaphore(settings.LOGIN_HASH_THREADS + settings.LOGIN_HASH_QUEUE)
+        return _executor, _slots
+
+
+def run_hashing(func, *args):
+    """
+    Run a password hashing call in the pool and wait for it. The pool has one thread per
+    core by default, so a burst of logins queues here instead of starving other requests.
+    """
+    executor, slots = get_executor()
+    if not slots.acquire(blocking=False):
+        raise HashingPoolBusy()
+    try:
+        return executor.submit(func, *args).result()
+    finally:
+        slots.release()
@@ -0,0 +1,68 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers as django_hashers
+from django.core.management.base import BaseCommand
+
+from accounts.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+PASSWORD = "correct horse battery staple"
+
+
+def configurations():
+    yield "pbkdf2 (Django default)", PBKDF2PasswordHasher(iterations=django_hashers.PBKDF2PasswordHasher.iterations)
+    yield "pbkdf2 (configured)", PBKDF2PasswordHasher()
+    yield "scrypt (configured)", ScryptPasswordHasher()
+    yield "argon2 (configured)", Argon2PasswordHasher()
+
+
+def verifications(hasher, encoded, deadline):
+    count = 0
+    while time.perf_counter() < deadline:
+        hasher.verify(PASSWORD, encoded)
+        count += 1
+    return count
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure login password checks per second for each hasher configuration, on one "
+        "thread (per core) and across --threads threads. Nothing touches the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=3.0, help="Measuring time per configuration and mode.")
+        parser.add_argument("--threads", type=int, default=settings.LOGIN_HASH_THREADS)
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        seconds, threads = options["seconds"], options["threads"]
+        results = []
+        for label, hasher in configurations():
+            try:
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+            except ValueError as error:
+                self.stderr.write(f"Skipping {label}: {error}")
+                continue
+
+            single = verifications(hasher, encoded, time.perf_counter() + seconds) / seconds
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                deadline = time.perf_counter() + seconds
+                counts = executor.map(verifications, [hasher] * threads, [encoded] * threads, [deadline] * threads)
+                pooled = sum(counts) / seconds
+
+            results.append({
+                "configuration": label,
+                "parameters": {attribute: getattr(hasher, attribute) for attribute in hasher.cost_attributes},
+                "logins_per_second_per_core": round(single, 1),
+                "logins_per_second": round(pooled, 1),
+                "threads": threads,
+            })
+            if not options["json"]:
+                self.stdout.write(f"{label:<24} {single:>9.1f}/s per core {pooled:>9.1f}/s on {threads} threads")
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,16 @@
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from .hashers import HashingPoolBusy
+
+
+class LoginUnavailableMiddleware(MiddlewareMixin):
+    """
+    Answer logins that found the hashing pool full with 503 instead of a server error,
+    for the views that call `authenticate()` themselves (the admin, session logins).
+    """
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, HashingPoolBusy):
+            return HttpResponse("Too many logins in progress, try again shortly.", status=503, content_type="text/plain")
+        return None
@@ -8,14 +8,42 @@ class User(AbstractUser):
     id = models.UUIDField(unique=True, primary_key=True, default=uuid.uuid4)
     email = models.EmailField(unique=True)
     username = models.CharField(max_length=120, unique=True)
+    # Bumped when a new password is saved; API tokens issued before are revoked.
+    # Rehashing the same password on login leaves it alone.
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stored_username = self.__dict__.get("username")
+
     def __str__(self):
         return self.username
 
+    @property
+    def username_changed(self):
+        """Whether `username` differs from the value it was loaded or last saved with."""
+        return self._stored_username != self.__dict__.get("username", self._stored_username)
+
+    def set_unusable_password(self):
+        super().set_unusable_password()
+        self._password_removed = True
+
+    def save(self, *args, **kwargs):
+        # `_password` holds the raw password after set_password(), and Django clears it
+        # before saving a rehash.
+        if not self._state.adding and (self._password is not None or getattr(self, "_password_removed", False)):
+            self.token_version += 1
+            self._password_removed = False
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "token_version"}
+        super().save(*args, **kwargs)
+        if kwargs.get("update_fields") is None or "username" in kwargs["update_fields"]:
+            self._stored_username = self.__dict__.get("username", self._stored_username)
+
 
 
 
@@ -0,0 +1,9 @@
+"""API routes with the catalogue endpoints served by api.async_views (ASGI deployments)."""
+from . import async_views
+from .urls import catalogue_patterns, urlpatterns as sync_urlpatterns
+
+
+catalogue = catalogue_patterns(async_views)
+replaced = {pattern.name for pattern in catalogue}
+
+urlpatterns = catalogue + [pattern for pattern in sync_urlpatterns if pattern.name not in replaced]
@@ -0,0 +1,146 @@
+"""
+Async versions of the catalogue views, routed instead of those in api.views when
+`API_ASYNC_VIEWS` is on. It is off by default, under asgi.py too: `benchmark_concurrency`
+finds ASGI slower than the threaded WSGI views unless the database or cache is slow to
+answer.
+
+GETs await the async ORM and async cache API. They authenticate with
+`StatelessJWTAuthentication` only, which answers safe requests from the token without
+touching the database; session authentication would need a synchronous session and user
+lookup. Everything else that may block runs in a thread through `sync_to_async`: the
+checks of `initial` (token revocation, throttling), the serializers, which may look up
+files or generate cover thumbnails, and the writes, which reuse the synchronous handlers of
+the parent views.
+"""
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist, ValidationError as DjangoValidationError
+from django.http import Http404
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from books.models import Book
+
+from . import views
+from .authentication import StatelessJWTAuthentication
+
+
+def _in_thread(handler):
+    async def wrapper(self, request, *args, **kwargs):
+        return await sync_to_async(handler)(self, request, *args, **kwargs)
+    wrapper.__name__ = handler.__name__
+    return wrapper
+
+
+class AsyncAPIViewMixin:
+    """
+    Makes a DRF view async: `dispatch` awaits the handler, and every synchronous handler
+    inherited from the parent view (the writes) is wrapped to run in a thread.
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for method in cls.http_method_names:
+            handler = getattr(cls, method, None)
+            if method != "options" and handler is not None and not iscoroutinefunction(handler):
+                setattr(cls, method, _in_thread(handler))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            handler = self.http_method_not_allowed
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (ObjectDoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def alist(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = None
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+        if page is not None:
+            return self.get_paginated_response(await self.aserialize(page, many=True))
+        return Response(await self.aserialize([obj async for obj in queryset], many=True))
+
+    async def aretrieve(self):
+        return Response(await self.aserialize(await self.aget_object()))
+
+    async def aserialize(self, instance, many=False):
+        return await sync_to_async(lambda: self.get_serializer(instance, many=many).data)()
+
+
+class AuthorListCreateAPIView(AsyncAPIViewMixin, views.AuthorListCreateAPIView):
+    async def get(self, request, *args, **kwargs):
+        return await self.acached_get(request, self.alist)
+
+
+class AuthorDetailAPIView(AsyncAPIViewMixin, views.AuthorDetailAPIView):
+    async def get(self, request, *args, **kwargs):
+        return await self.aretrieve()
+
+
+"""BOOKS VIEWS"""
+
+class BookListCreateAPIView(AsyncAPIViewMixin, views.BookListCreateAPIView):
+    async def get(self, request, *args, **kwargs):
+        return await self.acached_get(request, self.alist)
+
+
+class BookDetailAPIView(AsyncAPIViewMixin, views.BookDetailAPIView):
+    async def get(self, request, *args, **kwargs):
+        return await self.aconditional_get(request, lambda: self.acached_get(request, self.aretrieve))
+
+
+"""REVIEW VIEWS"""
+
+class ReviewListForBookAPIView(AsyncAPIViewMixin, views.ReviewListForBookAPIView):
+    async def get(self, request, *args, **kwargs):
+        return await self.aconditional_get(request, lambda: self.acached_get(request, self.alist))
+
+    async def alist(self):
+        book = await Book.objects.filter(id=self.kwargs.get("pk")).only("id", "title").afirst()
+        if book is None:
+            return Response(data={"message": "Book does not exist!"}, status=status.HTTP_404_NOT_FOUND)
+
+        reviews = self.get_queryset()
+        paginated_reviews = await self.paginator.apaginate_queryset(reviews, self.request, view=self)
+
+        empty = self.paginator.result_is_empty(paginated_reviews)
+        if empty or (empty is None and not await reviews.aexists()):
+            return Response(data={"message": f"Book '{book.title}' have no reviews."}, status=status.HTTP_200_OK)
+
+        response = {
+            "message": f"Reviews for '{book.title}'. ",
+            "data": await self.aserialize(paginated_reviews, many=True),
+        }
+        if paginated_reviews is not None:
+            response.update(self.paginator.get_pagination_data())
+        return Response(data=response, status=status.HTTP_200_OK)
@@ -0,0 +1,195 @@
+"""
+JWT authentication that skips the user lookup on read requests.
+
+Safe methods get a `ClaimsUser` built from the access token (user id, username, email),
+so authenticating them costs no query. Other methods, and every request of a token that
+claims staff status, get the real `User`, kept in a per-process cache for
+`AUTH_USER_CACHE_TTL` seconds.
+
+Tokens carry a `cred` claim derived from the user's `token_version`, which a new password
+bumps (rehashing the same password on login does not), and the staff and superuser flags.
+Changing one of those, deactivating or deleting a user stores the new value in the
+`AUTH_CACHE_ALIAS` cache, and tokens whose claim no longer matches are rejected on every
+request and on refresh. Requests that load the user also compare the claim with the
+user's row, so they do not depend on the marker. That cache must be shared by every
+process and must not evict entries early, or revoked tokens are accepted again on
+stateless reads; `manage.py check --deploy` reports local memory and dummy caches.
+
+Views that need the user's current row even for reads (profile pages) set
+`stateless_auth = False`.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.models import User
+
+
+class ClaimsUser(TokenUser):
+    """User backed by the token claims; `pk` is the user id as a string."""
+
+    @property
+    def is_active(self):
+        return True
+
+
+class UserCache:
+    """Process-local user id -> (expiry, User). Callers get copies, never the shared instance."""
+
+    max_entries = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return copy.copy(entry[1])
+
+    def set(self, user_id, user):
+        with self._lock:
+            if len(self._users) >= self.max_entries:
+                self._users.clear()
+            self._users[user_id] = (time.monotonic() + settings.AUTH_USER_CACHE_TTL, copy.copy(user))
+
+    def evict(self, user_id):
+        with self._lock:
+            self._users.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()
+
+
+CREDENTIALS_CLAIM = "cred"
+
+
+def credentials_version(user):
+    """Changes whenever the user's password or privileges change, or the user is deactivated."""
+    if not user.is_active:
+        return "inactive"
+    value = f"{user.token_version}:{user.is_staff:d}:{user.is_superuser:d}"
+    return salted_hmac("api.authentication.credentials", value).hexdigest()[:16]
+
+
+CREDENTIAL_FIELDS = ("is_active", "is_staff", "is_superuser", "token_version")
+
+
+def credentials(user):
+    """The loaded `CREDENTIAL_FIELDS` of `user`, or None when some are deferred."""
+    values = tuple(user.__dict__.get(name) for name in CREDENTIAL_FIELDS)
+    return None if None in values else values
+
+
+def _revoked_key(user_id):
+    return f"auth:credentials:{user_id}"
+
+
+def revoke_tokens(user_id, version):
+    """Reject every token of this user whose credentials claim differs from `version`."""
+    timeout = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME).total_seconds()
+    caches[settings.AUTH_CACHE_ALIAS].set(_revoked_key(user_id), version, timeout=timeout)
+
+
+def token_revoked():
+    return AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+
+
+def check_not_revoked(token):
+    version = caches[settings.AUTH_CACHE_ALIAS].get(_revoked_key(token[api_settings.USER_ID_CLAIM]))
+    if version is not None and token.get(CREDENTIALS_CLAIM) != version:
+        raise token_revoked()
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """`JWTAuthentication` that only loads the user for unsafe methods and `stateless_auth = False` views."""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        check_not_revoked(validated_token)
+
+        view = (request.parser_context or {}).get("view")
+        # Staff claims are checked against the row: a demoted user's token must not keep them.
+        if (request.method in SAFE_METHODS and getattr(view, "stateless_auth", True)
+                and not validated_token.get("is_staff", False)):
+            return ClaimsUser(validated_token), validated_token
+
+        user = self.get_user(validated_token)
+        if validated_token.get(CREDENTIALS_CLAIM) != credentials_version(user):
+            raise token_revoked()
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+        return user
+
+
+@receiver(post_init, sender=User)
+def remember_credentials(sender, instance, **kwargs):
+    instance._stored_credentials = credentials(instance)
+
+
+@receiver(post_save, sender=User)
+def revoke_on_credential_change(sender, instance, created, **kwargs):
+    user_cache.evict(instance.pk)
+    stored, instance._stored_credentials = instance._stored_credentials, credentials(instance)
+    if created:
+        return
+    if not instance.is_active or stored != instance._stored_credentials:
+        revoke_tokens(instance.pk, credentials_version(instance))
+
+
+@receiver(post_delete, sender=User)
+def revoke_on_delete(sender, instance, **kwargs):
+    user_cache.evict(instance.pk)
+    revoke_tokens(instance.pk, "deleted")
+
+
+@checks.register(checks.Tags.security, deploy=True)
+def check_revocation_cache(app_configs, **kwargs):
+    authentication = settings.REST_FRAMEWORK.get("DEFAULT_AUTHENTICATION_CLASSES", [])
+    backend = settings.CACHES.get(settings.AUTH_CACHE_ALIAS, {}).get("BACKEND", "")
+    if f"{__name__}.StatelessJWTAuthentication" not in authentication:
+        return []
+    if backend.endswith((".LocMemCache", ".DummyCache")):
+        return [checks.Error(
+            "Token revocation markers need a shared cache that does not evict them.",
+            hint="Point AUTH_CACHE_BACKEND/AUTH_CACHE_LOCATION at a shared backend such as Redis.",
+            obj=settings.AUTH_CACHE_ALIAS,
+            id="api.E001",
+        )]
+    return []
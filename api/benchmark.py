@@ -0,0 +1,498 @@
+"""
+Reproducible benchmark of the API.
+
+`seed` fills the database with a catalogue whose popularity is skewed like real traffic:
+a few authors write most books, a few books get most reviews and a few users write most
+of them. Every route in api.urls has at least one scenario in `SCENARIOS`, driven through
+the Django test client one request at a time; `run` reports p50/p95/p99 latency,
+requests per second and SQL queries per request (read from the `Server-Timing` header of
+api.metrics) for each. `manage.py benchmark_api` runs it on a throwaway database, writes
+the results as JSON and compares them with an earlier run.
+"""
+import json
+import platform
+import statistics
+import time
+from collections import Counter, namedtuple
+from datetime import date
+from functools import lru_cache
+from itertools import accumulate, count
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, get_resolver, reverse
+
+from accounts.models import User
+from books.models import Author, Book, Review, format_isbn
+from books import rankings
+from books.search import get_backend
+
+from .serializer import MyTokenObtainPairSerializer
+
+
+PASSWORD = "bench-Password-2024"
+WORDS = ["river", "night", "glass", "winter", "garden", "empire", "shadow", "letter", "silver", "ocean",
+         "forest", "memory", "stone", "crown", "harbor", "signal", "paper", "summer", "machine", "island"]
+NAMES = ["Anna", "Jan", "Maria", "Piotr", "Olga", "Tomasz", "Ewa", "Adam", "Zofia", "Marek"]
+LAST_NAMES = ["Nowak", "Kowalski", "Sapkowski", "Lem", "Tokarczuk", "Mickiewicz", "Prus", "Szymborska"]
+
+SCALES = {
+    "small": {"authors": 100, "books": 1_000, "users": 200, "reviews": 5_000},
+    "medium": {"authors": 1_000, "books": 20_000, "users": 2_000, "reviews": 100_000},
+    "large": {"authors": 5_000, "books": 200_000, "users": 20_000, "reviews": 1_000_000},
+}
+
+Dataset = namedtuple("Dataset", ["authors", "books", "users", "admin"])
+Scenario = namedtuple("Scenario", ["name", "route", "method", "prepare", "hashes"])
+
+
+@lru_cache(maxsize=None)
+def zipf(size, exponent=1.1):
+    """Cumulative weights where the item of rank r is drawn about 1 / r**exponent as often."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def seed(rng, authors, books, users, reviews, batch_size=5_000):
+    """
+    Create the benchmark catalogue. Lists in the returned `Dataset` are ordered by
+    popularity, most popular first. Every user's password is `PASSWORD`.
+    """
+    password = make_password(PASSWORD)
+    author_objs = Author.objects.bulk_create(
+        (Author(name=rng.choice(NAMES), last_name=f"{rng.choice(LAST_NAMES)} {i}") for i in range(authors)),
+        batch_size=batch_size,
+    )
+    author_weights = zipf(len(author_objs))
+    book_objs = Book.objects.bulk_create(
+        (Book(title=f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}", ISBN=format_isbn(f"{9780000000000 + i}"),
+              author=rng.choices(author_objs, cum_weights=author_weights)[0],
+              description=" ".join(rng.choices(WORDS, k=20)), published=date(rng.randint(1900, 2023), 1, 1))
+         for i in range(books)),
+        batch_size=batch_size,
+    )
+    user_objs = User.objects.bulk_create(
+        (User(username=f"reader{i}", email=f"reader{i}@example.com", password=password) for i in range(users)),
+        batch_size=batch_size,
+    )
+    admin = User.objects.create(username="bench-admin", email="bench-admin@example.com", password=password,
+                                is_staff=True, is_superuser=True)
+
+    # Shuffle so that popularity does not follow the primary key.
+    rng.shuffle(book_objs)
+    book_weights, user_weights = zipf(len(book_objs)), zipf(len(user_objs))
+    user_ids, book_ids = [user.pk for user in user_objs], [book.pk for book in book_objs]
+    pairs = set()
+    # One review per (owner, book): redraw the duplicates, giving up after 20 rounds.
+    for _ in range(20):
+        missing = min(reviews, len(user_ids) * len(book_ids)) - len(pairs)
+        if missing <= 0:
+            break
+        pairs.update(zip(rng.choices(user_ids, cum_weights=user_weights, k=missing),
+                         rng.choices(book_ids, cum_weights=book_weights, k=missing)))
+    Review.objects.bulk_create(
+        (Review(owner_id=owner, book_id=book, body=" ".join(rng.choices(WORDS, k=30)), rating=rng.randint(1, 5))
+         for owner, book in sorted(pairs)),
+        batch_size=batch_size,
+    )
+    Book.objects.rebuild_rating_aggregates()
+    rankings.refresh(full=True)
+    get_backend().rebuild()
+    return Dataset(author_objs, book_objs, user_objs, admin)
+
+
+class Bench:
+    """State shared by the scenarios: the dataset, a random source and throwaway objects."""
+
+    def __init__(self, dataset, rng):
+        self.dataset = dataset
+        self.rng = rng
+        self.client = Client(raise_request_exception=False)
+        self.sequence = count()
+        self.review_ids = None
+        self._spare_users = []
+        self._tokens = {}
+
+    def token(self, user):
+        if user.pk not in self._tokens:
+            self._tokens[user.pk] = MyTokenObtainPairSerializer.get_token(user)
+        return self._tokens[user.pk]
+
+    def popular(self, items):
+        return self.rng.choices(items, cum_weights=zipf(len(items)))[0]
+
+    def unique(self):
+        return next(self.sequence)
+
+    def spare_user(self):
+        """A user with no reviews that no other request has used."""
+        if not self._spare_users:
+            password = self.dataset.admin.password
+            start = self.unique()
+            self._spare_users = User.objects.bulk_create(
+                User(username=f"spare{start}-{i}", email=f"spare{start}-{i}@example.com", password=password)
+                for i in range(50)
+            )
+        return self._spare_users.pop()
+
+    def new_author(self):
+        return Author.objects.create(name="Bench", last_name=f"Author {self.unique()}")
+
+    def new_book(self):
+        return Book.objects.create(title=f"Bench {self.unique()}", ISBN=f"{9790000000000 + self.unique()}",
+                                   author=self.dataset.authors[0])
+
+    def request(self, path, user=None, method="get", data=None, json_body=True):
+        spec = {"method": method, "path": path, "data": data, "json": json_body}
+        if user is not None:
+            spec["HTTP_AUTHORIZATION"] = f"Bearer {self.token(user).access_token}"
+        return spec
+
+    def send(self, spec):
+        spec = dict(spec)
+        method, path, data, json_body = spec.pop("method"), spec.pop("path"), spec.pop("data"), spec.pop("json")
+        if method == "get":
+            return self.client.get(path, data, **spec)
+        if json_body:
+            return getattr(self.client, method)(path, json.dumps(data), content_type="application/json", **spec)
+        return getattr(self.client, method)(path, data, **spec)
+
+
+SCENARIOS = {}
+
+
+def scenario(route, method="get", name=None, hashes=False):
+    """Register `prepare(bench) -> request` as the scenario `name` (default "<route>" or "<route>:<method>")."""
+    def register(prepare):
+        scenario_name = name or (route if method == "get" else f"{route}:{method}")
+        SCENARIOS[scenario_name] = Scenario(scenario_name, route, method, prepare, hashes)
+        return prepare
+    return register
+
+
+def reader(bench):
+    return bench.popular(bench.dataset.users)
+
+
+"""AUTHORS"""
+
+@scenario("authors-list")
+def authors_list(bench):
+    pages = max(len(bench.dataset.authors) // 10, 1)
+    return bench.request(reverse("authors-list"), reader(bench), data={"page": bench.rng.randint(1, pages)})
+
+
+@scenario("authors-list", "post")
+def authors_create(bench):
+    data = {"name": "Bench", "last_name": f"Created {bench.unique()}"}
+    return bench.request(reverse("authors-list"), bench.dataset.admin, "post", data)
+
+
+@scenario("author-detail")
+def author_detail(bench):
+    author = bench.popular(bench.dataset.authors)
+    return bench.request(reverse("author-detail", kwargs={"pk": author.pk}), reader(bench))
+
+
+@scenario("author-detail", "patch")
+def author_update(bench):
+    author = bench.rng.choice(bench.dataset.authors)
+    data = {"bio": f"Updated {bench.unique()}"}
+    return bench.request(reverse("author-detail", kwargs={"pk": author.pk}), bench.dataset.admin, "patch", data)
+
+
+@scenario("author-detail", "delete")
+def author_delete(bench):
+    author = bench.new_author()
+    return bench.request(reverse("author-detail", kwargs={"pk": author.pk}), bench.dataset.admin, "delete")
+
+
+"""BOOKS"""
+
+@scenario("books-list")
+def books_list(bench):
+    pages = max(len(bench.dataset.books) // 10, 1)
+    return bench.request(reverse("books-list"), reader(bench), data={"page": bench.rng.randint(1, pages)})
+
+
+@scenario("books-list", name="books-list:cursor")
+def books_list_cursor(bench):
+    return bench.request(reverse("books-list"), reader(bench), data={"pagination": "cursor"})
+
+
+@scenario("books-list", "post")
+def books_create(bench):
+    data = {"title": f"Created {bench.unique()}", "ISBN": f"{9790000000000 + bench.unique()}",
+            "author": bench.dataset.authors[0].pk}
+    return bench.request(reverse("books-list"), bench.dataset.admin, "post", data)
+
+
+@scenario("book-detail")
+def book_detail(bench):
+    book = bench.popular(bench.dataset.books)
+    return bench.request(reverse("book-detail", kwargs={"pk": book.pk}), reader(bench))
+
+
+@scenario("book-detail", name="book-detail:sparse")
+def book_detail_sparse(bench):
+    book = bench.popular(bench.dataset.books)
+    return bench.request(reverse("book-detail", kwargs={"pk": book.pk}), reader(bench),
+                         data={"fields": "title,average_rating,author.name,author.last_name", "expand": "author"})
+
+
+@scenario("book-detail", "patch")
+def book_update(bench):
+    book = bench.rng.choice(bench.dataset.books)
+    data = {"description": f"Updated {bench.unique()}"}
+    return bench.request(reverse("book-detail", kwargs={"pk": book.pk}), bench.dataset.admin, "patch", data)
+
+
+@scenario("book-detail", "delete")
+def book_delete(bench):
+    book = bench.new_book()
+    return bench.request(reverse("book-detail", kwargs={"pk": book.pk}), bench.dataset.admin, "delete")
+
+
+@scenario("books-import", "post")
+def books_import(bench):
+    start = bench.unique() * 1000
+    rows = "".join(f"Imported {start + i},{9770000000000 + start + i},Bench,Importer\n" for i in range(100))
+    upload = SimpleUploadedFile("books.csv", f"title,isbn,author_name,author_last_name\n{rows}".encode(), "text/csv")
+    return bench.request(reverse("books-import"), bench.dataset.admin, "post", {"file": upload}, json_body=False)
+
+
+@scenario("catalogue-export")
+def catalogue_export(bench):
+    return bench.request(reverse("catalogue-export", kwargs={"table": "books"}), bench.dataset.admin)
+
+
+@scenario("search")
+def search(bench):
+    return bench.request(reverse("search"), reader(bench), data={"q": bench.rng.choice(WORDS)})
+
+
+@scenario("books-top")
+def books_top(bench):
+    data = {"by": bench.rng.choice(["rating", "reviews"]), "period": bench.rng.choice(["all", "month"])}
+    return bench.request(reverse("books-top"), reader(bench), data=data)
+
+
+@scenario("authors-top")
+def authors_top(bench):
+    data = {"by": bench.rng.choice(["rating", "reviews"]), "period": bench.rng.choice(["all", "month"])}
+    return bench.request(reverse("authors-top"), reader(bench), data=data)
+
+
+"""REVIEWS"""
+
+@scenario("review-for-book")
+def reviews_for_book(bench):
+    book = bench.popular(bench.dataset.books)
+    return bench.request(reverse("review-for-book", kwargs={"pk": book.pk}), reader(bench))
+
+
+@scenario("user_review")
+def user_reviews(bench):
+    return bench.request(reverse("user_review"), reader(bench))
+
+
+@scenario("review-create", "post")
+def review_create(bench):
+    book = bench.popular(bench.dataset.books)
+    data = {"body": "Benchmark review", "rating": bench.rng.randint(1, 5)}
+    return bench.request(reverse("review-create", kwargs={"pk": book.pk}), bench.spare_user(), "post", data)
+
+
+@scenario("review-bulk-create", "post")
+def review_bulk_create(bench):
+    books = bench.rng.sample(bench.dataset.books, min(20, len(bench.dataset.books)))
+    data = [{"book": book.pk, "body": "Benchmark review", "rating": bench.rng.randint(1, 5)} for book in books]
+    return bench.request(reverse("review-bulk-create"), bench.spare_user(), "post", data)
+
+
+def existing_review(bench):
+    if bench.review_ids is None:
+        bench.review_ids = list(Review.objects.order_by("id").values_list("id", flat=True))
+    return Review.objects.select_related("owner").get(pk=bench.rng.choice(bench.review_ids))
+
+
+@scenario("review-detail")
+def review_detail(bench):
+    review = existing_review(bench)
+    return bench.request(reverse("review-detail", kwargs={"pk": review.pk}), reader(bench))
+
+
+@scenario("review-detail", "patch")
+def review_update(bench):
+    review = existing_review(bench)
+    data = {"rating": bench.rng.randint(1, 5)}
+    return bench.request(reverse("review-detail", kwargs={"pk": review.pk}), review.owner, "patch", data)
+
+
+@scenario("review-detail", "delete")
+def review_delete(bench):
+    user = bench.spare_user()
+    review = Review.objects.create(owner=user, book=bench.popular(bench.dataset.books), rating=3)
+    return bench.request(reverse("review-detail", kwargs={"pk": review.pk}), user, "delete")
+
+
+"""ACCOUNTS"""
+
+@scenario("jwt-create", "post", hashes=True)
+def login(bench):
+    user = reader(bench)
+    return bench.request(reverse("jwt-create"), None, "post", {"email": user.email, "password": PASSWORD})
+
+
+@scenario("token_refresh", "post")
+def token_refresh(bench):
+    return bench.request(reverse("token_refresh"), None, "post", {"refresh": str(bench.token(reader(bench)))})
+
+
+@scenario("token_verify", "post")
+def token_verify(bench):
+    token = bench.token(reader(bench)).access_token
+    return bench.request(reverse("token_verify"), None, "post", {"token": str(token)})
+
+
+@scenario("user-profile")
+def user_profile(bench):
+    user = reader(bench)
+    return bench.request(reverse("user-profile", kwargs={"username": user.username}), user)
+
+
+@scenario("register", "post", hashes=True)
+def register(bench):
+    number = bench.unique()
+    data = {"username": f"registered{number}", "email": f"registered{number}@example.com",
+            "password": PASSWORD, "password2": PASSWORD}
+    return bench.request(reverse("register"), None, "post", data)
+
+
+@scenario("change-password", "put", hashes=True)
+def change_password(bench):
+    user = bench.spare_user()
+    data = {"old_password": PASSWORD, "password": f"{PASSWORD}-new", "password2": f"{PASSWORD}-new"}
+    return bench.request(reverse("change-password", kwargs={"username": user.username}), user, "put", data)
+
+
+@scenario("update-profile")
+def profile_read(bench):
+    user = reader(bench)
+    return bench.request(reverse("update-profile", kwargs={"username": user.username}), user)
+
+
+@scenario("update-profile", "put")
+def profile_update(bench):
+    user = bench.spare_user()
+    data = {"username": f"{user.username}-renamed", "email": f"renamed-{user.email}"}
+    return bench.request(reverse("update-profile", kwargs={"username": user.username}), user, "put", data)
+
+
+"""MONITORING"""
+
+@scenario("cache-stats")
+def cache_stats(bench):
+    return bench.request(reverse("cache-stats"), bench.dataset.admin)
+
+
+@scenario("metrics")
+def metrics(bench):
+    return bench.request(reverse("metrics"), bench.dataset.admin)
+
+
+def api_routes():
+    return {pattern.name for pattern in get_resolver("api.urls").url_patterns
+            if isinstance(pattern, URLPattern) and pattern.name}
+
+
+def missing_routes():
+    """Named routes of api.urls without a scenario."""
+    return api_routes() - {scenario.route for scenario in SCENARIOS.values()}
+
+
+def query_count(response):
+    for metric in response.get("Server-Timing", "").split(","):
+        name, _, params = metric.strip().partition(";")
+        if name == "db" and 'desc="' in params:
+            return int(params.split('desc="', 1)[1].split(" ", 1)[0])
+    return None
+
+
+def measure(bench, scenario, requests, warmup=0):
+    latencies, queries, statuses = [], [], Counter()
+    for i in range(warmup + requests):
+        spec = scenario.prepare(bench)
+        started = time.perf_counter()
+        response = bench.send(spec)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+        statuses[response.status_code] += 1
+        queries.append(query_count(response))
+    return summarize(scenario, latencies, queries, statuses)
+
+
+def summarize(scenario, latencies, queries, statuses):
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    counted = [value for value in queries if value is not None]
+    return {
+        "route": scenario.route,
+        "method": scenario.method.upper(),
+        "requests": len(latencies),
+        "errors": sum(number for code, number in statuses.items() if code >= 400),
+        "statuses": {str(code): number for code, number in sorted(statuses.items())},
+        "requests_per_second": round(len(latencies) / (sum(latencies) / 1000), 1),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "p50_ms": round(quantiles[49], 2),
+        "p95_ms": round(quantiles[94], 2),
+        "p99_ms": round(quantiles[98], 2),
+        "queries_mean": round(statistics.fmean(counted), 2) if counted else None,
+        "queries_max": max(counted) if counted else None,
+    }
+
+
+def run(dataset, rng, requests=200, hash_requests=10, warmup=5, names=None):
+    """Run the scenarios (all of them, or `names`) and return {name: result}."""
+    bench = Bench(dataset, rng)
+    results = {}
+    for name, scenario in SCENARIOS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(bench, scenario, hash_requests if scenario.hashes else requests,
+                                min(warmup, 1) if scenario.hashes else warmup)
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "json_backend": settings.JSON_BACKEND,
+        "machine": platform.machine(),
+    }
+
+
+def compare(baseline, current, tolerance=0.2):
+    """
+    Regressions of `current` against `baseline` (both `run` results): a p95 latency more
+    than `tolerance` above the baseline, or more queries per request.
+    """
+    regressions = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if None not in (before["queries_mean"], result["queries_mean"]) and result["queries_mean"] > before["queries_mean"]:
+            regressions.append(f"{name}: queries {before['queries_mean']} -> {result['queries_mean']}")
+    return regressions
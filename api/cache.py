@@ -0,0 +1,194 @@
+import hashlib
+import random
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.response import Response
+
+from books.models import Author, AuthorRanking, Book, BookRanking, Review
+from books.signals import catalogue_bulk_changed
+from accounts.models import User
+
+from .replicas import replica_alias, use_primary
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+class CacheStats:
+    """Process-local hit/miss counters per view name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def record(self, view_name, hit):
+        with self._lock:
+            self._counts[view_name]["hits" if hit else "misses"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._counts.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def _version_key(namespace):
+    return f"api:version:{namespace}"
+
+
+def _written_key(namespace):
+    return f"api:written:{namespace}"
+
+
+def get_versions(namespaces):
+    """
+    Current version of each namespace. A missing version starts at a random value rather
+    than 1, so an evicted counter can never line up with entries cached before the eviction.
+    """
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, random.getrandbits(48), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(namespaces):
+    """`get_versions` using the cache's async API."""
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, random.getrandbits(48), timeout=None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*namespaces):
+    """
+    Bump the given namespaces now, so this connection never reads its own stale entries,
+    and again on commit, dropping anything other requests cached while the write was open.
+    """
+    def bump():
+        cache = get_cache()
+        if replica_alias():
+            # Set before the new versions, so whoever reads those sees these too.
+            cache.set_many({_written_key(namespace): True for namespace in namespaces},
+                           timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+        for namespace in namespaces:
+            try:
+                cache.incr(_version_key(namespace))
+            except ValueError:
+                cache.add(_version_key(namespace), random.getrandbits(48), timeout=None)
+
+    bump()
+    if connection.in_atomic_block:
+        transaction.on_commit(bump)
+
+
+class CachedResponseMixin:
+    """
+    Serve successful GET responses from the API cache.
+
+    `cache_namespaces` lists the namespaces a response depends on; entries may use the
+    URL kwargs, e.g. "book:{pk}". Authentication and permissions still run on every
+    request, only the database work and serialization are skipped on a hit. Misses of a
+    namespace written within the replica lag window read from the primary (see api.replicas).
+    """
+    cache_namespaces = ()
+
+    def get_namespaces(self):
+        return [namespace.format(**self.kwargs) for namespace in self.cache_namespaces]
+
+    def written_keys(self):
+        return [_written_key(namespace) for namespace in self.get_namespaces()]
+
+    def get_cache_key(self, request, versions=None):
+        if versions is None:
+            versions = get_versions(self.get_namespaces())
+        query = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+        raw = repr((request.scheme, request.get_host(), request.path, query, request.accepted_renderer.format, versions))
+        return f"api:response:{hashlib.md5(raw.encode()).hexdigest()}"
+
+    def get(self, request, *args, **kwargs):
+        view_name = request.resolver_match.url_name
+        key = self.get_cache_key(request)
+        data = get_cache().get(key)
+        if data is not None:
+            stats.record(view_name, hit=True)
+            return Response(data)
+
+        stats.record(view_name, hit=False)
+        if replica_alias() and get_cache().get_many(self.written_keys()):
+            use_primary()
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            get_cache().set(key, response.data)
+        return response
+
+    async def acached_get(self, request, handler):
+        """Async counterpart of `get` for views in api.async_views; `handler` renders a miss."""
+        view_name = request.resolver_match.url_name
+        key = self.get_cache_key(request, await aget_versions(self.get_namespaces()))
+        data = await get_cache().aget(key)
+        if data is not None:
+            stats.record(view_name, hit=True)
+            return Response(data)
+
+        stats.record(view_name, hit=False)
+        if replica_alias() and await get_cache().aget_many(self.written_keys()):
+            use_primary()
+        response = await handler()
+        if response.status_code == 200:
+            await get_cache().aset(key, response.data)
+        return response
+
+
+@receiver([post_save, post_delete], sender=Author)
+def invalidate_author(sender, instance, **kwargs):
+    invalidate("authors")
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_book(sender, instance, **kwargs):
+    invalidate("books", f"book:{instance.pk}")
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review(sender, instance, **kwargs):
+    invalidate("reviews", f"book:{instance.book_id}")
+
+
+@receiver(catalogue_bulk_changed)
+def invalidate_bulk_change(sender, models, book_ids=(), **kwargs):
+    namespaces = {Author: "authors", Book: "books", Review: "reviews", BookRanking: "rankings", AuthorRanking: "rankings"}
+    invalidate(*[namespaces[model] for model in models if model in namespaces],
+               *[f"book:{book_id}" for book_id in book_ids])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    # Cached responses only show usernames (review owners).
+    if instance.username_changed and (update_fields is None or "username" in update_fields):
+        invalidate("users")
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    invalidate("users")
@@ -0,0 +1,234 @@
+"""
+Sparse fieldsets (`?fields=`) and expansion control (`?expand=`) for GET responses.
+
+`?fields=title,author.name` keeps only the listed fields; dotted names select inside
+nested serializers, and naming a nested field alone keeps all of it. `?expand=author`
+renders only the listed relations in full: every other field named in the serializer's
+`Meta.collapsed_fields` is replaced by its collapsed form, usually a link, or left out
+when that is None (another field already links to it). Without `?expand=` everything is
+expanded as before.
+
+Views using `SparseFieldsetViewMixin` also trim their queryset to what the serializer
+will read: `only()` on the needed columns, and select_related/prefetch_related only for
+relations that are rendered. `Meta.method_sources` tells the planner which lookups a
+SerializerMethodField reads, and a nested list serializer with a `prefetch(queryset)`
+method builds its own Prefetch (to order or slice it). Serializers it cannot plan keep
+the view's full queryset.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+
+from rest_framework import serializers
+from rest_framework.relations import HyperlinkedIdentityField, ManyRelatedField, PrimaryKeyRelatedField, RelatedField
+
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def parse_fields(value):
+    """"title,author.name" -> {"title": {}, "author": {"name": {}}}"""
+    tree = {}
+    for path in filter(None, (part.strip() for part in value.split(","))):
+        node = tree
+        for name in path.split("."):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def parse_expand(value):
+    return {tuple(path.strip().split(".")) for path in value.split(",") if path.strip()}
+
+
+def wants_sparse(request):
+    return request is not None and (FIELDS_PARAM in request.query_params or EXPAND_PARAM in request.query_params)
+
+
+def full_fields(serializer):
+    """Fields of `serializer` before any sparse fieldset narrows or collapses them."""
+    if isinstance(serializer, SparseFieldsMixin):
+        return super(SparseFieldsMixin, serializer).get_fields()
+    return serializer.get_fields()
+
+
+def unknown_paths(fields, paths):
+    """Dotted names of `paths` that do not lead through `fields` and nested serializers."""
+    unknown = set()
+    for names in paths:
+        current = fields
+        for depth, name in enumerate(names):
+            field = current.get(name) if current is not None else None
+            if field is None:
+                unknown.add(".".join(names[:depth + 1]))
+                break
+            field = getattr(field, "child", field)
+            current = full_fields(field) if isinstance(field, serializers.BaseSerializer) else None
+    return unknown
+
+
+class SparseFieldsMixin:
+    """Serializer mixin applying `?fields=` and `?expand=` of the request in its context to GETs."""
+
+    def __init__(self, *args, field_path=None, **kwargs):
+        # Serializers built by hand inside another one's output pass where they sit.
+        self.field_path = field_path
+        super().__init__(*args, **kwargs)
+
+    def serializer_path(self):
+        if self.field_path is not None:
+            return tuple(self.field_path)
+        path, node = [], self
+        while node.parent is not None:
+            if node.field_name:
+                path.insert(0, node.field_name)
+            node = node.parent
+        return tuple(path)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None or request.method != "GET" or not wants_sparse(request):
+            return fields
+        path = self.serializer_path()
+
+        left_out = set()
+        if EXPAND_PARAM in request.query_params:
+            expand = parse_expand(request.query_params[EXPAND_PARAM])
+            if not path:
+                unknown = unknown_paths(fields, expand)
+                if unknown:
+                    raise serializers.ValidationError({EXPAND_PARAM: f"Unknown fields: {', '.join(sorted(unknown))}."})
+            collapsed = getattr(getattr(self, "Meta", None), "collapsed_fields", {})
+            for name, collapse in collapsed.items():
+                if name in fields and path + (name,) not in expand:
+                    if collapse is None:
+                        del fields[name]
+                        left_out.add(name)
+                    else:
+                        fields[name] = collapse()
+
+        selected = parse_fields(request.query_params.get(FIELDS_PARAM, ""))
+        if not selected:
+            return fields
+        for name in path:
+            selected = selected.get(name)
+            if not selected:
+                return fields
+        unknown = set(selected) - set(fields) - left_out
+        if unknown:
+            raise serializers.ValidationError({FIELDS_PARAM: f"Unknown fields: {', '.join(sorted(unknown))}."})
+        return {name: field for name, field in fields.items() if name in selected}
+
+
+class Plan:
+    def __init__(self):
+        self.only = set()
+        self.select = []
+        self.prefetch = []
+
+    def add_lookup(self, lookup):
+        relation, _, column = lookup.rpartition("__")
+        if relation:
+            self.only.update([relation, lookup])
+            self.select.append(relation)
+        else:
+            self.only.add(column)
+
+    def apply(self, queryset):
+        queryset = queryset.select_related(None).prefetch_related(None).only(*self.only)
+        if self.select:
+            queryset = queryset.select_related(*self.select)
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*self.prefetch)
+        return queryset
+
+
+class Unplannable(Exception):
+    pass
+
+
+def plan(serializer, model):
+    """Columns and relations `serializer` reads from `model` rows. Raises Unplannable."""
+    result = Plan()
+    result.only.add(model._meta.pk.name)
+    method_sources = getattr(getattr(serializer, "Meta", None), "method_sources", {})
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            if name not in method_sources:
+                raise Unplannable(name)
+            for lookup in method_sources[name]:
+                result.add_lookup(lookup)
+            continue
+        if isinstance(field, HyperlinkedIdentityField):
+            if field.lookup_field != "pk":
+                result.only.add(field.lookup_field)
+            continue
+        if field.source == "*":
+            raise Unplannable(name)
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            raise Unplannable(name)
+        if len(field.source_attrs) > 1:
+            # "owner.username": a column across forward relations.
+            if not (model_field.many_to_one or model_field.one_to_one) or isinstance(field, serializers.BaseSerializer):
+                raise Unplannable(name)
+            result.add_lookup("__".join(field.source_attrs))
+            continue
+
+        if not model_field.is_relation:
+            result.only.add(model_field.name)
+        elif isinstance(field, serializers.ListSerializer) or isinstance(field, ManyRelatedField):
+            result.prefetch.append(_plan_prefetch(field, model_field))
+        elif isinstance(field, serializers.BaseSerializer):
+            nested = plan(field, model_field.related_model)
+            if nested.prefetch:
+                raise Unplannable(name)
+            result.only.update([model_field.name, *(f"{model_field.name}__{column}" for column in nested.only)])
+            result.select.extend([model_field.name, *(f"{model_field.name}__{relation}" for relation in nested.select)])
+        else:
+            result.only.add(model_field.name)
+            if not (isinstance(field, RelatedField) and field.use_pk_only_optimization()):
+                result.select.append(model_field.name)
+    return result
+
+
+def _plan_prefetch(field, model_field):
+    if not model_field.one_to_many:
+        return model_field.name
+    related = model_field.related_model
+    back = model_field.field.name
+    if isinstance(field, ManyRelatedField):
+        if isinstance(field.child_relation, PrimaryKeyRelatedField):
+            return Prefetch(model_field.name, queryset=related.objects.only(related._meta.pk.name, back).order_by("pk"))
+        return model_field.name
+    nested = plan(field.child, related)
+    nested.only.add(back)
+    queryset = nested.apply(related.objects.order_by("pk"))
+    if hasattr(field, "prefetch"):
+        return field.prefetch(queryset)
+    return Prefetch(model_field.name, queryset=queryset)
+
+
+class SparseFieldsetViewMixin:
+    """Trims `filter_queryset` (used by list and retrieve) to the requested fields."""
+
+    def filter_queryset(self, queryset):
+        return self.sparse_queryset(super().filter_queryset(queryset))
+
+    def sparse_queryset(self, queryset, serializer=None):
+        # Only GETs narrow the serializer, and saving a model loaded with only() writes
+        # just the loaded columns (skipping auto_now fields).
+        if self.request.method != "GET" or not wants_sparse(self.request):
+            return queryset
+        serializer = serializer or self.get_serializer()
+        try:
+            result = plan(serializer, queryset.model)
+        except Unplannable:
+            return queryset
+        ordering = getattr(self, "cursor_ordering", ())
+        result.only.update(name.lstrip("-") for name in ([ordering] if isinstance(ordering, str) else ordering))
+        return result.apply(queryset)
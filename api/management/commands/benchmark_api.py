@@ -0,0 +1,111 @@
+import json
+import random
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from api import benchmark
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every route of the API against a seeded catalogue with skewed popularity. "
+        "Runs on a throwaway test database through the test client, writes the results as "
+        "JSON (by default to benchmark-results/<commit>.json) and can compare them with an "
+        "earlier results file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=benchmark.SCALES, default="small")
+        for name in ("authors", "books", "users", "reviews"):
+            parser.add_argument(f"--{name}", type=int, help=f"Override the number of {name} of --scale.")
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario.")
+        parser.add_argument("--hash-requests", type=int, default=10,
+                            help="Measured requests for scenarios that hash a password (login, register...).")
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--scenario", action="append", dest="scenarios", metavar="NAME",
+                            help="Only run this scenario; repeatable.")
+        parser.add_argument("--cache", action="store_true", help="Keep the response cache on.")
+        parser.add_argument("--output", help="Results file; '-' prints the JSON instead.")
+        parser.add_argument("--compare", metavar="PATH", help="Earlier results file to compare against.")
+        parser.add_argument("--tolerance", type=float, default=0.2,
+                            help="Allowed relative p95 increase before --compare reports a regression.")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        unknown = set(options["scenarios"] or ()) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}. "
+                               f"Available: {', '.join(benchmark.SCENARIOS)}.")
+        missing = benchmark.missing_routes()
+        if missing:
+            self.stderr.write(f"Routes without a scenario: {', '.join(sorted(missing))}")
+
+        sizes = {name: options[name] if options[name] is not None else default
+                 for name, default in benchmark.SCALES[options["scale"]].items()}
+        # Queue background tasks without running them: the request pays for enqueueing as in
+        # production, and no worker thread competes for the in-memory test database.
+        overrides = {"DEBUG": False, "ALLOWED_HOSTS": ["testserver"], "TASKS_MODE": "worker", "API_THROTTLING": False}
+        if not options["cache"]:
+            overrides["CACHES"] = {**settings.CACHES, "api": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                rng = random.Random(options["seed"])
+                dataset = benchmark.seed(rng, **sizes)
+                results = benchmark.run(dataset, rng, options["requests"], options["hash_requests"],
+                                        options["warmup"], options["scenarios"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "environment": benchmark.environment(),
+            "options": {**sizes, "seed": options["seed"], "requests": options["requests"],
+                        "hash_requests": options["hash_requests"], "cache": options["cache"]},
+            "scenarios": results,
+        }
+        self.write_report(report, options["output"])
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:28} {result['requests_per_second']:8.1f} req/s  p50 {result['p50_ms']:7.2f}ms  "
+                f"p95 {result['p95_ms']:7.2f}ms  p99 {result['p99_ms']:7.2f}ms  "
+                f"queries {result['queries_mean']}  errors {result['errors']}"
+            )
+
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())
+            regressions = benchmark.compare(baseline["scenarios"], results, options["tolerance"])
+            for regression in regressions:
+                self.stdout.write(self.style.WARNING(f"Regression: {regression}"))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline.get('commit')}."))
+            elif options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} regressions against {baseline.get('commit')}.")
+
+    def write_report(self, report, output):
+        if output == "-":
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        path = Path(output or Path(settings.BASE_DIR) / "benchmark-results" / f"{report['commit'] or 'results'}.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2))
+        self.stdout.write(f"Wrote {path}")
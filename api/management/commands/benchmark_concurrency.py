@@ -0,0 +1,200 @@
+import asyncio
+import io
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from accounts.models import User
+from api.serializer import MyTokenObtainPairSerializer
+from books.models import Author, Book, Review
+
+
+HOST = "testserver"
+
+
+def seed(books):
+    authors = Author.objects.bulk_create(Author(name=f"Name {i}", last_name=f"Last {i}") for i in range(max(books // 10, 1)))
+    Book.objects.bulk_create(
+        Book(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=authors[i % len(authors)]) for i in range(books)
+    )
+    user = User.objects.create_user(username="bench", email="bench@example.com", password="bench-password")
+    first = Book.objects.order_by("id").first()
+    for i in range(20):
+        owner = User.objects.create(username=f"reviewer{i}", email=f"reviewer{i}@example.com")
+        Review.objects.create(owner=owner, book=first, body="Review", rating=i % 5 + 1)
+    return str(MyTokenObtainPairSerializer.get_token(user).access_token), list(Book.objects.values_list("id", flat=True))
+
+
+def request_paths(rng, book_ids, books):
+    """Mix of the catalogue read endpoints, spread over pages and books."""
+    pages = max(books // 5, 1)
+    while True:
+        yield rng.choice([
+            f"/books/?page={rng.randint(1, pages)}",
+            f"/books/{rng.choice(book_ids)}/",
+            f"/authors/?page={rng.randint(1, max(pages // 10, 1))}",
+            f"/book/{book_ids[0]}/all-reviews/",
+        ])
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent request capacity of the WSGI deployment (sync views, a fixed pool "
+        "of worker threads) and the ASGI deployment (api.async_views on one event loop). Both "
+        "handlers are driven in-process against a throwaway test database, so the numbers "
+        "measure Django and the views rather than a particular HTTP server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=50, help="Simultaneous clients.")
+        parser.add_argument("--threads", type=int, default=8, help="WSGI worker threads (gthread-style).")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run.")
+        parser.add_argument("--books", type=int, default=2000)
+        parser.add_argument("--db-latency-ms", type=float, default=0.0,
+                            help="Sleep added to every query, to mimic a database across the network.")
+        parser.add_argument("--cache", action="store_true", help="Keep the response cache on.")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        overrides = {
+            "DEBUG": False, "ALLOWED_HOSTS": [HOST],
+            "API_THROTTLING": False, "API_MAX_CONCURRENT_REQUESTS": 0, "API_MAX_CONCURRENT_WRITES": 0,
+        }
+        if not options["cache"]:
+            overrides["CACHES"] = {
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "api": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+                "auth": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            }
+
+        latency = options["db_latency_ms"] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_query)
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            token, book_ids = seed(options["books"])
+            if latency:
+                connection_created.connect(add_latency)
+                connection.execute_wrappers.append(slow_query)
+
+            results = []
+            for label, urlconf, runner in [("wsgi", "api.urls", self.run_wsgi), ("asgi", "api.async_urls", self.run_asgi)]:
+                with override_settings(ROOT_URLCONF=urlconf, **overrides):
+                    paths = request_paths(random.Random(0), book_ids, options["books"])
+                    results.append(self.summarize(label, asyncio.run(runner(paths, token, options)), options))
+        finally:
+            connection_created.disconnect(add_latency)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for result in results:
+                self.stdout.write(
+                    f"{result['deployment']}: {result['requests_per_second']:.1f} req/s, "
+                    f"p50 {result['p50_ms']:.1f}ms, p95 {result['p95_ms']:.1f}ms, p99 {result['p99_ms']:.1f}ms, "
+                    f"errors {result['errors']}, peak threads {result['peak_threads']}"
+                )
+
+    async def drive(self, paths, options, send_request):
+        """Run `--concurrency` clients back to back for `--seconds`; returns (latencies, errors, peak threads)."""
+        latencies, errors, peak = [], 0, threading.active_count()
+        deadline = time.perf_counter() + options["seconds"]
+
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                status = await send_request(next(paths))
+                latencies.append(time.perf_counter() - started)
+                errors += status != 200
+
+        async def sample_threads():
+            nonlocal peak
+            while time.perf_counter() < deadline:
+                peak = max(peak, threading.active_count())
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(sample_threads(), *(client() for _ in range(options["concurrency"])))
+        return latencies, errors, peak
+
+    async def run_wsgi(self, paths, token, options):
+        application = get_wsgi_application()
+
+        def call(path):
+            path, _, query = path.partition("?")
+            environ = {
+                "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query, "SCRIPT_NAME": "",
+                "SERVER_NAME": HOST, "SERVER_PORT": "80", "HTTP_HOST": HOST, "SERVER_PROTOCOL": "HTTP/1.1",
+                "HTTP_AUTHORIZATION": f"Bearer {token}", "wsgi.url_scheme": "http", "wsgi.input": io.BytesIO(),
+                "wsgi.errors": io.StringIO(),
+            }
+            status = []
+            body = application(environ, lambda status_line, headers: status.append(int(status_line[:3])))
+            b"".join(body)
+            body.close()
+            return status[0]
+
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            return await self.drive(paths, options, lambda path: loop.run_in_executor(pool, call, path))
+
+    async def run_asgi(self, paths, token, options):
+        application = get_asgi_application()
+
+        async def call(path):
+            path, _, query = path.partition("?")
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+                "root_path": "", "server": (HOST, 80), "client": ("127.0.0.1", 0),
+                "headers": [(b"host", HOST.encode()), (b"authorization", f"Bearer {token}".encode())],
+            }
+            status = []
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            await application(scope, receive, send)
+            return status[0]
+
+        return await self.drive(paths, options, call)
+
+    def summarize(self, deployment, run, options):
+        latencies, errors, peak_threads = run
+        latencies = sorted(latency * 1000 for latency in latencies)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            "deployment": deployment,
+            "concurrency": options["concurrency"],
+            "threads": options["threads"] if deployment == "wsgi" else None,
+            "db_latency_ms": options["db_latency_ms"],
+            "requests": len(latencies),
+            "requests_per_second": round(len(latencies) / options["seconds"], 1),
+            "p50_ms": round(quantiles[49], 2),
+            "p95_ms": round(quantiles[94], 2),
+            "p99_ms": round(quantiles[98], 2),
+            "errors": errors,
+            "peak_threads": peak_threads,
+        }
@@ -0,0 +1,96 @@
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializer import BookSerializer
+from books.models import Author, Book
+
+
+def configurations():
+    yield "json (standard library)", JSONRenderer(), JSONParser()
+    try:
+        from api.renderers import ORJSONParser, ORJSONRenderer
+    except ImportError:
+        return
+    yield "orjson", ORJSONRenderer(), ORJSONParser()
+
+
+def seed(books):
+    authors = Author.objects.bulk_create(Author(name=f"Name {i}", last_name=f"Last {i}") for i in range(max(books // 10, 1)))
+    Book.objects.bulk_create(
+        Book(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=authors[i % len(authors)],
+             average_rating=i % 50 / 10, review_count=i % 7)
+        for i in range(books)
+    )
+
+
+def rate(func, seconds):
+    """Calls of `func` per second over `seconds`."""
+    count, start = 0, time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        func()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure JSON rendering and parsing throughput of each JSON backend on one page of "
+        "--books BookSerializer items, seeded in a throwaway test database. Serializing the "
+        "page (to_representation) is measured once, as the part the backends share."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1000, help="Items on the page.")
+        parser.add_argument("--seconds", type=float, default=2.0, help="Measuring time per step and backend.")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        seconds = options["seconds"]
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=["testserver"]):
+                seed(options["books"])
+                request = Request(APIRequestFactory().get("/api/books/"))
+                page = list(Book.objects.select_related("author").order_by("id"))
+                serialize = lambda: BookSerializer(page, many=True, context={"request": request}).data
+                data = serialize()
+                serialize_rate = rate(serialize, seconds)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results = []
+        for label, renderer, parser in configurations():
+            body = renderer.render(data)
+            parsed = parser.parse(io.BytesIO(body))
+            results.append({
+                "backend": label,
+                "items": len(page),
+                "page_bytes": len(body),
+                "pages_rendered_per_second": round(rate(lambda: renderer.render(data), seconds), 1),
+                "pages_parsed_per_second": round(rate(lambda: parser.parse(io.BytesIO(body)), seconds), 1),
+                "pages_serialized_per_second": round(serialize_rate, 1),
+                "round_trip_matches": parsed == json.loads(JSONRenderer().render(data)),
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            items = result["items"]
+            self.stdout.write(
+                f"{result['backend']:<24} render {result['pages_rendered_per_second'] * items:>10.0f} items/s  "
+                f"parse {result['pages_parsed_per_second'] * items:>10.0f} items/s  "
+                f"(serialize {result['pages_serialized_per_second'] * items:.0f} items/s, "
+                f"{result['page_bytes']} bytes/page)"
+            )
@@ -0,0 +1,126 @@
+import json
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from api.serializer import MyTokenObtainPairSerializer
+from books.models import Author, Book, Review
+
+
+HOST = "testserver"
+
+
+def seed(books, writers):
+    author = Author.objects.create(name="Name", last_name="Last")
+    Book.objects.bulk_create(Book(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=author) for i in range(books))
+    users = User.objects.bulk_create(User(username=f"writer{i}", email=f"writer{i}@example.com") for i in range(writers))
+    tokens = [str(MyTokenObtainPairSerializer.get_token(user).access_token) for user in users]
+    return tokens, list(Book.objects.order_by("id").values_list("id", flat=True))
+
+
+class Command(BaseCommand):
+    help = (
+        "Stress concurrent writes: --threads clients each post --reviews reviews through "
+        "ReviewCreateAPIView at once, against a throwaway file-backed test database of the "
+        "configured SQLITE_PROFILE. Reports throughput, latency and failed requests; run it "
+        "with SQLITE_PROFILE=default and =production to compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent writers.")
+        parser.add_argument("--reviews", type=int, default=50, help="Reviews posted by each writer.")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        overrides = {
+            "DEBUG": False, "ALLOWED_HOSTS": [HOST], "ROOT_URLCONF": "api.urls",
+            "API_THROTTLING": False, "API_MAX_CONCURRENT_REQUESTS": 0, "API_MAX_CONCURRENT_WRITES": 0,
+            "CACHES": {
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "api": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+                "auth": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            },
+        }
+        old_name = connection.settings_dict["NAME"]
+        with tempfile.TemporaryDirectory() as directory:
+            # Lock contention needs a real file: in-memory test databases fail differently.
+            connection.settings_dict["TEST"]["NAME"] = str(Path(directory) / "benchmark_writes.sqlite3")
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(**overrides):
+                    tokens, book_ids = seed(options["reviews"], options["threads"])
+                    result = self.run(tokens, book_ids, options)
+                    totals = Book.objects.aggregate(reviews=Sum("review_count"))
+                    result["consistent"] = Review.objects.count() == result["created"] == (totals["reviews"] or 0)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write(
+            f"{result['profile']} ({result['engine']}), {result['threads']} writers: "
+            f"{result['writes_per_second']:.1f} writes/s, p50 {result['p50_ms']:.1f}ms, p95 {result['p95_ms']:.1f}ms, "
+            f"created {result['created']}/{result['requests']}, errors {result['errors']}"
+            f"{' (' + result['first_error'] + ')' if result['first_error'] else ''}, "
+            f"aggregates {'consistent' if result['consistent'] else 'INCONSISTENT'}"
+        )
+
+    def run(self, tokens, book_ids, options):
+        latencies, failures = [], []
+        start = threading.Barrier(len(tokens) + 1)
+
+        def writer(token):
+            client = Client(HTTP_AUTHORIZATION=f"Bearer {token}", raise_request_exception=False)
+            start.wait()
+            try:
+                for i, book_id in enumerate(book_ids):
+                    began = time.perf_counter()
+                    try:
+                        response = client.post(reverse("review-create", args=[book_id]),
+                                               {"body": "Review", "rating": i % 5 + 1}, content_type="application/json")
+                        exc_info = getattr(response, "exc_info", None)
+                        error = None if response.status_code == 201 else (
+                            f"HTTP {response.status_code}" + (f" {exc_info[1]!r}" if exc_info else ""))
+                    except Exception as exc:
+                        error = f"{type(exc).__name__}: {exc}"
+                    latencies.append(time.perf_counter() - began)
+                    if error:
+                        failures.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=writer, args=(token,)) for token in tokens]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        latencies = sorted(latency * 1000 for latency in latencies)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            "profile": settings.SQLITE_PROFILE,
+            "engine": connection.settings_dict["ENGINE"],
+            "threads": len(tokens),
+            "requests": len(latencies),
+            "created": len(latencies) - len(failures),
+            "errors": len(failures),
+            "first_error": failures[0] if failures else None,
+            "writes_per_second": round((len(latencies) - len(failures)) / elapsed, 1),
+            "p50_ms": round(quantiles[49], 2),
+            "p95_ms": round(quantiles[94], 2),
+        }
@@ -0,0 +1,210 @@
+"""
+Per-request performance instrumentation.
+
+`RequestMetricsMiddleware` times every request and records, per URL name (e.g.
+`books-list`): wall time, SQL query count and SQL time (an execute wrapper installed on
+every database connection as it opens), serialization time (rendering the response body) and
+response size. Each response gets a `Server-Timing` header with its own numbers, and
+`metrics` keeps process-local totals plus the last `API_METRICS_WINDOW` samples for
+percentiles, exported in Prometheus text format by the admin-only `/api/_metrics/`.
+"""
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+UNMATCHED = "<unmatched>"
+QUANTILES = (0.5, 0.9, 0.99)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# field -> (metric name, help text)
+SERIES = {
+    "duration": ("api_request_duration_seconds", "Wall time of the request."),
+    "db_queries": ("api_request_db_queries", "SQL queries run by the request."),
+    "db_time": ("api_request_db_duration_seconds", "Time spent in SQL queries."),
+    "serialize_time": ("api_request_serialize_duration_seconds", "Time spent rendering the response body."),
+    "response_bytes": ("api_response_size_bytes", "Size of the response body."),
+}
+
+
+class QueryTimer:
+    """Query count and SQL time of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Database connections are per thread, and the async views run their queries in a worker
+# thread, so the wrapper stays installed and finds the request's timer through a context
+# variable, which sync_to_async carries over to that thread.
+_current_timer = ContextVar("query_timer", default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.duration += time.perf_counter() - start
+        timer.count += 1
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_query)
+
+
+@contextmanager
+def timing_queries(timer):
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+class RequestMetrics:
+    """Process-local totals and a sliding window of samples per view name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def _new_view(self):
+        window = getattr(settings, "API_METRICS_WINDOW", 1024)
+        return {
+            "count": 0,
+            "sums": defaultdict(float),
+            "windows": {field: deque(maxlen=window) for field in SERIES},
+        }
+
+    def record(self, view_name, **values):
+        with self._lock:
+            view = self._views.get(view_name)
+            if view is None:
+                view = self._views[view_name] = self._new_view()
+            view["count"] += 1
+            for field in SERIES:
+                view["sums"][field] += values[field]
+                view["windows"][field].append(values[field])
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": view["count"],
+                    "sums": dict(view["sums"]),
+                    "windows": {field: sorted(samples) for field, samples in view["windows"].items()},
+                }
+                for name, view in self._views.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for field, (metric, help_text) in SERIES.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for name in sorted(snapshot):
+                view = snapshot[name]
+                label = f'view="{_escape(name)}"'
+                for quantile in QUANTILES:
+                    value = percentile(view["windows"][field], quantile)
+                    lines.append(f'{metric}{{{label},quantile="{quantile}"}} {_number(value)}')
+                lines.append(f"{metric}_sum{{{label}}} {_number(view['sums'].get(field, 0))}")
+                lines.append(f"{metric}_count{{{label}}} {view['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = RequestMetrics()
+
+
+def percentile(samples, quantile):
+    """Nearest-rank percentile of already sorted samples."""
+    if not samples:
+        return float("nan")
+    return samples[max(0, math.ceil(quantile * len(samples)) - 1)]
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if value != value:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RequestMetricsMiddleware:
+    """Put it first in `MIDDLEWARE` so the wall time covers the whole stack."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        timer = QueryTimer()
+        with timing_queries(timer):
+            response = self.get_response(request)
+        return self.finish(request, response, start, timer)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        timer = QueryTimer()
+        with timing_queries(timer):
+            response = await self.get_response(request)
+        return self.finish(request, response, start, timer)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; do it here to time it.
+        start = time.perf_counter()
+        response.render()
+        request._metrics_serialize_time = time.perf_counter() - start
+        return response
+
+    def finish(self, request, response, start, timer):
+        duration = time.perf_counter() - start
+        serialize_time = getattr(request, "_metrics_serialize_time", 0.0)
+        match = getattr(request, "resolver_match", None)
+        view_name = (match.url_name if match else None) or UNMATCHED
+        response_bytes = 0 if response.streaming else len(response.content)
+
+        metrics.record(
+            view_name,
+            duration=duration,
+            db_queries=timer.count,
+            db_time=timer.duration,
+            serialize_time=serialize_time,
+            response_bytes=response_bytes,
+        )
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={timer.duration * 1000:.2f};desc="{timer.count} queries"',
+            f"serialize;dur={serialize_time * 1000:.2f}",
+            f"total;dur={duration * 1000:.2f}",
+        ])
+        return response
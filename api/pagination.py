@@ -1,7 +1,138 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a stable ordering, so deep pages cost the same as the first one.
+    Views may set `cursor_ordering`; the total count is only computed with `?count=true`.
+    """
+    page_size = 5
+    page_size_query_param = "page_size"
+    ordering = "id"
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, "").lower() in ("1", "true"):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Cursor decoding and the page query share one sync pass; run it off the event loop.
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "cursor_ordering", self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def get_pagination_data(self):
+        data = OrderedDict()
+        if self.count is not None:
+            data["count"] = self.count
+        data["next"] = self.get_next_link()
+        data["previous"] = self.get_previous_link()
+        return data
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([*self.get_pagination_data().items(), ("results", data)]))
 
 
 class ReviewPagination(PageNumberPagination):
+    """
+    Page number pagination, switching to `KeysetPagination` when the request carries
+    `?cursor=...` or `?pagination=cursor`.
+    """
     page_size = 5
     page_query_param = "page"
-    page_size_query_param = "page_size"
\ No newline at end of file
+    page_size_query_param = "page_size"
+    mode_query_param = "pagination"
+    cursor_pagination_class = KeysetPagination
+
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_paginator = self.cursor_pagination_class()
+        if (cursor_paginator.cursor_query_param in request.query_params
+                or request.query_params.get(self.mode_query_param) == "cursor"):
+            self.cursor_paginator = cursor_paginator
+            return cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """`paginate_queryset` for async views: the count and the page are read with the async ORM."""
+        self.cursor_paginator = None
+        cursor_paginator = self.cursor_pagination_class()
+        if (cursor_paginator.cursor_query_param in request.query_params
+                or request.query_params.get(self.mode_query_param) == "cursor"):
+            self.cursor_paginator = cursor_paginator
+            return await cursor_paginator.apaginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+    def get_pagination_data(self):
+        """`count`/`next`/`previous` of the current page, for views building their own envelope."""
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_pagination_data()
+        return OrderedDict([
+            ("count", self.page.paginator.count),
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+        ])
+
+    def result_is_empty(self, page):
+        """
+        Whether the whole queryset is empty, judged from the `page` just returned without
+        another query; None when an empty page came from a cursor, which may be stale.
+        """
+        if page:
+            return False
+        if self.cursor_paginator is None:
+            # Page numbers past the last page raise NotFound, so this is the first page.
+            return True
+        return True if self.cursor_paginator.cursor is None else None
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class LeaderboardPagination(PageNumberPagination):
+    page_size = 10
+    page_query_param = "page"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class SearchPagination(PageNumberPagination):
+    """Search results are ranked, not keyed on a column, so they only support page numbers."""
+    page_size = 10
+    page_query_param = "page"
+    page_size_query_param = "page_size"
+    max_page_size = 100
@@ -0,0 +1,50 @@
+"""
+JSON renderer and parser backed by orjson (needs the optional orjson package), selected
+with `JSON_BACKEND` in settings.
+
+The output matches DRF's compact `JSONRenderer`: UTC datetimes end in "Z", UUIDs and
+dates are ISO strings, hyperlinks are plain strings and anything orjson does not know
+(Decimal, timedelta, lazy strings, querysets...) goes through DRF's own encoder. Requests
+for an indented response other than `indent=2` fall back to the standard library.
+"""
+import codecs
+
+import orjson
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import encoders
+
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    default = staticmethod(encoders.JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent not in (None, 2):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        options = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+        ret = orjson.dumps(data, default=self.default, option=options)
+        # Like JSONRenderer, escape the two characters that are valid JSON but not JavaScript.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            body = stream.read()
+            if codecs.lookup(encoding).name != "utf-8":
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except (ValueError, LookupError) as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -0,0 +1,125 @@
+"""
+Read replica routing.
+
+When `DATABASE_REPLICA_ALIAS` names a database, `ReplicaRouter` sends the reads of books
+and accounts models made while serving a safe request (GET, HEAD, OPTIONS) to it.
+Everything else stays on "default": writes, reads of unsafe requests or made after the
+request wrote, other apps (sessions, tasks...), management commands and background tasks.
+
+After a client writes, its safe requests keep reading from the primary for
+`DATABASE_REPLICA_PIN_SECONDS`, so it sees its own writes despite replication lag. Clients
+are told apart by their credentials (the Authorization header or the session cookie); the
+pins live in the `DATABASE_REPLICA_PIN_CACHE_ALIAS` cache, which must be shared by all
+processes. `ReplicaRoutingMiddleware` sets up the routing of each request.
+
+The API response cache is shared by every client, so it does the same for everyone: a
+miss of a namespace written in the last `DATABASE_REPLICA_PIN_SECONDS` is filled from the
+primary (`use_primary`), or the replica's pre-write rows would be cached as current.
+"""
+import hashlib
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+
+
+PRIMARY = "default"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+
+
+# Like the query timer of api.metrics, a context variable reaches the worker thread of
+# async views through sync_to_async, while background task threads start without one.
+_state = ContextVar("replica_routing", default=None)
+
+
+def replica_alias():
+    return settings.DATABASE_REPLICA_ALIAS
+
+
+def get_pin_cache():
+    return caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS]
+
+
+def use_primary():
+    """Send the remaining reads of the current request to the primary."""
+    state = _state.get()
+    if state is not None:
+        state.use_replica = False
+
+
+def pin_key(request):
+    credentials = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credentials:
+        return None
+    return f"replica:pin:{hashlib.sha256(credentials.encode()).hexdigest()}"
+
+
+class ReplicaRouter:
+    route_app_labels = {"books", "accounts"}
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        alias = replica_alias()
+        if alias and state is not None and state.use_replica and model._meta.app_label in self.route_app_labels:
+            return alias
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # The rest of the request reads its own writes.
+        use_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema from the primary.
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = pin_key(request) if replica_alias() else None
+        pinned = key is not None and request.method in SAFE_METHODS and get_pin_cache().get(key) is not None
+        token = _state.set(self.initial_state(request, pinned))
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if key is not None and request.method not in SAFE_METHODS:
+            get_pin_cache().set(key, True, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        key = pin_key(request) if replica_alias() else None
+        pinned = key is not None and request.method in SAFE_METHODS and await get_pin_cache().aget(key) is not None
+        token = _state.set(self.initial_state(request, pinned))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if key is not None and request.method not in SAFE_METHODS:
+            await get_pin_cache().aset(key, True, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
+
+    def initial_state(self, request, pinned):
+        return RoutingState(use_replica=bool(replica_alias()) and request.method in SAFE_METHODS and not pinned)
@@ -1,35 +1,145 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.urls import reverse
-from django.db.models import Avg
 from django.contrib.auth.password_validation import validate_password
 
-from rest_framework import serializers
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
 from rest_framework.validators import UniqueValidator
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.tokens import Token
 
-from books.models import Author, Book, Review
+from books.models import Author, AuthorRanking, Book, BookRanking, Review
+from books.images import VARIANTS as IMAGE_VARIANTS, variant_url
+from books.signals import catalogue_bulk_changed
+from accounts.hashers import HashingPoolBusy
 from accounts.models import User
 
+from .authentication import CREDENTIALS_CLAIM, check_not_revoked, credentials_version
+from .fieldsets import SparseFieldsMixin
 
 
 
 
 
 
+
+class ImageVariantField(serializers.Field):
+    """
+    Read-only URL of one derivative of an image field, or of every variant
+    (plus the original) as a dict when no variant is given.
+    """
+    def __init__(self, variant=None, **kwargs):
+        kwargs["read_only"] = True
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def _url(self, value, variant):
+        url = variant_url(value, variant)
+        request = self.context.get("request")
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, value):
+        if self.variant is not None:
+            return self._url(value, self.variant)
+        return {variant: self._url(value, variant) for variant in ["original", *IMAGE_VARIANTS]}
+
+
+
 """ REVIEW SERIALIZERS"""
 
-class ReviewSerializer(serializers.ModelSerializer):
-    owner = serializers.CharField(read_only=True)
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    owner = serializers.CharField(source="owner.username", read_only=True)
     class Meta:
         model = Review
         fields = ["owner" ,"body", "rating"]
 
-class UserReviewsSerializer(serializers.ModelSerializer):
+
+RECENT_REVIEWS_ATTR = "recent_reviews"
+
+
+def prefetch_recent_reviews(queryset):
+    """
+    Prefetch the newest `API_BOOK_DETAIL_REVIEWS` reviews of each book into
+    `book.recent_reviews`. The slice makes it one windowed query for all books.
+    """
+    sliced = queryset.order_by("-created_at", "-id")[:settings.API_BOOK_DETAIL_REVIEWS]
+    return Prefetch("reviews", queryset=sliced, to_attr=RECENT_REVIEWS_ATTR)
+
+
+class RecentReviewListSerializer(serializers.ListSerializer):
+    """The reviews embedded in a book, read from `prefetch_recent_reviews`."""
+
+    def prefetch(self, queryset):
+        return prefetch_recent_reviews(queryset)
+
+    def get_attribute(self, instance):
+        if not hasattr(instance, RECENT_REVIEWS_ATTR):
+            prefetch_related_objects([instance], prefetch_recent_reviews(Review.objects.select_related("owner")))
+        return getattr(instance, RECENT_REVIEWS_ATTR)
+
+
+class ReviewBulkListSerializer(serializers.ListSerializer):
+    """
+    Validates a batch of the current user's reviews with two queries (existing books,
+    books already reviewed) and creates it with one bulk_create. Errors are reported
+    per entry, like any list serializer.
+    """
+
+    def to_internal_value(self, data):
+        attrs = super().to_internal_value(data)
+        book_ids = [item["book_id"] for item in attrs]
+        existing_books = set(Book.objects.filter(id__in=book_ids).values_list("id", flat=True))
+        reviewed = set(Review.objects.filter(owner=self.context["request"].user.pk, book_id__in=book_ids)
+                       .values_list("book_id", flat=True))
+
+        errors, seen = [], set()
+        for book_id in book_ids:
+            if book_id not in existing_books:
+                errors.append({"book": [f"Book {book_id} does not exist."]})
+            elif book_id in reviewed:
+                errors.append({"book": [f"You have already reviewed book {book_id}."]})
+            elif book_id in seen:
+                errors.append({"book": [f"Book {book_id} appears more than once."]})
+            else:
+                errors.append({})
+            seen.add(book_id)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        book_ids = {item["book_id"] for item in validated_data}
+        try:
+            with transaction.atomic():
+                reviews = Review.objects.bulk_create(Review(**item) for item in validated_data)
+                Book.objects.rebuild_rating_aggregates(book_ids)
+        except IntegrityError:
+            raise serializers.ValidationError("You have already reviewed one of these books.")
+        # The rebuild already invalidated the books themselves.
+        catalogue_bulk_changed.send(sender=Review, models=[Review])
+        return reviews
+
+
+class ReviewBulkSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    book = serializers.IntegerField(source="book_id", min_value=1)
+
+    class Meta:
+        model = Review
+        fields = ["book", "body", "rating"]
+        list_serializer_class = ReviewBulkListSerializer
+
+
+class UserReviewsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     update_review = serializers.HyperlinkedIdentityField(view_name="review-detail", lookup_field="pk")
     book = serializers.SerializerMethodField()
     class Meta:
         model = Review
         fields = ["book","body", "rating", "update_review"]
+        method_sources = {"book": ["book__title"]}
 
     def get_book(self, obj):
         return obj.book.title
@@ -37,64 +147,69 @@ class UserReviewsSerializer(serializers.ModelSerializer):
 
 
 """ AUTHOR SERIALIZERS """
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     details = serializers.HyperlinkedIdentityField(view_name="author-detail", lookup_field="pk")
+    image = ImageVariantField("thumbnail")
+    image_webp = ImageVariantField("thumbnail_webp", source="image")
     class Meta:
         model = Author
-        fields = ["name", "last_name", "details"]
+        fields = ["name", "last_name", "image", "image_webp", "details"]
 
 
-class AuthorCreateSerializer(serializers.ModelSerializer):
+class AuthorCreateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = "__all__"
 
 
-class AuthorDetailSerializer(serializers.ModelSerializer):
+class AuthorDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     written_books = serializers.StringRelatedField(many=True, read_only=True)
+    images = ImageVariantField(source="image")
     class Meta:
         model = Author
-        fields = ["id", "name", "last_name", "bio", "birth_date", "death_date", "image", "written_books" ]
+        fields = ["id", "name", "last_name", "bio", "birth_date", "death_date", "image", "images", "written_books" ]
+        collapsed_fields = {"written_books": lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True)}
     
 
 
 """ BOOKS SERIALIZERS"""
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     book_author = serializers.SerializerMethodField(read_only=True)
     detail = serializers.HyperlinkedIdentityField(view_name="book-detail", lookup_field="pk")
     add_review = serializers.HyperlinkedIdentityField(view_name="review-create", lookup_field="pk")
-    average_rating = serializers.SerializerMethodField()
-    review_quantity = serializers.SerializerMethodField()
+    image = ImageVariantField("thumbnail")
+    image_webp = ImageVariantField("thumbnail_webp", source="image")
+    average_rating = serializers.FloatField(read_only=True)
+    review_quantity = serializers.IntegerField(source="review_count", read_only=True)
 
     class Meta:
         model = Book
-        fields = ["id", "title", "book_author", "image", "detail", "add_review", "average_rating", "review_quantity"]
+        fields = ["id", "title", "book_author", "image", "image_webp", "detail", "add_review", "average_rating", "review_quantity"]
+        method_sources = {"book_author": ["author__name", "author__last_name"]}
 
     def get_book_author(self, obj):
         return f"{obj.author.name} {obj.author.last_name}"
     
-    def get_average_rating(self, obj):
-        review = Review.objects.filter(book=obj)
-        avg = review.aggregate(Avg("rating", default=0)) 
-        return avg["rating__avg"]
-    
-    def get_review_quantity(self, obj):
-        review_count = Review.objects.filter(book=obj).count()
-        return review_count
-    
 
-class BookCreateSerializer(serializers.ModelSerializer):
+class BookCreateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = "__all__"
 
 
-class BookDetailSerializer(serializers.ModelSerializer):
+class BookDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = AuthorSerializer()
-    reviews = ReviewSerializer(many=True, read_only=True)
+    reviews = RecentReviewListSerializer(child=ReviewSerializer(), read_only=True)
+    all_reviews = serializers.HyperlinkedIdentityField(view_name="review-for-book", lookup_field="pk")
+    images = ImageVariantField(source="image")
     class Meta:
         model = Book
         fields = "__all__"
+        collapsed_fields = {
+            "author": lambda: serializers.HyperlinkedRelatedField(view_name="author-detail", read_only=True),
+            # all_reviews links to them.
+            "reviews": None,
+        }
 
     def get_book_author(self, obj):
         return f"{obj.author.name} {obj.author.last_name}"
@@ -121,10 +236,65 @@ class BookDetailSerializer(serializers.ModelSerializer):
 
 
 
+"""LEADERBOARD SERIALIZERS"""
+
+class BookRankingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    id = serializers.IntegerField(source="book_id", read_only=True)
+    title = serializers.CharField(source="book.title", read_only=True)
+    book_author = serializers.SerializerMethodField()
+    detail = serializers.HyperlinkedRelatedField(source="book", view_name="book-detail", read_only=True)
+    average_rating = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BookRanking
+        fields = ["id", "title", "book_author", "detail", "score", "average_rating", "review_count"]
+        method_sources = {
+            "book_author": ["book__author__name", "book__author__last_name"],
+            "average_rating": ["rating_sum", "rating_count"],
+        }
+
+    def get_book_author(self, obj):
+        return f"{obj.book.author.name} {obj.book.author.last_name}"
+
+    def get_average_rating(self, obj):
+        return obj.average_rating
+
+
+class AuthorRankingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    id = serializers.IntegerField(source="author_id", read_only=True)
+    name = serializers.CharField(source="author.name", read_only=True)
+    last_name = serializers.CharField(source="author.last_name", read_only=True)
+    details = serializers.HyperlinkedRelatedField(source="author", view_name="author-detail", read_only=True)
+    average_rating = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AuthorRanking
+        fields = ["id", "name", "last_name", "details", "score", "average_rating", "review_count"]
+        method_sources = {"average_rating": ["rating_sum", "rating_count"]}
+
+    def get_average_rating(self, obj):
+        return obj.average_rating
+
+
+"""SEARCH SERIALIZERS"""
+
+class SearchResultSerializer(SparseFieldsMixin, serializers.Serializer):
+    type = serializers.CharField(source="kind")
+    score = serializers.FloatField()
+    result = serializers.SerializerMethodField()
+
+    def get_result(self, obj):
+        path = self.serializer_path() + ("result",)
+        if obj.kind == "book":
+            return BookSerializer(obj.object, context=self.context, field_path=path).data
+        return AuthorSerializer(obj.object, context=self.context, field_path=path).data
+
+
+
 """ACCOUNTS SERIALIZERS"""
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     update_profile = serializers.HyperlinkedIdentityField(view_name="update-profile", lookup_field="username")
     change_password = serializers.HyperlinkedIdentityField(view_name="change-password", lookup_field="username")
     reviews = serializers.SerializerMethodField()
@@ -132,24 +302,45 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["username", "email", "update_profile", "change_password", "reviews"]
+        method_sources = {"reviews": []}
 
     def get_reviews(self, obj):
         reviews = Review.objects.filter(owner=obj).count()
         return reviews
 
 
+class LoginUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many logins in progress, try again shortly."
+    default_code = "login_unavailable"
+
+
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    def validate(self, attrs):
+        try:
+            return super().validate(attrs)
+        except HashingPoolBusy:
+            raise LoginUnavailable()
+
     @classmethod
     def get_token(cls, user) -> Token:
         token =  super(MyTokenObtainPairSerializer, cls).get_token(user)
 
         token["username"] = user.username
         token["email"] = user.email
+        token["is_staff"] = user.is_staff
+        token[CREDENTIALS_CLAIM] = credentials_version(user)
 
         return token
 
 
-class RegisterUserSerializer(serializers.ModelSerializer):
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        check_not_revoked(self.token_class(attrs["refresh"]))
+        return super().validate(attrs)
+
+
+class RegisterUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     email = serializers.EmailField(required=True, validators=[UniqueValidator(queryset=User.objects.all())])
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
@@ -175,7 +366,7 @@ class RegisterUserSerializer(serializers.ModelSerializer):
         return user
  
 
-class ChangePasswordSerializer(serializers.ModelSerializer):
+class ChangePasswordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
     old_password = serializers.CharField(write_only=True, required=True)
@@ -205,7 +396,7 @@ class ChangePasswordSerializer(serializers.ModelSerializer):
     
 
 
-class UpdateUserProfileSerializer(serializers.ModelSerializer):
+class UpdateUserProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["email", "username"]
@@ -1,13 +1,59 @@
 from rest_framework.test import APITestCase, APIRequestFactory
 from rest_framework import status
-
-from django.urls import reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.relations import Hyperlink
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from django.urls import include, path, resolve, reverse
 from django.contrib.auth import get_user_model
-
-from datetime import date
-
-from books.models import Book, Author, Review
-
+from django.contrib.auth.hashers import make_password
+from django.conf import settings
+from django.core.cache import cache as default_cache, caches
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, connections, router, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+from PIL import Image
+
+from books import images, rankings
+from books.models import Book, Author, AuthorRanking, BookRanking, Review
+from accounts.hashers import get_executor as get_hashing_executor
+from api import async_views, benchmark
+from api.authentication import check_revocation_cache, user_cache
+from api.cache import CachedResponseMixin, get_cache, get_versions, invalidate, stats as cache_stats
+from api.metrics import metrics, percentile
+from api.serializer import BookDetailSerializer
+from api.replicas import ReplicaRoutingMiddleware
+from api.throttling import AdmissionControlMiddleware, LocalBuckets, TokenBucketThrottle, admission, local_buckets
+from DRF_library_API.sqlite.base import DatabaseWrapper as ProductionSQLiteWrapper
+from books.tasks import request_rankings_refresh
+from tasks.models import Task
+
+if find_spec("orjson"):
+    from api.renderers import ORJSONParser, ORJSONRenderer
 
 
 User = get_user_model()
@@ -199,7 +245,36 @@ class BooksApiViews(APITestCase):
         self.assertEqual(response.data["count"], 1)
         self.assertEqual(response.data["results"][0]["title"], "Test Title")
         self.assertEqual(response.data["results"][0]["book_author"], "Test Author")
+
+    def test_book_list_reads_stored_aggregates(self):
+        user = User.objects.create_user(username="Reader", email="reader@email.com", password="password")
+        Review.objects.create(owner=user, book=self.book, body="Test review", rating=3)
+        Review.objects.create(owner=self.superuser, book=self.book, body="Test review", rating=4)
+        self.authenticate()
+
+        response = self.client.get(self.book_list_url)
+
+        self.assertEqual(response.data["results"][0]["average_rating"], 3.5)
+        self.assertEqual(response.data["results"][0]["review_quantity"], 2)
     
+    def test_book_list_cursor_pagination(self):
+        for i in range(4):
+            Book.objects.create(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=self.author)
+        self.authenticate()
+
+        response = self.client.get(self.book_list_url, {"pagination": "cursor", "page_size": 3})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual([book["id"] for book in response.data["results"]], [1, 2, 3])
+
+        response = self.client.get(response.data["next"] + "&count=true")
+
+        self.assertEqual(response.data["count"], 5)
+        self.assertIsNone(response.data["next"])
+        self.assertEqual([book["id"] for book in response.data["results"]], [4, 5])
+
     def test_book_list_get_unauthorize(self):
 
         response = self.client.get(self.book_list_url)
@@ -473,8 +548,9 @@ class ReviewsAPIViews(APITestCase):
         self.assertEqual(response.data["detail"], "You do not have permission to perform this action.")
 
     def test_user_reviews(self):
+        second_edition = Book.objects.create(title="Test Title", ISBN="1234567890124", author=self.author)
         Review.objects.create(owner=self.user, book=self.book, body="Test review 1", rating=5)
-        Review.objects.create(owner=self.user, book=self.book, body="Test review 2", rating=1)
+        Review.objects.create(owner=self.user, book=second_edition, body="Test review 2", rating=1)
 
         self.authenticate()
 
@@ -490,6 +566,83 @@ class ReviewsAPIViews(APITestCase):
         self.assertEqual(response.data["data"][1]["rating"], 1)
 
 
+    def test_user_reviews_cursor_pagination(self):
+        for i in range(3):
+            book = Book.objects.create(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=self.author)
+            Review.objects.create(owner=self.user, book=book, body=f"Test review {i}", rating=5)
+
+        self.authenticate()
+
+        response = self.client.get(self.user_reviews, {"pagination": "cursor", "page_size": 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["data"]), 2)
+
+        response = self.client.get(response.data["next"])
+
+        self.assertEqual(response.data["data"][0]["body"], "Test review 2")
+        self.assertIsNone(response.data["next"])
+
+
+    def test_review_changes_update_book_aggregates(self):
+        self.authenticate()
+        self.client.post(self.review_create_url, data={"body": "test body", "rating": 4})
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.review_count, 1)
+        self.assertEqual(self.book.rating_sum, 4)
+        self.assertEqual(self.book.average_rating, 4)
+
+        other = User.objects.create_user(username="Other", email="other@email.com", password="password")
+        Review.objects.create(owner=other, book=self.book, body="No rating")
+
+        self.client.put(self.review_detail, data={"body": "Updated body", "rating": "1"})
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.review_count, 2)
+        self.assertEqual(self.book.rating_count, 1)
+        self.assertEqual(self.book.average_rating, 1)
+
+        self.client.delete(self.review_detail)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.review_count, 1)
+        self.assertEqual(self.book.rating_count, 0)
+        self.assertEqual(self.book.rating_sum, 0)
+        self.assertEqual(self.book.average_rating, 0)
+
+
+    def test_cascading_deletes_skip_aggregates_of_deleted_books(self):
+        Review.objects.create(owner=self.user, book=self.book, body="Test review 1", rating=5)
+        Review.objects.create(owner=self.superuser, book=self.book, body="Test review 2", rating=2)
+
+        for delete in (self.author.delete, Author.objects.all().delete):
+            with self.subTest(delete=delete), CaptureQueriesContext(connection) as queries:
+                delete()
+            self.assertFalse([query for query in queries if query["sql"].startswith('UPDATE "books_book"')])
+            self.author = Author.objects.create(name="Test", last_name="Author")
+            self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", author=self.author)
+            Review.objects.create(owner=self.user, book=self.book, body="Test review", rating=5)
+
+        self.user.delete()
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.review_count, 0)
+
+    def test_rebuild_book_ratings_command(self):
+        Review.objects.create(owner=self.user, book=self.book, body="Test review 1", rating=5)
+        Review.objects.create(owner=self.superuser, book=self.book, body="Test review 2", rating=2)
+        Book.objects.update(review_count=0, rating_count=0, rating_sum=0, average_rating=0)
+
+        call_command("rebuild_book_ratings", stdout=StringIO())
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.review_count, 2)
+        self.assertEqual(self.book.rating_sum, 7)
+        self.assertEqual(self.book.average_rating, 3.5)
+
+
 
 class AuthAPIView(APITestCase):
     def setUp(self) -> None:
@@ -555,15 +708,1697 @@ class AuthAPIView(APITestCase):
 
 
 
+class QueryBudgetTests(APITestCase):
+    """Pin the number of SQL queries per endpoint, independent of how many rows a page holds."""
 
-        
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", author=self.author)
+
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def seed(self, count):
+        start = Author.objects.count()
+        for i in range(start, start + count):
+            author = Author.objects.create(name=f"Name {i}", last_name=f"Last {i}")
+            book = Book.objects.create(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=author)
+            Book.objects.create(title=f"Second {i}", ISBN=f"{9790000000000 + i}", author=self.author)
+            owner = User.objects.create_user(username=f"user{i}", email=f"user{i}@email.com", password="password")
+            Review.objects.create(owner=owner, book=self.book, body="Review", rating=4)
+            Review.objects.create(owner=self.user, book=book, body="Review", rating=3)
+
+    def query_count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"page_size": 50})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def assert_budget(self, url, budget):
+        self.seed(2)
+        small = self.query_count(url)
+        self.seed(10)
+        large = self.query_count(url)
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, budget)
+
+    def test_author_list_budget(self):
+        self.assert_budget(reverse("authors-list"), 2)
+
+    def test_author_detail_budget(self):
+        self.assert_budget(reverse("author-detail", kwargs={"pk": self.author.pk}), 2)
+
+    def test_book_list_budget(self):
+        self.assert_budget(reverse("books-list"), 2)
+
+    def test_book_detail_budget(self):
+        self.assert_budget(reverse("book-detail", kwargs={"pk": self.book.pk}), 3)
+
+    def test_reviews_for_book_budget(self):
+        self.assert_budget(reverse("review-for-book", kwargs={"pk": self.book.pk}), 4)
+
+    def test_user_reviews_budget(self):
+        self.assert_budget(reverse("user_review"), 2)
+
+    def test_leaderboard_budget(self):
+        self.seed(3)
+        default_cache.clear()
+        self.client.get(reverse("books-top"))
+        get_cache().clear()
+
+        self.assertEqual(self.query_count(reverse("books-top")), 2)
+        self.assertEqual(self.query_count(reverse("authors-top")), 2)
+
+    def test_review_lists_are_single_pass(self):
+        empty_book = Book.objects.create(title="Empty", ISBN="9781111111111", author=self.author)
+        self.seed(3)
+        get_cache().clear()
+
+        def queries(url, **params):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [query["sql"] for query in captured]
+
+        # Validators, book, count and page; the page joins the owners.
+        book_url = reverse("review-for-book", kwargs={"pk": self.book.pk})
+        book_queries = queries(book_url)
+        self.assertEqual(len(book_queries), 4)
+        self.assertIn("accounts_user", book_queries[-1])
+        self.assertEqual(len(queries(book_url, pagination="cursor")), 3)
+        self.assertEqual(len(queries(reverse("review-for-book", kwargs={"pk": empty_book.pk}))), 3)
+
+        user_queries = queries(reverse("user_review"))
+        self.assertEqual(len(user_queries), 2)
+        self.assertIn("books_book", user_queries[-1])
+        Review.objects.filter(owner=self.user).delete()
+        self.assertEqual(len(queries(reverse("user_review"))), 1)
+
+    def test_review_detail_budget(self):
+        self.seed(1)
+        review = Review.objects.filter(owner=self.user).first()
+        self.assertLessEqual(self.query_count(reverse("review-detail", kwargs={"pk": review.pk})), 1)
+
+    def test_user_profile_budget(self):
+        self.seed(3)
+        self.assertLessEqual(self.query_count(reverse("user-profile", kwargs={"username": "Test"})), 2)
+
+
+class QueryPlanTests(APITestCase):
+    """
+    Run every SELECT an endpoint issues through EXPLAIN QUERY PLAN on a seeded dataset.
+    Filtered queries must be answered from an index, and no page may be sorted in a
+    temporary b-tree. Unfiltered pages walking the primary key are the only scans allowed.
+    """
+
+    def setUp(self) -> None:
+        get_cache().clear()
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+        authors = Author.objects.bulk_create(
+            Author(name=f"Name {i}", last_name=f"Last {i % 50}") for i in range(200))
+        books = Book.objects.bulk_create(
+            Book(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=authors[i % 200],
+                 published=date(1950 + i % 70, 1, 1)) for i in range(500))
+        owners = User.objects.bulk_create(
+            User(username=f"user{i}", email=f"user{i}@email.com", password="!") for i in range(100))
+        Review.objects.bulk_create(
+            Review(owner=owners[i % 100], book=books[i // 100], body="Review", rating=i % 5 + 1) for i in range(2000))
+        Review.objects.bulk_create(Review(owner=self.user, book=book, rating=4) for book in books[:200])
+        Book.objects.rebuild_rating_aggregates()
+        self.author, self.book = authors[0], books[0]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def plan_problems(self, sql):
+        # A sliced prefetch wraps its windowed query in subqueries and re-sorts the
+        # at most N rows per parent it keeps; only the inner query has to be indexed.
+        windowed = '"qualify_mask"' in sql
+        problems, subqueries = [], set()
+        for step in self.explain(sql):
+            scan = re.match(r"SCAN (\S+)$", step)
+            if step.startswith("CO-ROUTINE "):
+                subqueries.add(step[len("CO-ROUTINE "):])
+            elif step.startswith("USE TEMP B-TREE FOR ORDER BY") and not windowed:
+                problems.append(step)
+            elif scan and scan.group(1) not in subqueries and (" WHERE " in sql or " LIMIT " not in sql):
+                problems.append(step)
+        return problems
+
+    def assert_indexed(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for query in queries:
+            if query["sql"].startswith("SELECT"):
+                self.assertEqual(self.plan_problems(query["sql"]), [], f"{url}: {query['sql']}")
+        return response
+
+    def assert_pages_indexed(self, url):
+        self.assert_indexed(url, {"page": 2})
+        response = self.assert_indexed(url, {"pagination": "cursor", "page_size": 20})
+        self.assert_indexed(response.data["next"])
+
+    def test_catalogue_lists(self):
+        self.assert_pages_indexed(reverse("authors-list"))
+        self.assert_pages_indexed(reverse("books-list"))
+
+    def test_catalogue_details(self):
+        self.assert_indexed(reverse("author-detail", kwargs={"pk": self.author.pk}))
+        self.assert_indexed(reverse("book-detail", kwargs={"pk": self.book.pk}))
+
+    def test_leaderboards(self):
+        default_cache.clear()
+        request_rankings_refresh()
+
+        for name in ("books-top", "authors-top"):
+            for by in ("rating", "reviews"):
+                self.assert_indexed(reverse(name), {"by": by, "period": "month"})
+
+    def test_review_lists(self):
+        self.assert_pages_indexed(reverse("review-for-book", kwargs={"pk": self.book.pk}))
+        self.assert_pages_indexed(reverse("user_review"))
+
+    def test_review_detail_and_profile(self):
+        review = Review.objects.filter(owner=self.user).first()
+        self.assert_indexed(reverse("review-detail", kwargs={"pk": review.pk}))
+        self.assert_indexed(reverse("user-profile", kwargs={"username": "Test"}))
+
+    def test_harness_reports_full_scans(self):
+        self.assertNotEqual(self.plan_problems('SELECT * FROM "books_review" WHERE "rating" = 4'), [])
+        self.assertNotEqual(self.plan_problems('SELECT * FROM "books_book" ORDER BY "title" LIMIT 10'), [])
+        self.assertEqual(self.plan_problems('SELECT * FROM "books_book" WHERE "published" > \'2000-01-01\''), [])
+
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self) -> None:
+        cache_stats.reset()
+        self.superuser = User.objects.create_superuser(username="Superuser", email="super@email.com", password="testpassword")
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", author=self.author)
+
+    def authenticate(self, email="test@email.com", password="password"):
+        response = self.client.post(reverse("jwt-create"), {"email": email, "password": password})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_repeated_get_is_served_from_cache(self):
+        self.authenticate()
+        url = reverse("book-detail", kwargs={"pk": self.book.pk})
+        first = self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+
+        # Only the conditional GET validator remains; authentication reads the token claims.
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(cache_stats.snapshot()["book-detail"], {"hits": 1, "misses": 1})
+
+    def test_review_write_invalidates_cached_book(self):
+        self.authenticate()
+        self.client.get(reverse("books-list"))
+        self.client.get(reverse("review-for-book", kwargs={"pk": self.book.pk}))
+
+        self.client.post(reverse("review-create", kwargs={"pk": self.book.pk}), {"body": "test body", "rating": 4})
+
+        books = self.client.get(reverse("books-list"))
+        reviews = self.client.get(reverse("review-for-book", kwargs={"pk": self.book.pk}))
+
+        self.assertEqual(books.data["results"][0]["review_quantity"], 1)
+        self.assertEqual(reviews.data["data"][0]["body"], "test body")
+
+    def test_query_params_are_part_of_the_key(self):
+        Book.objects.create(title="Second", ISBN="1234567890124", author=self.author)
+        self.authenticate()
+
+        first = self.client.get(reverse("books-list"), {"page_size": 1})
+        second = self.client.get(reverse("books-list"), {"page_size": 1, "page": 2})
+
+        self.assertEqual(first.data["results"][0]["title"], "Test Title")
+        self.assertEqual(second.data["results"][0]["title"], "Second")
+
+    def test_rating_rebuild_invalidates_cached_books(self):
+        self.authenticate()
+        detail_url = reverse("book-detail", kwargs={"pk": self.book.pk})
+        self.client.get(reverse("books-list"))
+        self.client.get(detail_url)
+        # bulk_create skips Review.save, so the stored aggregates are stale until the rebuild.
+        Review.objects.bulk_create([Review(owner=self.user, book=self.book, body="Review", rating=4)])
+
+        call_command("rebuild_book_ratings", stdout=StringIO())
+
+        self.assertEqual(self.client.get(reverse("books-list")).data["results"][0]["review_quantity"], 1)
+        self.assertEqual(self.client.get(detail_url).data["review_count"], 1)
+
+    def test_only_renames_invalidate_usernames(self):
+        versions = get_versions(["users"])
+        self.authenticate()
+        self.user.set_password("Newpassword123")
+        self.user.save()
+        self.assertEqual(get_versions(["users"]), versions)
+
+        self.user.username = "Renamed"
+        self.user.save()
+        self.assertNotEqual(get_versions(["users"]), versions)
+
+    def test_scheme_is_part_of_the_key(self):
+        self.authenticate()
+        url = reverse("book-detail", kwargs={"pk": self.book.pk})
+
+        self.client.get(url)
+        response = self.client.get(url, secure=True)
+
+        self.assertTrue(response.data["all_reviews"].startswith("https://"))
+        self.assertEqual(cache_stats.snapshot()["book-detail"], {"hits": 0, "misses": 2})
+
+    def test_cache_stats_admin_only(self):
+        self.authenticate()
+        self.assertEqual(self.client.get(reverse("cache-stats")).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.get(reverse("authors-list"))
+        self.authenticate("super@email.com", "testpassword")
+        response = self.client.get(reverse("cache-stats"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["authors-list"], {"hits": 0, "misses": 1})
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", author=self.author)
+        self.url = reverse("book-detail", kwargs={"pk": self.book.pk})
+
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get(self.url).headers["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 1)
+
+    def test_if_modified_since_returns_not_modified(self):
+        Book.objects.filter(pk=self.book.pk).update(updated_at=datetime(2020, 1, 1, 12, 0, 0, 500000, tzinfo=timezone.utc))
+        Author.objects.filter(pk=self.author.pk).update(updated_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        last_modified = self.client.get(self.url).headers["Last-Modified"]
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(last_modified, "Wed, 01 Jan 2020 12:00:00 GMT")
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_in_the_current_second_only_get_an_etag(self):
+        Book.objects.filter(pk=self.book.pk).update(updated_at=datetime.now(timezone.utc))
+        response = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", response.headers)
+
+        # A client holding a date from before cannot get a 304 for a same-second change.
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response.headers["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_review_changes_the_etag(self):
+        reviews_url = reverse("review-for-book", kwargs={"pk": self.book.pk})
+        book_etag = self.client.get(self.url).headers["ETag"]
+        reviews_etag = self.client.get(reviews_url).headers["ETag"]
+
+        Review.objects.create(owner=self.user, book=self.book, body="Test review", rating=5)
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=book_etag).status_code, status.HTTP_200_OK)
+        response = self.client.get(reviews_url, HTTP_IF_NONE_MATCH=reviews_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], reviews_etag)
+
+    def test_only_renaming_a_reviewer_touches_their_books(self):
+        Review.objects.create(owner=self.user, book=self.book, body="Test review", rating=5)
+        touched = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        Book.objects.filter(pk=self.book.pk).update(updated_at=touched)
+        user = User.objects.get(pk=self.user.pk)
+
+        user.set_password("Newpassword123")
+        user.save()
+        user.first_name = "First"
+        user.save()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.updated_at, touched)
+
+        user.username = "Renamed"
+        user.save()
+        self.book.refresh_from_db()
+        self.assertGreater(self.book.updated_at, touched)
+
+    def test_pages_have_distinct_etags(self):
+        reviews_url = reverse("review-for-book", kwargs={"pk": self.book.pk})
+
+        first = self.client.get(reviews_url, {"page": 1})
+        second = self.client.get(reviews_url, {"page_size": 1})
+
+        self.assertNotEqual(first.headers["ETag"], second.headers["ETag"])
+
+
+
+class SearchAPIViewTests(APITestCase):
+    def setUp(self) -> None:
+        self.url = reverse("search")
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Andrzej", last_name="Sapkowski", bio="Polish fantasy writer")
+        self.witcher = Book.objects.create(title="The Last Wish", description="Geralt the witcher", ISBN="9788375780635", author=self.author)
+        self.other = Book.objects.create(title="Witcher Tales", description="Short stories", ISBN="9788375780636", author=self.author)
+
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_title_match_ranks_first(self):
+        data = self.search(q="witcher")
+
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(data["results"][0]["type"], "book")
+        self.assertEqual(data["results"][0]["result"]["title"], "Witcher Tales")
+        self.assertEqual(data["results"][1]["result"]["title"], "The Last Wish")
+
+    def test_search_by_author_and_isbn(self):
+        by_author = self.search(q="sapkow", type="author")
+        by_isbn = self.search(q="9788375780635")
+
+        self.assertEqual(by_author["count"], 1)
+        self.assertEqual(by_author["results"][0]["result"]["last_name"], "Sapkowski")
+        self.assertEqual([hit["result"]["title"] for hit in by_isbn["results"]], ["The Last Wish"])
+
+    def test_fields_select_inside_results(self):
+        data = self.search(q="witcher", fields="type,result.title")
+
+        self.assertEqual(data["results"][0], {"type": "book", "result": {"title": "Witcher Tales"}})
+
+    def test_index_follows_saves_and_deletes(self):
+        self.author.last_name = "Renamed"
+        self.author.save()
+        self.other.delete()
+
+        self.assertEqual(self.search(q="renamed", type="book")["count"], 1)
+        self.assertEqual(self.search(q="tales")["count"], 0)
+
+    def test_rebuild_search_index_command(self):
+        call_command("rebuild_search_index", stdout=StringIO())
+
+        self.assertEqual(self.search(q="wish")["count"], 1)
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"q": "x", "type": "user"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookImportTests(APITestCase):
+    def setUp(self) -> None:
+        self.url = reverse("books-import")
+        self.superuser = User.objects.create_superuser(username="Superuser", email="super@email.com", password="testpassword")
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Andrzej", last_name="Sapkowski")
+        Book.objects.create(title="Existing", ISBN="9788375780635", author=self.author)
+
+    def authenticate(self, email, password):
+        response = self.client.post(reverse("jwt-create"), {"email": email, "password": password})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def upload(self, name, content, **data):
+        return self.client.post(self.url, {"file": SimpleUploadedFile(name, content.encode()), **data}, format="multipart")
+
+    def test_jsonl_import_by_admin(self):
+        lines = [
+            {"title": "Blood of Elves", "isbn": "978-83-7578-064-2", "author_name": "andrzej", "author_last_name": "SAPKOWSKI"},
+            {"title": "Solaris", "isbn": "9788308049342", "author_name": "Stanislaw", "author_last_name": "Lem", "published": "1961-01-01"},
+            {"title": "Duplicate", "isbn": "9788375780635", "author_name": "A", "author_last_name": "B"},
+            {"title": "Bad ISBN", "isbn": "123", "author_name": "A", "author_last_name": "B"},
+        ]
+        self.authenticate("super@email.com", "testpassword")
+
+        response = self.upload("books.jsonl", "\n".join(json.dumps(line) for line in lines) + "\n{broken", batch_size=1)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["authors_created"], 1)
+        self.assertEqual(response.data["failed"], 3)
+        self.assertEqual([error["line"] for error in response.data["errors"]], [3, 4, 5])
+
+        elves = Book.objects.get(title="Blood of Elves")
+        self.assertEqual(elves.ISBN, "978-83-757806-4-2")
+        self.assertEqual(elves.author, self.author)
+
+        search = self.client.get(reverse("search"), {"q": "solaris"})
+        self.assertEqual(search.data["results"][0]["result"]["book_author"], "Stanislaw Lem")
+
+    def test_import_by_user(self):
+        self.authenticate("test@email.com", "password")
+
+        response = self.upload("books.csv", "title,isbn,author_name,author_last_name\n")
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_catalogue_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write("title,isbn,author_name,author_last_name,description\n")
+            csv_file.write("Solaris,9788308049342,Stanislaw,Lem,Ocean planet\n")
+            csv_file.write("The Cyberiad,9788308049343,Stanislaw,Lem,\n")
+        self.addCleanup(os.remove, csv_file.name)
+
+        call_command("import_catalogue", csv_file.name, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(Author.objects.get(last_name="Lem").written_books.count(), 2)
+
+
+class CatalogueExportTests(APITestCase):
+    def setUp(self) -> None:
+        self.superuser = User.objects.create_superuser(username="Superuser", email="super@email.com", password="testpassword")
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", author=self.author)
+        Review.objects.create(owner=self.user, book=self.book, body="Test review", rating=4)
+
+    def authenticate(self, email, password):
+        response = self.client.post(reverse("jwt-create"), {"email": email, "password": password})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def export(self, table, **params):
+        response = self.client.get(reverse("catalogue-export", kwargs={"table": table}), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_jsonl_export(self):
+        self.authenticate("super@email.com", "testpassword")
+
+        rows = [json.loads(line) for line in self.export("reviews").splitlines()]
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["owner_id"], str(self.user.id))
+        self.assertEqual(rows[0]["rating"], 4)
+
+    def test_csv_export_with_since_filter(self):
+        self.authenticate("super@email.com", "testpassword")
+        Book.objects.filter(pk=self.book.pk).update(updated_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        Book.objects.create(title="Fresh", ISBN="1234567890124", author=self.author)
+
+        lines = self.export("books", file_format="csv", since="2023-01-01T00:00:00Z").splitlines()
+
+        self.assertEqual(lines[0].split(",")[:3], ["id", "title", "ISBN"])
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[1].split(",")[1], "Fresh")
+
+    def test_since_accepts_dates_and_local_timestamps(self):
+        self.authenticate("super@email.com", "testpassword")
+        Book.objects.filter(pk=self.book.pk).update(updated_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        Book.objects.create(title="Fresh", ISBN="1234567890124", author=self.author)
+
+        for since in ["2023-01-01", "2023-01-01T00:00:00"]:
+            with self.subTest(since=since):
+                lines = self.export("books", file_format="csv", since=since).splitlines()
+                self.assertEqual([line.split(",")[1] for line in lines[1:]], ["Fresh"])
+
+    def test_invalid_since_is_rejected(self):
+        self.authenticate("super@email.com", "testpassword")
+        url = reverse("catalogue-export", kwargs={"table": "books"})
+
+        for since in ["yesterday", "2026-13-40T00:00:00"]:
+            response = self.client.get(url, {"since": since})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("since", response.data)
+        with self.assertRaisesMessage(CommandError, "--since must be an ISO 8601 timestamp or date."):
+            call_command("export_catalogue", "books", since="2026-13-40T00:00:00", stdout=StringIO())
 
+    def test_export_by_user(self):
+        self.authenticate("test@email.com", "password")
 
+        response = self.client.get(reverse("catalogue-export", kwargs={"table": "books"}))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_catalogue_command(self):
+        out = StringIO()
+
+        call_command("export_catalogue", "authors", stdout=out)
+
+        self.assertEqual(json.loads(out.getvalue())["last_name"], "Author")
+
+
+class ImageVariantTests(APITestCase):
+    def setUp(self) -> None:
+        default_cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        buffer = BytesIO()
+        Image.new("RGB", (1200, 800), "red").save(buffer, "JPEG")
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author", image=SimpleUploadedFile("portrait.jpg", buffer.getvalue()))
+        self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", author=self.author,
+                                        image=SimpleUploadedFile("cover.jpg", buffer.getvalue()))
+
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_variants_created_on_upload(self):
+        storage = self.book.image.storage
+
+        with storage.open("derivatives/thumbnail/book_image/cover.jpg.webp") as thumbnail:
+            self.assertLessEqual(max(Image.open(thumbnail).size), 160)
+        self.assertTrue(storage.exists("derivatives/medium/book_image/cover.jpg.jpg"))
+        self.assertTrue(storage.exists("derivatives/medium/author_img/portrait.jpg.webp"))
+
+    def test_list_returns_thumbnails(self):
+        book = self.client.get(reverse("books-list")).data["results"][0]
+        author = self.client.get(reverse("authors-list")).data["results"][0]
+
+        self.assertTrue(book["image"].endswith("/media/derivatives/thumbnail/book_image/cover.jpg.jpg"))
+        self.assertTrue(book["image_webp"].endswith("/media/derivatives/thumbnail/book_image/cover.jpg.webp"))
+        self.assertTrue(author["image"].endswith("/media/derivatives/thumbnail/author_img/portrait.jpg.jpg"))
+
+    def test_detail_returns_every_variant(self):
+        images = self.client.get(reverse("book-detail", kwargs={"pk": self.book.pk})).data["images"]
+
+        self.assertEqual(set(images), {"original", "thumbnail", "thumbnail_webp", "medium", "medium_webp"})
+        self.assertTrue(images["original"].endswith("/media/book_image/cover.jpg"))
+
+    def test_missing_variant_is_created_lazily(self):
+        storage = self.book.image.storage
+        storage.delete("derivatives/thumbnail/book_image/cover.jpg.webp")
+
+        self.client.get(reverse("books-list"))
+
+        self.assertTrue(storage.exists("derivatives/thumbnail/book_image/cover.jpg.webp"))
+
+    def test_sources_with_other_extensions_get_their_own_variants(self):
+        self.assertNotEqual(images.derivative_name("book_image/cover.jpg", "thumbnail_webp"),
+                            images.derivative_name("book_image/cover.png", "thumbnail_webp"))
+
+    def test_unreadable_source_is_not_retried(self):
+        storage = self.book.image.storage
+        storage.delete("derivatives/thumbnail/book_image/cover.jpg.webp")
+        storage.delete(self.book.image.name)
+
+        with mock.patch.object(images, "generate_variants", wraps=images.generate_variants) as generate, \
+                self.assertLogs("books.images", "WARNING") as logs:
+            first = images.variant_url(self.book.image, "thumbnail_webp")
+            second = images.variant_url(self.book.image, "thumbnail_webp")
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(first, second)
+        self.assertTrue(first.endswith("/media/book_image/cover.jpg"))
+        self.assertEqual(generate.call_count, 1)
 
 
+class StatelessAuthTests(APITestCase):
+    def setUp(self) -> None:
+        user_cache.clear()
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", author=self.author)
+        self.tokens = self.login("password")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def login(self, password):
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": password})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def user_queries(self, queries):
+        return [query for query in queries if 'FROM "accounts_user"' in query["sql"]]
+
+    def assert_revoked(self, response):
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data["detail"].code, "token_revoked")
+
+    def test_safe_requests_do_not_load_the_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("user_review"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.user_queries(queries), [])
+
+    def login_superuser(self):
+        superuser = User.objects.create_superuser(username="Superuser", email="super@email.com", password="testpassword")
+        response = self.client.post(reverse("jwt-create"), {"email": "super@email.com", "password": "testpassword"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return superuser
 
+    def test_staff_claims_are_checked_against_the_user(self):
+        self.login_superuser()
+
+        with CaptureQueriesContext(connection) as first_queries:
+            response = self.client.get(reverse("cache-stats"))
+        with CaptureQueriesContext(connection) as second_queries:
+            self.client.get(reverse("cache-stats"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.user_queries(first_queries)), 1)
+        self.assertEqual(self.user_queries(second_queries), [])
+
+    def test_losing_staff_status_revokes_existing_tokens(self):
+        superuser = self.login_superuser()
+        superuser.is_staff = False
+        superuser.save()
+
+        for name in ["cache-stats", "metrics", "books-list"]:
+            self.assert_revoked(self.client.get(reverse(name)))
+
+    def test_revocation_does_not_depend_on_the_cache_for_loaded_users(self):
+        superuser = self.login_superuser()
+        superuser.is_superuser = False
+        superuser.save()
+        # As after an eviction, or in a process that never saw the change.
+        caches[settings.AUTH_CACHE_ALIAS].clear()
+        user_cache.clear()
+
+        self.assert_revoked(self.client.get(reverse("cache-stats")))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+        self.user.set_password("Newpassword123")
+        self.user.save()
+        caches[settings.AUTH_CACHE_ALIAS].clear()
+        self.assert_revoked(self.client.post(reverse("review-create", kwargs={"pk": self.book.pk}), {"body": "Review"}))
+
+    def test_unrelated_changes_keep_tokens(self):
+        self.user.first_name = "Changed"
+        self.user.save()
+
+        self.assertEqual(self.client.get(reverse("books-list")).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse("review-create", kwargs={"pk": self.book.pk}), {"body": "Review"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_deploy_check_requires_a_shared_revocation_cache(self):
+        self.assertEqual([error.id for error in check_revocation_cache(None)], ["api.E001"])
+        shared = {**settings.CACHES, "auth": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_revocation_cache(None), [])
+
+    def test_writes_reuse_the_cached_user(self):
+        second = Book.objects.create(title="Second", ISBN="1234567890124", author=self.author)
+        data = {"body": "Review", "rating": 4}
+
+        with CaptureQueriesContext(connection) as first_queries:
+            self.client.post(reverse("review-create", kwargs={"pk": self.book.pk}), data)
+        with CaptureQueriesContext(connection) as second_queries:
+            response = self.client.post(reverse("review-create", kwargs={"pk": second.pk}), data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Review.objects.filter(owner=self.user).count(), 2)
+        self.assertEqual(len(self.user_queries(first_queries)), 1)
+        self.assertEqual(self.user_queries(second_queries), [])
+
+    def test_password_change_revokes_existing_tokens(self):
+        data = {"old_password": "password", "password": "Newpassword123", "password2": "Newpassword123"}
+        response = self.client.put(reverse("change-password", kwargs={"username": "Test"}), data=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assert_revoked(self.client.get(reverse("books-list")))
+        response = self.client.post(reverse("token_refresh"), {"refresh": self.tokens["refresh"]})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login('Newpassword123')['access']}")
+        self.assertEqual(self.client.get(reverse("books-list")).status_code, status.HTTP_200_OK)
+
+    def test_deactivation_revokes_existing_tokens(self):
+        self.user.is_active = False
+        self.user.save()
+
+        self.assert_revoked(self.client.get(reverse("books-list")))
+
+
+@override_settings(PASSWORD_HASHERS=["accounts.hashers.ScryptPasswordHasher", "accounts.hashers.PBKDF2PasswordHasher"])
+class LoginHashingTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+
+    def login(self):
+        return self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password("password", hasher="pbkdf2_sha256"))
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$"))
+        self.assertTrue(self.user.check_password("password"))
+
+    def test_hash_upgrade_on_login_keeps_existing_tokens(self):
+        book = Book.objects.create(title="Test Title", ISBN="1234567890123",
+                                   author=Author.objects.create(name="Test", last_name="Author"))
+        with override_settings(PASSWORD_HASHERS=["accounts.hashers.PBKDF2PasswordHasher"]):
+            User.objects.filter(pk=self.user.pk).update(password=make_password("password"))
+            first = self.login().data["access"]
+
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$"))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {first}")
+        response = self.client.post(reverse("review-create", kwargs={"pk": book.pk}), {"body": "Review", "rating": 4})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def while_hashing_pool_is_full(self, func):
+        _, slots = get_hashing_executor()
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        try:
+            return func()
+        finally:
+            for _ in range(taken):
+                slots.release()
+
+    def test_inactive_users_hash_is_not_upgraded(self):
+        outdated = make_password("password", hasher="pbkdf2_sha256")
+        User.objects.filter(pk=self.user.pk).update(password=outdated, is_active=False)
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, outdated)
+
+    def test_login_unavailable_while_hashing_pool_is_full(self):
+        response = self.while_hashing_pool_is_full(self.login)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    def test_admin_login_unavailable_while_hashing_pool_is_full(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        data = {"username": "test@email.com", "password": "password"}
+
+        response = self.while_hashing_pool_is_full(lambda: self.client.post("/admin/login/", data))
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(self.client.post("/admin/login/", data).status_code, status.HTTP_302_FOUND)
+
+
+# Root URLconf for AsyncViewTests: the API routes served by api.async_views.
+urlpatterns = [path("api/", include("api.async_urls"))]
+
+
+class AsyncViewTests(APITestCase):
+    def setUp(self) -> None:
+        get_cache().clear()
+        self.superuser = User.objects.create_superuser(username="Superuser", email="super@email.com", password="testpassword")
+        User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", author=self.author)
+        for i in range(7):
+            owner = User.objects.create_user(username=f"user{i}", email=f"user{i}@email.com", password="password")
+            Review.objects.create(owner=owner, book=self.book, body=f"Review {i}", rating=i % 5 + 1)
+            Book.objects.create(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=self.author)
+
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+        self.token = response.data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+    def async_request(self, method, url, token=None, **kwargs):
+        headers = {"authorization": f"Bearer {token or self.token}", **kwargs.pop("headers", {})}
+        async def request():
+            return await getattr(self.async_client, method)(url, headers=headers, **kwargs)
+
+        with override_settings(ROOT_URLCONF="api.tests"):
+            return async_to_sync(request)()
+
+    def test_views_are_async(self):
+        with override_settings(ROOT_URLCONF="api.tests"):
+            self.assertTrue(iscoroutinefunction(resolve(reverse("books-list")).func))
+
+    def test_responses_match_sync_views(self):
+        urls = [
+            reverse("authors-list"),
+            reverse("authors-list") + "?page=2",
+            reverse("author-detail", kwargs={"pk": self.author.pk}),
+            reverse("books-list") + "?page_size=3&page=2",
+            reverse("books-list") + "?pagination=cursor&page_size=3",
+            reverse("book-detail", kwargs={"pk": self.book.pk}),
+            reverse("review-for-book", kwargs={"pk": self.book.pk}),
+            reverse("review-for-book", kwargs={"pk": self.book.pk}) + "?pagination=cursor",
+            reverse("review-for-book", kwargs={"pk": self.book.pk + 1}),
+            reverse("review-for-book", kwargs={"pk": 9999}),
+            reverse("book-detail", kwargs={"pk": self.book.pk}) + "?fields=title,author.name&expand=author",
+            reverse("review-for-book", kwargs={"pk": self.book.pk}) + "?fields=rating",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                expected = self.client.get(url)
+                get_cache().clear()
+                response = self.async_request("get", url)
+
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_checks_and_serializers_run_off_the_event_loop(self):
+        on_loop = {}
+
+        def record(name, original):
+            def wrapper(*args, **kwargs):
+                try:
+                    on_loop[name] = asyncio.get_running_loop() is not None
+                except RuntimeError:
+                    on_loop[name] = False
+                return original(*args, **kwargs)
+            return wrapper
+
+        view = async_views.BookDetailAPIView
+        with mock.patch.object(view, "initial", record("initial", view.initial)), \
+                mock.patch.object(BookDetailSerializer, "to_representation",
+                                  record("to_representation", BookDetailSerializer.to_representation)):
+            response = self.async_request("get", reverse("book-detail", kwargs={"pk": self.book.pk}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(on_loop, {"initial": False, "to_representation": False})
+
+    def test_missing_object_returns_not_found(self):
+        response = self.async_request("get", reverse("book-detail", kwargs={"pk": 9999}))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_matching_etag_returns_not_modified(self):
+        url = reverse("book-detail", kwargs={"pk": self.book.pk})
+        etag = self.async_request("get", url).headers["ETag"]
+
+        response = self.async_request("get", url, headers={"if-none-match": etag})
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_go_through_the_sync_handlers(self):
+        token = self.client.post(reverse("jwt-create"), {"email": "super@email.com", "password": "testpassword"}).data["access"]
+        url = reverse("book-detail", kwargs={"pk": self.book.pk})
+
+        response = self.async_request("delete", url, token=token)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Book.objects.filter(pk=self.book.pk).exists())
+
+        response = self.async_request("delete", reverse("author-detail", kwargs={"pk": self.author.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ReviewBulkCreateTests(APITestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        self.books = [Book.objects.create(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=self.author)
+                      for i in range(12)]
+        self.url = reverse("review-bulk-create")
 
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
 
+    def entries(self, books, rating=4):
+        return [{"book": book.pk, "body": f"Review of {book.title}", "rating": rating} for book in books]
 
+    def test_creates_reviews_and_updates_aggregates(self):
+        self.client.get(reverse("book-detail", kwargs={"pk": self.books[0].pk}))
 
+        response = self.client.post(self.url, self.entries(self.books[:3]), format="json")
 
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([entry["book"] for entry in response.data], [book.pk for book in self.books[:3]])
+        self.assertEqual(Review.objects.filter(owner=self.user).count(), 3)
+        book = Book.objects.get(pk=self.books[0].pk)
+        self.assertEqual((book.review_count, book.rating_count, book.average_rating), (1, 1, 4.0))
+
+        detail = self.client.get(reverse("book-detail", kwargs={"pk": self.books[0].pk}))
+        self.assertEqual(len(detail.data["reviews"]), 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def queries_for(books):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, self.entries(books), format="json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        queries_for(self.books[:1])  # loads the user into the write-path user cache
+        self.assertEqual(queries_for(self.books[1:3]), queries_for(self.books[3:12]))
+
+    def test_errors_are_reported_per_entry(self):
+        Review.objects.create(owner=self.user, book=self.books[1], body="Review", rating=3)
+        entries = self.entries([self.books[0], self.books[1], self.books[2], self.books[2]])
+        entries.append({"book": 9999, "body": "Missing", "rating": 5})
+
+        response = self.client.post(self.url, entries, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(response.data[1]["book"][0], f"You have already reviewed book {self.books[1].pk}.")
+        self.assertEqual(response.data[2], {})
+        self.assertEqual(response.data[3]["book"][0], f"Book {self.books[2].pk} appears more than once.")
+        self.assertEqual(response.data[4]["book"][0], "Book 9999 does not exist.")
+        self.assertEqual(Review.objects.filter(owner=self.user).count(), 1)
+
+    def test_invalid_fields_are_reported_per_entry(self):
+        entries = self.entries(self.books[:2])
+        entries[1]["rating"] = 6
+
+        response = self.client.post(self.url, entries, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("rating", response.data[1])
+
+    def test_batch_size_is_limited(self):
+        entries = self.entries(self.books[:1]) * 101
+
+        response = self.client.post(self.url, entries, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_database_rejects_duplicate_reviews(self):
+        Review.objects.create(owner=self.user, book=self.books[0], body="Review", rating=3)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Review.objects.create(owner=self.user, book=self.books[0], body="Again", rating=4)
+
+
+class RequestMetricsTests(APITestCase):
+    def setUp(self) -> None:
+        get_cache().clear()
+        metrics.reset()
+        self.superuser = User.objects.create_superuser(username="Superuser", email="super@email.com", password="testpassword")
+        User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        for i in range(3):
+            Book.objects.create(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=self.author)
+
+    def authenticate(self, email="test@email.com", password="password"):
+        response = self.client.post(reverse("jwt-create"), {"email": email, "password": password})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data["access"]
+
+    def test_server_timing_header(self):
+        self.authenticate()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("books-list"))
+
+        timing = response.headers["Server-Timing"]
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertRegex(timing, r"^db;dur=[\d.]+;desc=\"\d+ queries\", serialize;dur=[\d.]+, total;dur=[\d.]+$")
+
+    def test_metrics_are_recorded_per_view(self):
+        self.authenticate()
+        for _ in range(2):
+            response = self.client.get(reverse("books-list"))
+        self.client.get(reverse("author-detail", kwargs={"pk": self.author.pk}))
+
+        view = metrics.snapshot()["books-list"]
+        self.assertEqual(view["count"], 2)
+        self.assertEqual(view["windows"]["response_bytes"], [len(response.content)] * 2)
+        self.assertGreater(view["sums"]["serialize_time"], 0)
+        self.assertEqual(metrics.snapshot()["author-detail"]["count"], 1)
+
+    def test_metrics_endpoint_admin_only(self):
+        self.authenticate()
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.authenticate("super@email.com", "testpassword")
+        self.client.get(reverse("books-list"))
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn("# TYPE api_request_duration_seconds summary", body)
+        self.assertIn('api_request_duration_seconds_count{view="books-list"} 1', body)
+        self.assertRegex(body, r'api_request_db_queries\{view="books-list",quantile="0.99"\} \d+')
+
+    def test_async_views_are_measured(self):
+        token = self.authenticate()
+
+        async def request():
+            return await self.async_client.get(reverse("books-list"), headers={"authorization": f"Bearer {token}"})
+
+        with override_settings(ROOT_URLCONF="api.tests"):
+            response = async_to_sync(request)()
+
+        self.assertIn("Server-Timing", response.headers)
+        view = metrics.snapshot()["books-list"]
+        self.assertEqual(view["count"], 1)
+        self.assertGreater(view["sums"]["db_queries"], 0)
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 0.5), 50)
+        self.assertEqual(percentile(samples, 0.99), 99)
+        self.assertEqual(percentile([7], 0.9), 7)
+
+
+class BenchmarkSuiteTests(APITestCase):
+    def test_every_route_has_a_scenario(self):
+        self.assertEqual(benchmark.missing_routes(), set())
+
+    def test_scenarios_succeed_on_seeded_data(self):
+        rng = random.Random(0)
+        dataset = benchmark.seed(rng, authors=5, books=30, users=10, reviews=60)
+
+        self.assertEqual(Review.objects.count(), 60)
+        self.assertEqual(Book.objects.get(pk=dataset.books[0].pk).review_count,
+                         Review.objects.filter(book=dataset.books[0]).count())
+
+        results = benchmark.run(dataset, rng, requests=2, hash_requests=1, warmup=0)
+        self.assertEqual(set(results), set(benchmark.SCENARIOS))
+        for name, result in results.items():
+            with self.subTest(scenario=name):
+                self.assertEqual(result["errors"], 0, result["statuses"])
+        self.assertEqual(results["books-list"]["queries_max"], 2)
+
+    def test_compare_reports_regressions(self):
+        baseline = {"books-list": {"p95_ms": 10.0, "queries_mean": 2.0}, "search": {"p95_ms": 10.0, "queries_mean": 3.0}}
+        current = {"books-list": {"p95_ms": 11.0, "queries_mean": 3.0}, "search": {"p95_ms": 15.0, "queries_mean": 3.0},
+                   "metrics": {"p95_ms": 1.0, "queries_mean": 0.0}}
+
+        self.assertEqual(benchmark.compare(baseline, current, tolerance=0.2), [
+            "books-list: queries 2.0 -> 3.0",
+            "search: p95 10.0ms -> 15.0ms",
+        ])
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self) -> None:
+        get_cache().clear()
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", description="Long description", author=self.author)
+        for i in range(3):
+            owner = User.objects.create(username=f"user{i}", email=f"user{i}@email.com")
+            Review.objects.create(owner=owner, book=self.book, body=f"Review {i}", rating=i + 1)
+            Book.objects.create(title=f"Title {i}", ISBN=f"{9780000000000 + i}", author=self.author)
+
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.detail_url = reverse("book-detail", kwargs={"pk": self.book.pk})
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, queries
+
+    def test_fields_trim_output_and_queries(self):
+        full, full_queries = self.get(self.detail_url)
+        get_cache().clear()
+        narrow, narrow_queries = self.get(self.detail_url, fields="title")
+
+        self.assertEqual(narrow.data, {"title": "Test Title"})
+        self.assertLess(len(narrow.content), len(full.content))
+        self.assertEqual(len(narrow_queries), len(full_queries) - 1)
+        self.assertNotIn("description", narrow_queries[-1]["sql"])
+
+    def test_dotted_fields_select_nested_fields(self):
+        response, queries = self.get(self.detail_url, fields="title,reviews.rating")
+
+        self.assertEqual(response.data, {"title": "Test Title", "reviews": [{"rating": 3}, {"rating": 2}, {"rating": 1}]})
+        self.assertNotIn("accounts_user", queries[-1]["sql"])
+        self.assertNotIn("body", queries[-1]["sql"])
+
+    def test_expand_collapses_unlisted_relations_to_links(self):
+        response, queries = self.get(self.detail_url, expand="author")
+
+        self.assertEqual(response.data["author"]["name"], "Test")
+        self.assertNotIn("reviews", response.data)
+        self.assertEqual(response.data["all_reviews"], f"http://testserver{reverse('review-for-book', kwargs={'pk': self.book.pk})}")
+        self.assertFalse(any("books_review" in query["sql"] for query in queries))
+
+        get_cache().clear()
+        response, _ = self.get(self.detail_url, expand="")
+        self.assertEqual(response.data["author"], f"http://testserver{reverse('author-detail', kwargs={'pk': self.author.pk})}")
+
+        get_cache().clear()
+        response, _ = self.get(self.detail_url, expand="", fields="title,reviews")
+        self.assertEqual(response.data, {"title": "Test Title"})
+
+    def test_method_fields_load_only_their_sources(self):
+        response, queries = self.get(reverse("books-list"), fields="title,book_author")
+
+        self.assertEqual(response.data["results"][0], {"title": "Test Title", "book_author": "Test Author"})
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("description", queries[-1]["sql"])
+
+    def test_cursor_pages_keep_their_ordering_columns(self):
+        url = reverse("review-for-book", kwargs={"pk": self.book.pk})
+        response, queries = self.get(url, fields="rating", pagination="cursor", page_size=2)
+
+        self.assertEqual(response.data["data"], [{"rating": 1}, {"rating": 2}])
+        next_page, next_queries = self.get(response.data["next"])
+        self.assertEqual(next_page.data["data"], [{"rating": 3}])
+        self.assertEqual(len(next_queries), len(queries))
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get(self.detail_url, {"fields": "title,nope"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.detail_url, {"expand": "nope"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_nested_expand_paths_are_rejected(self):
+        response = self.client.get(self.detail_url, {"expand": "author.zzz"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data["expand"]), "Unknown fields: author.zzz.")
+        self.assertEqual(self.client.get(self.detail_url, {"expand": "title.x"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.get(self.detail_url, expand="author.name,reviews.rating")
+
+    def test_updates_ignore_sparse_fieldsets(self):
+        review = Review.objects.create(owner=self.user, book=self.book, body="Review", rating=4)
+        Review.objects.filter(pk=review.pk).update(updated_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        url = reverse("review-detail", kwargs={"pk": review.pk})
+
+        response = self.client.patch(f"{url}?fields=body", {"body": "Edited"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        review.refresh_from_db()
+        self.assertEqual(review.body, "Edited")
+        self.assertGreater(review.updated_at, datetime(2020, 1, 2, tzinfo=timezone.utc))
+
+
+@override_settings(API_BOOK_DETAIL_REVIEWS=2)
+class BookDetailReviewsTests(APITestCase):
+    def setUp(self) -> None:
+        get_cache().clear()
+        self.superuser = User.objects.create_superuser(username="Superuser", email="super@email.com", password="testpassword")
+        author = Author.objects.create(name="Test", last_name="Author")
+        self.book = Book.objects.create(title="Test Title", ISBN="1234567890123", author=author)
+        for i in range(4):
+            owner = User.objects.create(username=f"user{i}", email=f"user{i}@email.com")
+            Review.objects.create(owner=owner, book=self.book, body=f"Review {i}", rating=i + 1)
+        self.url = reverse("book-detail", kwargs={"pk": self.book.pk})
+
+        response = self.client.post(reverse("jwt-create"), {"email": "super@email.com", "password": "testpassword"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_embeds_newest_reviews_and_links_the_rest(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual([(review["owner"], review["body"]) for review in response.data["reviews"]],
+                         [("user3", "Review 3"), ("user2", "Review 2")])
+        self.assertEqual(response.data["all_reviews"], f"http://testserver{reverse('review-for-book', kwargs={'pk': self.book.pk})}")
+        review_queries = [query["sql"] for query in queries if "books_review" in query["sql"]]
+        self.assertEqual(len(review_queries), 1)
+        self.assertIn("accounts_user", review_queries[0])
+
+    def test_update_response_embeds_newest_reviews(self):
+        response = self.client.patch(self.url, {"title": "New Title"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([review["body"] for review in response.data["reviews"]], ["Review 3", "Review 2"])
+
+
+@skipUnless(find_spec("orjson"), "needs the optional orjson package")
+class ORJSONBackendTests(APITestCase):
+    payload = {
+        "created_at": datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        "naive": datetime(2024, 5, 1, 12, 30),
+        "published": date(2024, 5, 1),
+        "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "price": Decimal("12.50"),
+        "wait": timedelta(minutes=1),
+        "detail": Hyperlink("http://testserver/api/books/1/", None),
+        "nested": [{"title": "Café \u2028 line"}],
+        1: "non-string key",
+    }
+
+    def test_renders_like_the_stdlib_renderer(self):
+        self.assertEqual(ORJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_indented_output(self):
+        for indent in (2, 4):
+            with self.subTest(indent=indent):
+                media_type = f"application/json; indent={indent}"
+                self.assertEqual(json.loads(ORJSONRenderer().render(self.payload, media_type)),
+                                 json.loads(JSONRenderer().render(self.payload, media_type)))
+        self.assertEqual(ORJSONRenderer().render({"a": 1}, "application/json; indent=4"), b'{\n    "a": 1\n}')
+
+    def test_parses_like_the_stdlib_parser(self):
+        body = JSONRenderer().render(self.payload)
+        self.assertEqual(ORJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        latin = '{"title": "Caf\u00e9"}'.encode("latin-1")
+        self.assertEqual(ORJSONParser().parse(BytesIO(latin), parser_context={"encoding": "latin-1"}), {"title": "Café"})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"title": '))
+
+    def test_api_uses_the_configured_backend(self):
+        User.objects.create_superuser(username="Superuser", email="super@email.com", password="testpassword")
+        response = self.client.post(reverse("jwt-create"), {"email": "super@email.com", "password": "testpassword"}, format="json")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        author = Author.objects.create(name="Test", last_name="Author")
+        Book.objects.create(title="Café", ISBN="1234567890123", author=author, published=date(2024, 5, 1))
+
+        response = self.client.get(reverse("books-list"))
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+        response = self.client.post(reverse("authors-list"), '{"name": ', content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.data["detail"].startswith("JSON parse error"))
+
+
+@override_settings(LEADERBOARD_MIN_REVIEWS=2, LEADERBOARD_PRIOR_WEIGHT=2, LEADERBOARD_FULL_REFRESH_INTERVAL=90 * 86400)
+class LeaderboardTests(APITestCase):
+    def setUp(self) -> None:
+        get_cache().clear()
+        default_cache.clear()
+        self.user = User.objects.create_user(username="Test", email="test@email.com", password="password")
+        self.owners = [User.objects.create(username=f"user{i}", email=f"user{i}@email.com") for i in range(6)]
+        self.author = Author.objects.create(name="Test", last_name="Author")
+        self.other_author = Author.objects.create(name="Other", last_name="Author")
+        self.acclaimed = Book.objects.create(title="Acclaimed", ISBN="9780000000001", author=self.author)
+        self.popular = Book.objects.create(title="Popular", ISBN="9780000000002", author=self.other_author)
+        self.obscure = Book.objects.create(title="Obscure", ISBN="9780000000003", author=self.author)
+        self.review(self.acclaimed, [5, 5])
+        self.review(self.popular, [4, 4, 4, 3, 5, 4])
+        self.review(self.obscure, [5])
+
+        response = self.client.post(reverse("jwt-create"), {"email": "test@email.com", "password": "password"})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def review(self, book, ratings):
+        for owner, rating in zip(self.owners, ratings):
+            Review.objects.create(owner=owner, book=book, body="Review", rating=rating)
+
+    def top(self, kind="books", **params):
+        response = self.client.get(reverse(f"{kind}-top"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def test_books_ranked_by_bayesian_average_and_review_count(self):
+        # Prior: the mean of all 9 ratings, 39 / 9, weighted as 2 votes.
+        prior = 39 / 9
+        results = self.top()
+
+        self.assertEqual([entry["title"] for entry in results], ["Acclaimed", "Popular"])
+        self.assertAlmostEqual(results[0]["score"], (prior * 2 + 10) / 4)
+        self.assertAlmostEqual(results[1]["score"], (prior * 2 + 24) / 8)
+        self.assertEqual(results[0]["average_rating"], 5.0)
+        self.assertEqual(results[0]["book_author"], "Test Author")
+        self.assertEqual(results[0]["detail"], f"http://testserver{reverse('book-detail', kwargs={'pk': self.acclaimed.pk})}")
+        self.assertEqual([entry["title"] for entry in self.top(by="reviews")], ["Popular", "Acclaimed"])
+
+    def test_authors_sum_their_books(self):
+        results = self.top("authors", by="reviews")
+
+        self.assertEqual([(entry["name"], entry["review_count"]) for entry in results], [("Other", 6), ("Test", 3)])
+        self.assertEqual(results[1]["average_rating"], 5.0)
+
+    def test_incremental_refresh_recomputes_only_changed_books(self):
+        refreshed_at = datetime.now(timezone.utc)
+        Book.objects.update(updated_at=refreshed_at - timedelta(hours=1))
+        rankings.refresh(full=True, now=refreshed_at)
+        Review.objects.create(owner=self.owners[1], book=self.obscure, body="Review", rating=4)
+
+        later = refreshed_at + timedelta(minutes=1)
+        with CaptureQueriesContext(connection) as queries:
+            refreshed = rankings.refresh(now=later)
+
+        self.assertEqual(refreshed["all"], 1)
+        self.assertLess(len(queries), 50)
+        obscure = BookRanking.objects.get(period="all", book=self.obscure)
+        self.assertEqual((obscure.review_count, obscure.rating_sum), (2, 9))
+        self.assertEqual(AuthorRanking.objects.get(period="all", author=self.author).review_count, 4)
+        self.assertTrue(BookRanking.objects.filter(period="all", book=self.popular).exists())
+
+    def test_reviews_age_out_of_windowed_periods(self):
+        Review.objects.filter(book=self.popular).update(created_at=datetime.now(timezone.utc) - timedelta(days=20))
+        refreshed_at = datetime.now(timezone.utc)
+        Book.objects.update(updated_at=refreshed_at - timedelta(hours=1))
+        rankings.refresh(full=True, now=refreshed_at)
+        self.assertEqual(set(BookRanking.objects.filter(period="month").values_list("book", flat=True)),
+                         {self.acclaimed.pk, self.popular.pk})
+
+        refreshed = rankings.refresh(now=refreshed_at + timedelta(days=15))
+
+        self.assertEqual(refreshed["month"], 1)
+        self.assertEqual(set(BookRanking.objects.filter(period="month").values_list("book", flat=True)), {self.acclaimed.pk})
+        self.assertEqual([entry["name"] for entry in self.top("authors", period="month")], ["Test"])
+
+    def test_reads_queue_one_refresh_per_interval(self):
+        self.top()
+        Review.objects.create(owner=self.owners[1], book=self.obscure, body="Review", rating=4)
+
+        self.assertEqual([entry["title"] for entry in self.top(by="reviews")], ["Popular", "Acclaimed"])
+        default_cache.clear()
+        self.assertEqual([entry["title"] for entry in self.top(by="reviews")], ["Popular", "Acclaimed", "Obscure"])
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.client.get(reverse("books-top"), {"by": "nope"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse("authors-top"), {"period": "decade"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_command(self):
+        out = StringIO()
+        call_command("refresh_rankings", "--full", stdout=out)
+
+        self.assertIn("all: rebuilt", out.getvalue())
+        self.assertEqual(BookRanking.objects.filter(period="all").count(), 2)
+
+
+@override_settings(DATABASE_REPLICA_ALIAS="replica")
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self) -> None:
+        caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS].clear()
+        self.factory = APIRequestFactory()
+        self.routed = []
+
+    def view(self, request):
+        self.routed.append((Book.objects.all().db, User.objects.all().db, Task.objects.all().db))
+        return HttpResponse(status=201 if request.method == "POST" else 200)
+
+    def send(self, method, token=None, **extra):
+        if token:
+            extra["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        ReplicaRoutingMiddleware(self.view)(getattr(self.factory, method)("/api/books/", **extra))
+        return self.routed[-1]
+
+    def test_safe_requests_read_catalogue_and_accounts_from_the_replica(self):
+        self.assertEqual(self.send("get", "a"), ("replica", "replica", "default"))
+        self.assertEqual(self.send("head"), ("replica", "replica", "default"))
+        self.assertEqual(self.send("patch"), ("default", "default", "default"))
+        self.assertEqual(Book.objects.all().db, "default")
+
+        with override_settings(DATABASE_REPLICA_ALIAS=None):
+            self.assertEqual(self.send("get"), ("default", "default", "default"))
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        def view(request):
+            before = Book.objects.all().db
+            router.db_for_write(Review)
+            self.routed.append((before, Book.objects.all().db))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(self.factory.get("/api/books/"))
+        self.assertEqual(self.routed[-1], ("replica", "default"))
+
+    def test_writers_are_pinned_to_the_primary(self):
+        self.send("post", "writer")
+
+        self.assertEqual(self.send("get", "writer")[0], "default")
+        self.assertEqual(self.send("get", "reader")[0], "replica")
+        self.assertEqual(self.send("get")[0], "replica")
+
+        self.factory.cookies[settings.SESSION_COOKIE_NAME] = "session"
+        self.send("delete")
+        self.assertEqual(self.send("get")[0], "default")
+
+        caches[settings.DATABASE_REPLICA_PIN_CACHE_ALIAS].clear()
+        self.assertEqual(self.send("get", "writer")[0], "replica")
+
+    def test_async_requests(self):
+        async def view(request):
+            return await sync_to_async(self.view)(request)
+
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        async_to_sync(middleware)(self.factory.post("/api/books/", HTTP_AUTHORIZATION="Bearer writer"))
+        async_to_sync(middleware)(self.factory.get("/api/books/", HTTP_AUTHORIZATION="Bearer writer"))
+        async_to_sync(middleware)(self.factory.get("/api/books/"))
+
+        self.assertEqual([routed[0] for routed in self.routed], ["default", "default", "replica"])
+
+    def test_cache_misses_after_a_write_read_from_the_primary(self):
+        get_cache().clear()
+
+        class Listing(APIView):
+            def get(view, request):
+                self.routed.append(Book.objects.all().db)
+                return Response({})
+
+        def send(namespace):
+            view = type("View", (CachedResponseMixin, Listing), {"cache_namespaces": [namespace]}).as_view()
+            request = self.factory.get("/api/books/", {"request": len(self.routed)})
+            request.resolver_match = resolve(reverse("books-list"))
+            ReplicaRoutingMiddleware(view)(request)
+            return self.routed[-1]
+
+        self.assertEqual(send("books"), "replica")
+        invalidate("books")
+        self.assertEqual(send("books"), "default")
+        self.assertEqual(send("authors"), "replica")
+
+    def test_migrations_only_run_on_the_primary(self):
+        self.assertTrue(router.allow_migrate("default", "books"))
+        self.assertFalse(router.allow_migrate("replica", "books"))
+
+
+class SQLiteProductionProfileTests(APITestCase):
+    alias = "sqlite_production"
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.settings_dict = {
+            **connection.settings_dict,
+            "NAME": os.path.join(directory, "db.sqlite3"),
+            "OPTIONS": {"timeout": 20, "pragmas": {"journal_mode": "WAL", "synchronous": "NORMAL",
+                                                   "mmap_size": 1 << 20, "cache_size": -4096}},
+        }
+        wrapper = self.connect()
+        self.addCleanup(connections.__delitem__, self.alias)
+        with wrapper.cursor() as cursor:
+            cursor.execute("CREATE TABLE counter (id INTEGER PRIMARY KEY, seen INTEGER)")
+        wrapper.close()
+
+    def connect(self):
+        # Connections are per thread: this one is only for the calling thread.
+        wrapper = ProductionSQLiteWrapper(self.settings_dict, alias=self.alias)
+        connections[self.alias] = wrapper
+        return wrapper
+
+    def test_connections_are_tuned(self):
+        wrapper = self.connect()
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            values = {}
+            for pragma in ["journal_mode", "synchronous", "mmap_size", "cache_size", "busy_timeout"]:
+                cursor.execute(f"PRAGMA {pragma}")
+                values[pragma] = cursor.fetchone()[0]
+
+        self.assertEqual(values, {"journal_mode": "wal", "synchronous": 1, "mmap_size": 1 << 20,
+                                  "cache_size": -4096, "busy_timeout": 20000})
+
+    def test_concurrent_writers_do_not_fail(self):
+        writers, transactions = 8, 25
+        errors = []
+        start = threading.Barrier(writers)
+
+        def writer():
+            # Reading before writing is what fails with a deferred BEGIN.
+            wrapper = self.connect()
+            start.wait()
+            try:
+                for _ in range(transactions):
+                    with transaction.atomic(using=self.alias), wrapper.cursor() as cursor:
+                        cursor.execute("SELECT COUNT(*) FROM counter")
+                        cursor.execute("INSERT INTO counter (seen) VALUES (%s)", [cursor.fetchone()[0]])
+                    with wrapper.cursor() as cursor:
+                        cursor.execute("UPDATE counter SET seen = seen + 1 WHERE id = 1")
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                wrapper.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        wrapper = self.connect()
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT seen FROM counter ORDER BY id")
+            seen = [row[0] for row in cursor.fetchall()]
+        # Each transaction saw every earlier one: they ran one at a time.
+        self.assertEqual(seen[1:], list(range(1, writers * transactions)))
+        self.assertEqual(seen[0], writers * transactions)
+
+    def test_write_lock_is_released(self):
+        wrapper = self.connect()
+        self.addCleanup(wrapper.close)
+        with self.assertRaises(ValueError):
+            with transaction.atomic(using=self.alias), wrapper.cursor() as cursor:
+                cursor.execute("INSERT INTO counter (seen) VALUES (0)")
+                self.assertTrue(wrapper.holds_write_lock)
+                raise ValueError
+        self.assertFalse(wrapper.holds_write_lock)
+
+        with wrapper.cursor() as cursor:
+            cursor.execute("INSERT INTO counter (seen) VALUES (0)")
+        self.assertFalse(wrapper.holds_write_lock)
+        self.assertFalse(wrapper.write_lock.locked())
+
+
+THROTTLE_RATES = {"register": "2/hour", "login": "3/min", "reviews": "2/min"}
+
+
+@override_settings(API_THROTTLING=True, REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": THROTTLE_RATES})
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        local_buckets.clear()
+        self.addCleanup(local_buckets.clear)
+        self.now = 1000.0
+        patcher = mock.patch.object(TokenBucketThrottle, "timer", staticmethod(lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(username="reader", email="reader@example.com", password="testpassword")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="testpassword")
+        author = Author.objects.create(name="Test", last_name="Author")
+        self.books = Book.objects.bulk_create(
+            Book(title=f"Title {i}", ISBN=f"{1234567890120 + i}", author=author) for i in range(4))
+
+    def login(self, ip="127.0.0.1"):
+        return self.client.post(reverse("jwt-create"), {"email": "reader@example.com", "password": "testpassword"},
+                                REMOTE_ADDR=ip)
+
+    def review(self, book):
+        return self.client.post(reverse("review-create", args=[book.id]), {"body": "Review", "rating": 4})
+
+    def test_login_is_throttled_per_ip(self):
+        for _ in range(3):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+        response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # One request every 20 seconds.
+        self.assertEqual(response["Retry-After"], "20")
+        self.assertEqual(self.login(ip="10.0.0.2").status_code, status.HTTP_200_OK)
+
+        self.now += 20
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_register_is_throttled(self):
+        codes = [
+            self.client.post(reverse("register"), {"username": f"new{i}", "email": f"new{i}@example.com",
+                                                   "password": "testpassword", "password2": "testpassword"}).status_code
+            for i in range(3)
+        ]
+        self.assertEqual(codes, [status.HTTP_201_CREATED, status.HTTP_201_CREATED, status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_reviews_are_throttled_per_user(self):
+        self.client.force_authenticate(self.user)
+        codes = [self.review(book).status_code for book in self.books[:3]]
+        self.assertEqual(codes, [status.HTTP_201_CREATED, status.HTTP_201_CREATED, status.HTTP_429_TOO_MANY_REQUESTS])
+
+        # Views without a scope are not throttled.
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse("books-list")).status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.review(self.books[0]).status_code, status.HTTP_201_CREATED)
+
+    def test_buckets_in_a_shared_cache(self):
+        with override_settings(API_THROTTLE_CACHE_ALIAS="default"):
+            default_cache.clear()
+            codes = [self.login().status_code for _ in range(4)]
+        self.assertEqual(codes[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(local_buckets.buckets, {})
+        self.assertIsNotNone(default_cache.get("throttle:login:ip:127.0.0.1"))
+
+    def test_throttling_can_be_turned_off(self):
+        with override_settings(API_THROTTLING=False):
+            codes = {self.login().status_code for _ in range(5)}
+        self.assertEqual(codes, {status.HTTP_200_OK})
+
+    def test_least_recently_used_buckets_are_evicted(self):
+        buckets = LocalBuckets(max_entries=4)
+        for key in "abcd":
+            buckets.take(key, 2, 1.0, 0)
+        buckets.take("a", 2, 1.0, 0)
+        buckets.take("e", 2, 1.0, 0)
+
+        self.assertEqual(list(buckets.buckets), ["d", "a", "e"])
+        self.assertGreater(buckets.take("a", 2, 1.0, 0), 0)
+
+
+class AdmissionControlTests(APITestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.inner = []
+        self.middleware = AdmissionControlMiddleware(self.view)
+
+    def view(self, request):
+        # Requests sent while the outermost one is in flight.
+        inner, self.inner = self.inner, []
+        for method in inner:
+            response = self.middleware(getattr(self.factory, method)("/api/books/"))
+            self.inner_responses.append(response)
+        return HttpResponse("ok")
+
+    def send(self, method, *inner):
+        self.inner, self.inner_responses = list(inner), []
+        response = self.middleware(getattr(self.factory, method)("/api/books/"))
+        return response.status_code, [response.status_code for response in self.inner_responses]
+
+    @override_settings(API_MAX_CONCURRENT_REQUESTS=1, API_MAX_CONCURRENT_WRITES=0)
+    def test_sheds_requests_over_the_limit(self):
+        shed = admission.shed
+        self.inner = ["get"]
+        self.inner_responses = []
+
+        response = self.middleware(self.factory.get("/api/books/"))
+        overloaded = self.inner_responses[0]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(overloaded.status_code, 503)
+        self.assertEqual(overloaded["Retry-After"], "1")
+        self.assertEqual(json.loads(overloaded.content), {"detail": "Server overloaded, retry later."})
+        self.assertEqual(admission.shed, shed + 1)
+        self.assertEqual((admission.requests, admission.writes), (0, 0))
+        # The slot is free again.
+        self.assertEqual(self.send("get"), (200, []))
+
+    @override_settings(API_MAX_CONCURRENT_REQUESTS=10, API_MAX_CONCURRENT_WRITES=1)
+    def test_writes_have_their_own_limit(self):
+        self.assertEqual(self.send("post", "post", "get"), (200, [503, 200]))
+        self.assertEqual(self.send("get", "post"), (200, [200]))
+        self.assertEqual((admission.requests, admission.writes), (0, 0))
+
+    @override_settings(API_MAX_CONCURRENT_REQUESTS=1)
+    def test_streaming_responses_hold_their_slot_until_closed(self):
+        middleware = AdmissionControlMiddleware(lambda request: StreamingHttpResponse(iter(["a", "b"])))
+
+        response = middleware(self.factory.get("/api/export/books/"))
+        self.assertEqual(admission.requests, 1)
+        self.assertEqual(middleware(self.factory.get("/api/export/books/")).status_code, 503)
+
+        self.assertEqual(b"".join(response.streaming_content), b"ab")
+        response.close()
+        self.assertEqual(admission.requests, 0)
+
+    @override_settings(API_MAX_CONCURRENT_REQUESTS=0, API_MAX_CONCURRENT_WRITES=0)
+    def test_no_limits(self):
+        self.assertEqual(self.send("post", "post", "post"), (200, [200, 200]))
+
+    @override_settings(API_MAX_CONCURRENT_REQUESTS=1)
+    def test_async_requests(self):
+        async def view(request):
+            inner = await middleware(self.factory.get("/api/books/"))
+            return HttpResponse(status=inner.status_code)
+
+        middleware = AdmissionControlMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual(async_to_sync(middleware)(self.factory.get("/api/books/")).status_code, 503)
+        self.assertEqual(admission.requests, 0)
@@ -0,0 +1,203 @@
+"""
+Request throttling and admission control.
+
+`TokenBucketThrottle` throttles the views that set a `throttle_scope`, at the rate of
+that scope in `DEFAULT_THROTTLE_RATES` ("<requests>/<sec|min|hour|day>"). Each client
+gets a token bucket per scope: it holds that many requests, the burst allowed, and
+refills continuously at the rate. Clients are the user for authenticated requests and the
+IP address otherwise (DRF's `get_ident`, which honours `NUM_PROXIES`). A throttled request
+gets 429 with Retry-After. A bucket is two numbers, updated in one step per request: in
+process memory by default, or in the `API_THROTTLE_CACHE_ALIAS` cache to share the limits
+between processes (a get and a set; concurrent requests of one client may both pass).
+
+`AdmissionControlMiddleware` caps the requests in flight in this process at
+`API_MAX_CONCURRENT_REQUESTS`, and the unsafe ones, which end up waiting for the database
+writer, at `API_MAX_CONCURRENT_WRITES`. Requests over the cap are answered 503 with
+Retry-After at once instead of queueing for a worker or the database. Streaming responses
+(catalogue exports) keep their slot until the server closes them.
+"""
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """"10/min" -> (10 requests, 10/60 requests refilled per second)"""
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def refill(bucket, capacity, rate, now):
+    tokens, stamp = bucket or (capacity, now)
+    return min(capacity, tokens + max(now - stamp, 0) * rate)
+
+
+class LocalBuckets:
+    """Token buckets of this process."""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        """Take a token from the bucket `key`; returns 0, or the seconds until one is available."""
+        with self.lock:
+            tokens = refill(self.buckets.pop(key, None), capacity, rate, now)
+            if len(self.buckets) >= self.max_entries:
+                self.evict()
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return 0.0
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def evict(self):
+        # Buckets are reinserted on use, so the first half is the least recently used.
+        for key in list(self.buckets)[:len(self.buckets) // 2]:
+            del self.buckets[key]
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBuckets:
+    """Token buckets in a cache shared by every process."""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, rate, now):
+        tokens = refill(self.cache.get(key), capacity, rate, now)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+        # An untouched bucket is full again after capacity / rate seconds.
+        self.cache.set(key, (tokens - 1 if wait == 0 else tokens, now), timeout=int(capacity / rate) + 1)
+        return wait
+
+
+local_buckets = LocalBuckets()
+
+
+def get_buckets():
+    alias = settings.API_THROTTLE_CACHE_ALIAS
+    return CacheBuckets(alias) if alias else local_buckets
+
+
+class TokenBucketThrottle(BaseThrottle):
+    timer = time.time
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_rate(self, view):
+        scope = getattr(view, "throttle_scope", None)
+        if scope is None or not settings.API_THROTTLING:
+            return None, None
+        return scope, api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+
+    def get_client(self, request):
+        user = request.user
+        if user and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        scope, rate = self.get_rate(view)
+        if rate is None:
+            return True
+        capacity, refill_rate = parse_rate(rate)
+        key = f"throttle:{scope}:{self.get_client(request)}"
+        self.wait_seconds = get_buckets().take(key, capacity, refill_rate, self.timer())
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class Admission:
+    """Requests and writes in flight in this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.writes = 0
+        self.shed = 0
+
+    def enter(self, write):
+        max_requests, max_writes = settings.API_MAX_CONCURRENT_REQUESTS, settings.API_MAX_CONCURRENT_WRITES
+        with self.lock:
+            if (max_requests and self.requests >= max_requests) or (write and max_writes and self.writes >= max_writes):
+                self.shed += 1
+                return False
+            self.requests += 1
+            self.writes += write
+            return True
+
+    def leave(self, write):
+        with self.lock:
+            self.requests -= 1
+            self.writes -= write
+
+
+admission = Admission()
+
+
+def overloaded_response():
+    response = JsonResponse({"detail": "Server overloaded, retry later."}, status=503)
+    response["Retry-After"] = str(settings.API_ADMISSION_RETRY_AFTER)
+    return response
+
+
+class AdmissionControlMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        write = request.method not in SAFE_METHODS
+        if not admission.enter(write):
+            return overloaded_response()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            admission.leave(write)
+            raise
+        return self.release_when_done(response, write)
+
+    async def __acall__(self, request):
+        write = request.method not in SAFE_METHODS
+        if not admission.enter(write):
+            return overloaded_response()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            admission.leave(write)
+            raise
+        return self.release_when_done(response, write)
+
+    def release_when_done(self, response, write):
+        if response.streaming:
+            # The body is produced after the view returns; servers close the response
+            # once it is sent (or the client went away).
+            response._resource_closers.append(lambda: admission.leave(write))
+        else:
+            admission.leave(write)
+        return response
@@ -1,27 +1,41 @@
 from django.urls import path
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
-    TokenRefreshView,
     TokenVerifyView
 )
 
 
 from . import views
 
-urlpatterns = [
-    path("authors/", views.AuthorListCreateAPIView.as_view(), name="authors-list"),
-    path("authors/<int:pk>/", views.AuthorDetailAPIView.as_view(), name="author-detail"),
 
-    path("books/", views.BookListCreateAPIView.as_view(), name="books-list"),
-    path("books/<int:pk>/", views.BookDetailAPIView.as_view(), name="book-detail"),
+def catalogue_patterns(catalogue_views):
+    """Routes that also have async views; api.async_urls passes api.async_views here."""
+    return [
+        path("authors/", catalogue_views.AuthorListCreateAPIView.as_view(), name="authors-list"),
+        path("authors/<int:pk>/", catalogue_views.AuthorDetailAPIView.as_view(), name="author-detail"),
+
+        path("books/", catalogue_views.BookListCreateAPIView.as_view(), name="books-list"),
+        path("books/<int:pk>/", catalogue_views.BookDetailAPIView.as_view(), name="book-detail"),
+
+        path('book/<int:pk>/all-reviews/', catalogue_views.ReviewListForBookAPIView.as_view(), name='review-for-book'),
+    ]
+
+
+urlpatterns = catalogue_patterns(views) + [
+    path("books/import/", views.BookImportAPIView.as_view(), name="books-import"),
+    path("books/top/", views.TopBooksAPIView.as_view(), name="books-top"),
+    path("authors/top/", views.TopAuthorsAPIView.as_view(), name="authors-top"),
+
+    path("export/<str:table>/", views.CatalogueExportAPIView.as_view(), name="catalogue-export"),
+    path("search/", views.SearchAPIView.as_view(), name="search"),
 
     path("user-reviews/", views.UserReviewAPIView.as_view(), name="user_review"),
     path("book/<int:pk>/review/", views.ReviewCreateAPIView.as_view(), name="review-create"),
-    path('book/<int:pk>/all-reviews/', views.ReviewListForBookAPIView.as_view(), name='review-for-book'),
+    path("reviews/bulk/", views.ReviewBulkCreateAPIView.as_view(), name="review-bulk-create"),
     path("review/<int:pk>/", views.ReviewDetailAPIView.as_view(), name="review-detail"),
 
     path('login/', views.MyObtainTokenPAir.as_view() , name='jwt-create'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', views.MyTokenRefresh.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
 
     path("user-profile/<str:username>/", views.UserProfileAPIView.as_view(), name="user-profile"),
@@ -29,6 +43,9 @@ urlpatterns = [
     path("change-password/<str:username>/", views.ChangePasswordAPIView.as_view(), name="change-password"),
     path("update-profile/<str:username>/", views.UpdateProfileAPIView.as_view(), name="update-profile"),
 
+    path("_cache/", views.CacheStatsAPIView.as_view(), name="cache-stats"),
+    path("_metrics/", views.MetricsAPIView.as_view(), name="metrics"),
+
     
 
 ]
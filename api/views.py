@@ -1,25 +1,44 @@
+import io
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse, StreamingHttpResponse
+
 from rest_framework import generics, status
+from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import IsAuthenticated, AllowAny
-
-from books.models import Author, Book, Review
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+
+from books.models import Author, AuthorRanking, Book, BookRanking, Review
+from books.search import KINDS as SEARCH_KINDS, SearchResults
+from books.tasks import request_rankings_refresh
+from books.importer import FORMATS as IMPORT_FORMATS, CatalogueImporter, detect_format
+from books.exporter import (CONTENT_TYPES as EXPORT_CONTENT_TYPES, FORMATS as EXPORT_FORMATS, TABLES as EXPORT_TABLES,
+                            export_rows, parse_since, render as render_export)
 from accounts.models import User
 
-from .pagination import ReviewPagination
+from .cache import CachedResponseMixin, stats as cache_stats
+from .conditional import BookConditionalGetMixin
+from .fieldsets import SparseFieldsetViewMixin
+from .metrics import PROMETHEUS_CONTENT_TYPE, metrics
+from .pagination import LeaderboardPagination, ReviewPagination, SearchPagination
 from .permissions import OwnerOrReadOnly, AdminOrReadOnly
 from .serializer import (AuthorSerializer, AuthorCreateSerializer, AuthorDetailSerializer, 
-                        BookSerializer, BookDetailSerializer, BookCreateSerializer,
-                        ReviewSerializer, UserReviewsSerializer,
-                        MyTokenObtainPairSerializer, RegisterUserSerializer, ChangePasswordSerializer, UpdateUserProfileSerializer, UserSerializer)
+                        BookSerializer, BookDetailSerializer, BookCreateSerializer, prefetch_recent_reviews,
+                        ReviewSerializer, ReviewBulkSerializer, UserReviewsSerializer, SearchResultSerializer,
+                        BookRankingSerializer, AuthorRankingSerializer,
+                        MyTokenObtainPairSerializer, MyTokenRefreshSerializer, RegisterUserSerializer, ChangePasswordSerializer, UpdateUserProfileSerializer, UserSerializer)
 
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 
 
-class AuthorListCreateAPIView(generics.ListCreateAPIView):
+class AuthorListCreateAPIView(SparseFieldsetViewMixin, CachedResponseMixin, generics.ListCreateAPIView):
     queryset = Author.objects.all().order_by("id")
+    cache_namespaces = ["authors"]
     serializer_class = AuthorSerializer
     permission_classes = [IsAuthenticated, AdminOrReadOnly]
     pagination_class = ReviewPagination
@@ -30,16 +49,17 @@ class AuthorListCreateAPIView(generics.ListCreateAPIView):
         elif self.request.method == "POST":
             return AuthorCreateSerializer
 
-class AuthorDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Author.objects.all()
+class AuthorDetailAPIView(SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Author.objects.prefetch_related("written_books")
     serializer_class = AuthorDetailSerializer
     permission_classes = [IsAuthenticated, AdminOrReadOnly]
 
 
 """BOOKS VIEWS"""
 
-class BookListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Book.objects.all()
+class BookListCreateAPIView(SparseFieldsetViewMixin, CachedResponseMixin, generics.ListCreateAPIView):
+    queryset = Book.objects.select_related("author").order_by("id")
+    cache_namespaces = ["books", "authors", "reviews"]
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated, AdminOrReadOnly]
     pagination_class = ReviewPagination
@@ -51,48 +71,83 @@ class BookListCreateAPIView(generics.ListCreateAPIView):
             return BookCreateSerializer
 
 
-class BookDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Book.objects.all()
+class BookImportAPIView(APIView):
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Upload a CSV or JSONL file."})
+
+        file_format = detect_format(upload.name, request.data.get("file_format"))
+        if file_format not in IMPORT_FORMATS:
+            raise ValidationError({"file_format": f"Must be one of: {', '.join(IMPORT_FORMATS)}."})
+
+        batch_size = request.data.get("batch_size", 1000)
+        if not str(batch_size).isdigit() or int(batch_size) < 1:
+            raise ValidationError({"batch_size": "Must be a positive integer."})
+
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+        report = CatalogueImporter(batch_size=int(batch_size)).import_stream(stream, file_format)
+
+        response_status = status.HTTP_201_CREATED if report.created else status.HTTP_400_BAD_REQUEST
+        return Response(report.as_dict(), status=response_status)
+
+
+class BookDetailAPIView(SparseFieldsetViewMixin, BookConditionalGetMixin, CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Book.objects.select_related("author")
+    cache_namespaces = ["book:{pk}", "authors", "users"]
     serializer_class = BookDetailSerializer
     permission_classes = [IsAuthenticated, AdminOrReadOnly]
-    
+
+    def get_queryset(self):
+        reviews = Review.objects.select_related("owner").only("book", "body", "rating", "created_at", "owner__username")
+        return super().get_queryset().prefetch_related(prefetch_recent_reviews(reviews))
+
 
 """REVIEW VIEWS"""
 
-class UserReviewAPIView(generics.ListAPIView):
+def reviews_are_empty(paginator, reviews, page):
+    """Whether the listed `reviews` are empty, without a query when the page already tells."""
+    empty = paginator.result_is_empty(page) if paginator is not None and page is not None else None
+    return not reviews.exists() if empty is None else empty
+
+
+class UserReviewAPIView(SparseFieldsetViewMixin, generics.ListAPIView):
     queryset = Review.objects.all()
     serializer_class = UserReviewsSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = ReviewPagination
+    cursor_ordering = ("created_at", "id")
 
     def get_queryset(self):
         user = self.request.user
-        reviews = Review.objects.filter(owner=user) 
-        return reviews
+        reviews = Review.objects.filter(owner_id=user.pk).select_related("book").order_by("id")
+        return self.sparse_queryset(reviews)
 
     def list(self, request, *args, **kwargs):
         reviews = self.get_queryset()
-
         paginated_reviews = self.paginate_queryset(reviews)
+
+        if reviews_are_empty(self.paginator, reviews, paginated_reviews):
+            return Response({"detail": f"You dont howe any reviews {self.request.user.username}"}, status=status.HTTP_200_OK)
+
         serializer = self.get_serializer(paginated_reviews, many=True)
+        if paginated_reviews is not None:
+            response = {
+                **self.paginator.get_pagination_data(),
+                "data": serializer.data
+            }
+            return Response(data=response, status=status.HTTP_200_OK)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
 
-        if reviews.exists(): 
-            if paginated_reviews is not None:
-                response = {
-                    "count": self.paginator.page.paginator.count,
-                    "next": self.paginator.get_next_link(),
-                    "previous": self.paginator.get_previous_link(),
-                    "data": serializer.data
-                }
-                return Response(data=response, status=status.HTTP_200_OK)
-            return Response(data=serializer.data, status=status.HTTP_200_OK)
-        return Response({"detail": f"You dont howe any reviews {self.request.user.username}"}, status=status.HTTP_200_OK)
-    
 
 class ReviewCreateAPIView(generics.CreateAPIView):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "reviews"
 
     def perform_create(self, serializer):
         book_id = self.kwargs.get("pk")
@@ -102,81 +157,190 @@ class ReviewCreateAPIView(generics.CreateAPIView):
 
         if Review.objects.filter(book=book_obj, owner=user).exists():
             raise ValidationError("You have already review this book")
-        
-        serializer.save(book=book_obj, owner=user)
+
+        try:
+            serializer.save(book=book_obj, owner=user)
+        except IntegrityError:
+            # A concurrent request created the review after the check above.
+            raise ValidationError("You have already review this book")
 
         return super().perform_create(serializer)
 
 
-class ReviewListForBookAPIView(generics.ListAPIView):
+class ReviewBulkCreateAPIView(generics.CreateAPIView):
     queryset = Review.objects.all()
+    serializer_class = ReviewBulkSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "reviews"
+    max_batch_size = 100
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(many=True, allow_empty=False, max_length=self.max_batch_size)
+        return super().get_serializer(*args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(owner_id=self.request.user.pk)
+
+
+class ReviewListForBookAPIView(SparseFieldsetViewMixin, BookConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
+    queryset = Review.objects.all()
+    cache_namespaces = ["book:{pk}", "users"]
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = ReviewPagination
-    
+    cursor_ordering = ("created_at", "id")
 
     def get_queryset(self):
-        book_id  = self.kwargs.get("pk")
-        try:
-            book_obj = Book.objects.get(id=book_id)
-        except Book.DoesNotExist:
-            return Review.objects.none()
-
+        reviews = Review.objects.filter(book_id=self.kwargs.get("pk")).select_related("owner").order_by("id")
+        return self.sparse_queryset(reviews)
 
-        reviews = Review.objects.filter(book=book_obj)
-
-        return reviews
-    
     def list(self, request, *args, **kwargs):
-        book_id = self.kwargs.get("pk")
-        reviews = self.get_queryset()
-         
-        paginated_reviews = self.paginate_queryset(reviews)
-        serializer = self.get_serializer(paginated_reviews, many=True)  
-        
-
-        try:
-            book_obj = Book.objects.get(id=book_id)
-        except:
+        book_obj = Book.objects.filter(id=self.kwargs.get("pk")).only("id", "title").first()
+        if book_obj is None:
             response = {
                 "message": "Book does not exist!"
             }
             return Response(data=response, status=status.HTTP_404_NOT_FOUND)
 
+        reviews = self.get_queryset()
+        paginated_reviews = self.paginate_queryset(reviews)
 
-        if not reviews.exists():
+        if reviews_are_empty(self.paginator, reviews, paginated_reviews):
             response = {
                 "message": f"Book '{book_obj.title}' have no reviews."
             }
-
             return Response(data=response, status=status.HTTP_200_OK)
-        
+
         response = {
             "message" : f"Reviews for '{book_obj.title}'. ",
-            "data": serializer.data
+            "data": self.get_serializer(paginated_reviews, many=True).data
         }
 
         if paginated_reviews is not None:
-            response.update({
-                "count": self.paginator.page.paginator.count,
-                "next": self.paginator.get_next_link(),
-                "previous": self.paginator.get_previous_link()
-            })
-        
+            response.update(self.paginator.get_pagination_data())
+
         return Response(data=response, status=status.HTTP_200_OK)
-        
 
-class ReviewDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Review.objects.all()
+
+class ReviewDetailAPIView(SparseFieldsetViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Review.objects.select_related("owner")
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated, OwnerOrReadOnly]
+    throttle_scope = "reviews"
 
  
 
+"""EXPORT VIEWS"""
+
+class CatalogueExportAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        table = kwargs.get("table")
+        if table not in EXPORT_TABLES:
+            raise ValidationError({"table": f"Must be one of: {', '.join(EXPORT_TABLES)}."})
+
+        file_format = request.query_params.get("file_format", "jsonl")
+        if file_format not in EXPORT_FORMATS:
+            raise ValidationError({"file_format": f"Must be one of: {', '.join(EXPORT_FORMATS)}."})
+
+        since = request.query_params.get("since")
+        if since is not None:
+            since = parse_since(since)
+            if since is None:
+                raise ValidationError({"since": "Must be an ISO 8601 timestamp or date."})
+
+        lines = render_export(table, export_rows(table, since=since), file_format)
+        response = StreamingHttpResponse(lines, content_type=EXPORT_CONTENT_TYPES[file_format])
+        response.headers["Content-Disposition"] = f'attachment; filename="{table}.{file_format}"'
+        return response
+
+
+"""SEARCH VIEWS"""
+
+class SearchAPIView(generics.ListAPIView):
+    serializer_class = SearchResultSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get("q", "").strip()
+        kind = self.request.query_params.get("type") or None
+
+        if not query:
+            raise ValidationError({"q": "This query parameter is required."})
+        if kind not in (None, *SEARCH_KINDS):
+            raise ValidationError({"type": f"Must be one of: {', '.join(SEARCH_KINDS)}."})
+
+        return SearchResults(query, kind)
+
+
+"""LEADERBOARD VIEWS"""
+
+LEADERBOARD_ORDERINGS = {"rating": "-score", "reviews": "-review_count"}
+
+
+class LeaderboardMixin(SparseFieldsetViewMixin, CachedResponseMixin):
+    """
+    Ranked books or authors from the tables books.rankings precomputes, by Bayesian
+    average rating (`?by=rating`, the default) or review count (`?by=reviews`), over one
+    of `LEADERBOARD_PERIODS` (`?period=all` by default). Reads queue a refresh now and then.
+    """
+    cache_namespaces = ["rankings", "books", "authors"]
+    permission_classes = [IsAuthenticated]
+    pagination_class = LeaderboardPagination
+    ranked_field = None
+
+    def get(self, request, *args, **kwargs):
+        request_rankings_refresh()
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        by = self.request.query_params.get("by", "rating")
+        period = self.request.query_params.get("period", "all")
+
+        if by not in LEADERBOARD_ORDERINGS:
+            raise ValidationError({"by": f"Must be one of: {', '.join(LEADERBOARD_ORDERINGS)}."})
+        if period not in settings.LEADERBOARD_PERIODS:
+            raise ValidationError({"period": f"Must be one of: {', '.join(settings.LEADERBOARD_PERIODS)}."})
+
+        return super().get_queryset().filter(period=period).order_by(LEADERBOARD_ORDERINGS[by], self.ranked_field)
+
+
+class TopBooksAPIView(LeaderboardMixin, generics.ListAPIView):
+    queryset = BookRanking.objects.select_related("book__author")
+    serializer_class = BookRankingSerializer
+    ranked_field = "book"
+
+
+class TopAuthorsAPIView(LeaderboardMixin, generics.ListAPIView):
+    queryset = AuthorRanking.objects.select_related("author")
+    serializer_class = AuthorRankingSerializer
+    ranked_field = "author"
+
+
+"""MONITORING VIEWS"""
+
+class CacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(cache_stats.snapshot(), status=status.HTTP_200_OK)
+
+
+class MetricsAPIView(APIView):
+    """Per-view request metrics from api.metrics in Prometheus text format."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 """ACCOUNTS VIEWS"""
 
 class UserProfileAPIView(generics.RetrieveAPIView):
     queryset = User.objects.all()
+    stateless_auth = False
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = "username"
@@ -196,12 +360,18 @@ class UserProfileAPIView(generics.RetrieveAPIView):
 class MyObtainTokenPAir(TokenObtainPairView):
     permission_classes = [AllowAny]
     serializer_class = MyTokenObtainPairSerializer
+    throttle_scope = "login"
+
+
+class MyTokenRefresh(TokenRefreshView):
+    serializer_class = MyTokenRefreshSerializer
 
 
 class RegisterUserAPIView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterUserSerializer
     permission_classes = [AllowAny]
+    throttle_scope = "register"
 
 
 class ChangePasswordAPIView(generics.UpdateAPIView):
@@ -229,6 +399,7 @@ class ChangePasswordAPIView(generics.UpdateAPIView):
 
 class UpdateProfileAPIView(generics.RetrieveUpdateAPIView):
     queryset = User.objects.all()
+    stateless_auth = False
     serializer_class = UpdateUserProfileSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = "username"
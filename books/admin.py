@@ -7,6 +7,7 @@ from .models import Author, Book, Review
 
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ["name", "last_name"]
+    ordering = ["last_name", "name"]
 
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ["book", "owner", "rating"]
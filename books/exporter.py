@@ -0,0 +1,88 @@
+"""
+Streaming catalogue export.
+
+Rows are read with `.iterator(chunk_size=...)` in primary key order and rendered one
+line at a time, so memory use does not depend on the size of the table.
+"""
+import csv
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Author, Book, Review
+
+
+TABLES = {
+    "books": (Book, ["id", "title", "ISBN", "description", "published", "author_id", "image",
+                     "review_count", "rating_count", "rating_sum", "average_rating", "updated_at"]),
+    "authors": (Author, ["id", "name", "last_name", "bio", "birth_date", "death_date", "image", "updated_at"]),
+    "reviews": (Review, ["id", "book_id", "owner_id", "body", "rating", "created_at", "updated_at"]),
+}
+
+FORMATS = ("jsonl", "csv")
+
+CONTENT_TYPES = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def parse_since(value):
+    """
+    The ISO 8601 timestamp or date `value` as an aware datetime, or None when it is
+    malformed or not a real date. Dates and timestamps without an offset are read in the
+    current time zone, a date as its midnight.
+    """
+    try:
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            since = None if day is None else datetime.combine(day, time())
+    except ValueError:
+        # Well-formed but out of range, like month 13.
+        return None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def export_rows(table, since=None, chunk_size=2000):
+    """Yield the rows of `table` as dicts, optionally only those updated at or after `since`."""
+    model, fields = TABLES[table]
+    queryset = model.objects.order_by("id")
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    return queryset.values(*fields).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def render(table, rows, format):
+    """Yield the rows rendered as JSONL lines or CSV lines (with a header)."""
+    if format == "jsonl":
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            yield encoder.encode(row) + "\n"
+    elif format == "csv":
+        fields = TABLES[table][1]
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([_csv_value(row[field]) for field in fields])
+    else:
+        raise ValueError(f"Unsupported format {format!r}, expected one of: {', '.join(FORMATS)}.")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
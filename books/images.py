@@ -0,0 +1,101 @@
+"""
+Resized derivatives of Book.image and Author.image.
+
+Derivatives are written next to the media files under `derivatives/<variant>/` the first
+time they are needed: by a background task after an upload (see books.tasks), or lazily
+when a URL is requested before that task has run. Each size comes as WebP and as a
+JPEG/PNG fallback. A source that cannot be read is served as is, and not retried for
+`FAILURE_TIMEOUT` seconds.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = "derivatives"
+
+SIZES = {
+    "thumbnail": (160, 160),
+    "medium": (480, 480),
+}
+
+# variant name -> (size, format); a None format keeps PNG for PNG/GIF sources and JPEG otherwise.
+VARIANTS = {
+    "thumbnail": ("thumbnail", None),
+    "thumbnail_webp": ("thumbnail", "WEBP"),
+    "medium": ("medium", None),
+    "medium_webp": ("medium", "WEBP"),
+}
+
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+FAILURE_TIMEOUT = 600
+
+
+def _format(name, format):
+    if format:
+        return format
+    return "PNG" if name.lower().endswith((".png", ".gif")) else "JPEG"
+
+
+def derivative_name(name, variant):
+    # The source extension stays in the name: "a.png" and "a.jpg" are different images.
+    size, format = VARIANTS[variant]
+    return f"{DERIVATIVES_DIR}/{size}/{name}.{EXTENSIONS[_format(name, format)]}"
+
+
+def _failure_key(name):
+    return f"images:failed:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def _render(image, size, format):
+    image = image.copy()
+    image.thumbnail(SIZES[size])
+    if format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format, quality=80, optimize=format != "WEBP")
+    return ContentFile(buffer.getvalue())
+
+
+def generate_variants(field_file, variants=None):
+    """Write the missing derivatives of an image, opening the source only once."""
+    storage = field_file.storage
+    missing = [variant for variant in (variants or VARIANTS)
+               if not storage.exists(derivative_name(field_file.name, variant))]
+    if not missing:
+        return
+
+    with storage.open(field_file.name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    for variant in missing:
+        size, format = VARIANTS[variant]
+        storage.save(derivative_name(field_file.name, variant),
+                     _render(image, size, _format(field_file.name, format)))
+
+
+def variant_url(field_file, variant):
+    """URL of one derivative ("original" for the upload itself), falling back to the original."""
+    if not field_file:
+        return None
+    if variant == "original":
+        return field_file.url
+
+    name = derivative_name(field_file.name, variant)
+    if not field_file.storage.exists(name):
+        if cache.get(_failure_key(field_file.name)):
+            return field_file.url
+        try:
+            generate_variants(field_file, [variant])
+        except (OSError, ValueError):
+            logger.warning("Could not create %s derivative of %s", variant, field_file.name, exc_info=True)
+            cache.set(_failure_key(field_file.name), True, FAILURE_TIMEOUT)
+            return field_file.url
+    return field_file.storage.url(name)
@@ -0,0 +1,227 @@
+"""
+Streaming catalogue import.
+
+Records are read one at a time from CSV or JSONL and written in batches with
+bulk_create, one transaction per batch, so memory stays bounded by the batch size.
+Each record needs `title`, `isbn` (13 digits, dashes and spaces allowed),
+`author_name` and `author_last_name`; `description` and `published` (YYYY-MM-DD)
+are optional.
+"""
+import csv
+import json
+import time
+from datetime import date
+
+from django.db import IntegrityError, transaction
+
+from .models import Author, Book, format_isbn
+from .search import get_backend
+from .signals import catalogue_bulk_changed
+
+
+FORMATS = ("csv", "jsonl")
+
+
+class RecordError(ValueError):
+    pass
+
+
+def detect_format(filename, format=None):
+    """Explicit format if given, otherwise guessed from the file extension."""
+    if format:
+        return format.lower()
+    if filename.lower().endswith(".csv"):
+        return "csv"
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return None
+
+
+def read_records(stream, format):
+    """Yield (line number, record dict) pairs from a text stream."""
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif format == "jsonl":
+        for line_num, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                yield line_num, RecordError(f"Invalid JSON: {error}")
+                continue
+            yield line_num, record if isinstance(record, dict) else RecordError("Expected a JSON object.")
+    else:
+        raise ValueError(f"Unsupported format {format!r}, expected one of: {', '.join(FORMATS)}.")
+
+
+def _text(record, key, required=True, max_length=None):
+    value = record.get(key)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise RecordError(f"'{key}' is required.")
+    if max_length and len(value) > max_length:
+        raise RecordError(f"'{key}' is longer than {max_length} characters.")
+    return value
+
+
+def clean_record(record):
+    """Validate one record, returning (book fields, author key). Raises RecordError."""
+    if isinstance(record, RecordError):
+        raise record
+
+    isbn = _text(record, "isbn") if "isbn" in record else _text(record, "ISBN")
+    isbn = isbn.replace("-", "").replace(" ", "")
+    if len(isbn) != 13 or not isbn.isdigit():
+        raise RecordError("'isbn' must have exactly 13 digits.")
+
+    published = _text(record, "published", required=False)
+    try:
+        published = date.fromisoformat(published) if published else None
+    except ValueError:
+        raise RecordError("'published' must be a YYYY-MM-DD date.")
+
+    fields = {
+        "title": _text(record, "title", max_length=120),
+        "description": _text(record, "description", required=False) or None,
+        "published": published,
+        "ISBN": format_isbn(isbn),
+    }
+    author = (_text(record, "author_name", max_length=120), _text(record, "author_last_name", max_length=120))
+    return fields, author
+
+
+class ImportReport:
+    max_errors = 1000
+
+    def __init__(self):
+        self.created = 0
+        self.authors_created = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "authors_created": self.authors_created,
+            "failed": self.failed,
+            "seconds": round(self.elapsed, 3),
+            "books_per_second": round(self.rate, 1),
+            "errors": self.errors,
+        }
+
+
+class CatalogueImporter:
+    def __init__(self, batch_size=1000, on_batch=None):
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.report = ImportReport()
+        self.search = get_backend()
+        self._authors = None
+
+    def author_index(self):
+        """Case-insensitive (name, last name) -> Author id, loaded once with a streaming query."""
+        if self._authors is None:
+            self._authors = {
+                (name.lower(), last_name.lower()): pk
+                for pk, name, last_name in Author.objects.values_list("id", "name", "last_name").iterator(chunk_size=5000)
+            }
+        return self._authors
+
+    def import_stream(self, stream, format):
+        try:
+            self.run(read_records(stream, format))
+        except (UnicodeDecodeError, csv.Error) as error:
+            self.report.error(None, f"Unreadable input: {error}")
+        return self.report
+
+    def run(self, records):
+        batch = []
+        try:
+            for line, record in records:
+                try:
+                    batch.append((line, *clean_record(record)))
+                except RecordError as error:
+                    self.report.error(line, str(error))
+                    continue
+                if len(batch) >= self.batch_size:
+                    self.write_batch(batch)
+                    batch = []
+            if batch:
+                self.write_batch(batch)
+        finally:
+            if self.report.created:
+                catalogue_bulk_changed.send(sender=Book, models=[Author, Book])
+        return self.report
+
+    def write_batch(self, batch):
+        authors = self.author_index()
+
+        unique, seen = [], set()
+        for line, fields, author in batch:
+            if fields["ISBN"] in seen:
+                self.report.error(line, f"Duplicate ISBN {fields['ISBN']} in the same batch.")
+                continue
+            seen.add(fields["ISBN"])
+            unique.append((line, fields, author))
+
+        existing = set(Book.objects.filter(ISBN__in=seen).values_list("ISBN", flat=True))
+        rows = []
+        for line, fields, author in unique:
+            if fields["ISBN"] in existing:
+                self.report.error(line, f"A book with ISBN {fields['ISBN']} already exists.")
+            else:
+                rows.append((line, fields, author))
+
+        try:
+            with transaction.atomic():
+                new_authors = {}
+                for _, _, (name, last_name) in rows:
+                    key = (name.lower(), last_name.lower())
+                    if key not in authors and key not in new_authors:
+                        new_authors[key] = Author(name=name, last_name=last_name)
+                Author.objects.bulk_create(new_authors.values())
+
+                books = []
+                for _, fields, (name, last_name) in rows:
+                    key = (name.lower(), last_name.lower())
+                    if key in new_authors:
+                        books.append(Book(author=new_authors[key], **fields))
+                    else:
+                        books.append(Book(author_id=authors[key], **fields))
+                Book.objects.bulk_create(books)
+                self._index(books, new_authors.values())
+        except IntegrityError as error:
+            for line, _, _ in rows:
+                self.report.error(line, f"Batch rejected by the database: {error}")
+            return
+
+        authors.update({key: author.pk for key, author in new_authors.items()})
+        self.report.created += len(books)
+        self.report.authors_created += len(new_authors)
+        if self.on_batch:
+            self.on_batch(self.report)
+
+    def _index(self, books, new_authors):
+        missing = {book.author_id for book in books if not Book.author.is_cached(book)}
+        loaded = Author.objects.in_bulk(missing) if missing else {}
+        for book in books:
+            if not Book.author.is_cached(book):
+                book.author = loaded[book.author_id]
+        self.search.index_many(books, new_authors)
@@ -0,0 +1,83 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from itertools import accumulate
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from books.search import SQLiteSearchBackend
+
+
+SYLLABLES = ["ka", "lo", "mir", "sen", "ta", "vor", "el", "dra", "wi", "ost", "na", "gen", "ru", "bel", "ith"]
+NAMES = ["Anna", "Jan", "Maria", "Piotr", "Olga", "Tomasz", "Ewa", "Adam", "Zofia", "Marek"]
+LAST_NAMES = ["Nowak", "Kowalski", "Sapkowski", "Lem", "Tokarczuk", "Mickiewicz", "Prus", "Szymborska"]
+
+
+def vocabulary(rng, size):
+    """Pseudo-words with Zipf-like frequencies, so common and rare terms both get queried."""
+    words = sorted({"".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size)})
+    rng.shuffle(words)
+    return words, list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure FTS5 search latency on a synthetic catalogue. Works on a throwaway SQLite "
+        "file with the same index schema and queries as books.search, never on the project database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=500)
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--vocabulary", type=int, default=20_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        backend = SQLiteSearchBackend()
+        words, cum_weights = vocabulary(rng, options["vocabulary"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(Path(directory) / "search.sqlite3")
+            db.execute(backend.create_sql.format(table=backend.table))
+
+            started = time.perf_counter()
+            insert = backend.insert_sql.format(table=backend.table).replace("%s", "?")
+            batch = []
+            for pk in range(1, options["books"] + 1):
+                isbn = f"{9780000000000 + pk}"
+                batch.append((
+                    2 * pk,
+                    " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 4))),
+                    f"{isbn} {isbn[0:3]}-{isbn[3:5]}-{isbn[5:11]}-{isbn[11]}-{isbn[12]}",
+                    f"{rng.choice(NAMES)} {rng.choice(LAST_NAMES)}",
+                    " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(10, 40))),
+                ))
+                if len(batch) == 10_000:
+                    db.executemany(insert, batch)
+                    batch.clear()
+            db.executemany(insert, batch)
+            db.execute(backend.optimize_sql.format(table=backend.table))
+            db.commit()
+            self.stdout.write(f"Indexed {options['books']} books in {time.perf_counter() - started:.1f}s")
+
+            sql = backend.hits_sql().replace("%%", "%").replace("%s", "?")
+            latencies = []
+            for _ in range(options["queries"]):
+                terms = rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 3))
+                match = backend.match_expression(" ".join(terms))
+                started = time.perf_counter()
+                db.execute(sql, [match, options["page_size"], 0]).fetchall()
+                latencies.append((time.perf_counter() - started) * 1000)
+            db.close()
+
+        latencies.sort()
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{len(latencies)} queries: p50 {quantiles[49]:.2f}ms, p95 {quantiles[94]:.2f}ms, "
+            f"p99 {quantiles[98]:.2f}ms, max {latencies[-1]:.2f}ms"
+        )
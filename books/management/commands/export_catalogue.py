@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.exporter import FORMATS, TABLES, export_rows, parse_since, render
+
+
+class Command(BaseCommand):
+    help = "Stream a full or incremental dump of books, authors or reviews as JSONL or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("table", choices=sorted(TABLES))
+        parser.add_argument("--format", choices=FORMATS, default="jsonl")
+        parser.add_argument("--since", help="Only rows updated at or after this ISO 8601 timestamp or date.")
+        parser.add_argument("--output", help="Write to this file instead of standard output.")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_since(options["since"])
+            if since is None:
+                raise CommandError("--since must be an ISO 8601 timestamp or date.")
+
+        rows = export_rows(options["table"], since=since, chunk_size=options["chunk_size"])
+        lines = render(options["table"], rows, options["format"])
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,41 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.importer import FORMATS, CatalogueImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = "Stream books from a CSV or JSONL file into the catalogue, creating missing authors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for standard input.")
+        parser.add_argument("--format", choices=FORMATS, help="Input format, guessed from the extension by default.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = detect_format(path, options["format"])
+        if format is None:
+            raise CommandError("Cannot guess the input format, pass --format.")
+
+        def progress(report):
+            self.stdout.write(f"{report.created} books imported ({report.rate:.0f}/s), {report.failed} failed")
+
+        importer = CatalogueImporter(batch_size=options["batch_size"], on_batch=progress)
+        if path == "-":
+            report = importer.import_stream(io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8"), format)
+        else:
+            with open(path, encoding="utf-8", newline="") as stream:
+                report = importer.import_stream(stream, format)
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f"... {report.failed - len(report.errors)} more errors not shown")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.created} books and {report.authors_created} authors in {report.elapsed:.1f}s "
+            f"({report.rate:.0f} books/s), {report.failed} rows failed."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from books.models import Book
+from books.tasks import rebuild_book_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored review count and rating aggregates of every book."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--background", action="store_true", help="Queue the rebuild as a background task.")
+
+    def handle(self, *args, **options):
+        if options["background"]:
+            rebuild_book_ratings.enqueue()
+            self.stdout.write(self.style.SUCCESS("Queued the rating aggregate rebuild."))
+            return
+
+        updated = Book.objects.rebuild_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} books."))
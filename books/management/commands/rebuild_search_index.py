@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from books.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of books and authors."
+
+    def handle(self, *args, **options):
+        indexed = get_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} search documents."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from books import rankings
+from books.tasks import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the book and author leaderboards: recompute what changed since the last "
+        "refresh, or rebuild every period with --full. Suitable for cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild every period and its prior mean.")
+        parser.add_argument("--background", action="store_true", help="Queue the refresh as a background task.")
+
+    def handle(self, *args, **options):
+        if options["background"]:
+            refresh_rankings.enqueue(full=options["full"])
+            self.stdout.write(self.style.SUCCESS("Queued the leaderboard refresh."))
+            return
+
+        for period, books in rankings.refresh(full=options["full"]).items():
+            done = "rebuilt" if books is None else f"{books} books recomputed"
+            self.stdout.write(f"{period}: {done}")
+        self.stdout.write(self.style.SUCCESS("Leaderboards refreshed."))
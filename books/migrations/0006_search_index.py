@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS books_search_index USING fts5("
+        "title, isbn, people, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO books_search_index(rowid, title, isbn, people, description) "
+        "SELECT 2 * b.id, b.title, b.ISBN || ' ' || replace(b.ISBN, '-', ''), "
+        "a.name || ' ' || a.last_name, coalesce(b.description, '') "
+        "FROM books_book b JOIN books_author a ON a.id = b.author_id"
+    )
+    schema_editor.execute(
+        "INSERT INTO books_search_index(rowid, title, isbn, people, description) "
+        "SELECT 2 * id + 1, name || ' ' || last_name, '', '', coalesce(bio, '') FROM books_author"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS books_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_author_updated_at_book_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
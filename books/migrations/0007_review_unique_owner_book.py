@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:34
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def remove_duplicate_reviews(apps, schema_editor):
+    """Keep the first review of every (owner, book) pair and fix the aggregates of the books involved."""
+    Book = apps.get_model('books', 'Book')
+    Review = apps.get_model('books', 'Review')
+
+    duplicates = (
+        Review.objects.values('owner', 'book').order_by()
+        .annotate(first=Min('id'), total=Count('id')).filter(total__gt=1)
+    )
+    book_ids = set()
+    for group in duplicates:
+        Review.objects.filter(owner=group['owner'], book=group['book']).exclude(pk=group['first']).delete()
+        book_ids.add(group['book'])
+    if not book_ids:
+        return
+
+    books = Book.objects.filter(pk__in=book_ids)
+    reviews = Review.objects.filter(book=OuterRef('pk')).order_by().values('book')
+
+    def aggregate(expression):
+        return Coalesce(Subquery(reviews.annotate(value=expression).values('value')), 0)
+
+    books.update(
+        review_count=aggregate(Count('id')),
+        rating_count=aggregate(Count('rating')),
+        rating_sum=aggregate(Sum('rating')),
+    )
+    books.update(
+        average_rating=Coalesce(Cast(F('rating_sum'), FloatField()) / NullIf(F('rating_count'), 0), Value(0.0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_reviews, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('owner', 'book'), name='unique_review_per_owner_and_book'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=10)),
+                ('review_count', models.PositiveIntegerField()),
+                ('rating_count', models.PositiveIntegerField()),
+                ('rating_sum', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=10)),
+                ('review_count', models.PositiveIntegerField()),
+                ('rating_count', models.PositiveIntegerField()),
+                ('rating_sum', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RankingPeriod',
+            fields=[
+                ('name', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('prior_mean', models.FloatField()),
+                ('refreshed_at', models.DateTimeField()),
+                ('full_refreshed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['updated_at'], name='book_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='review_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='bookranking',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='books.book'),
+        ),
+        migrations.AddField(
+            model_name='authorranking',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='books.author'),
+        ),
+        migrations.AddIndex(
+            model_name='bookranking',
+            index=models.Index(fields=['period', '-score', 'book'], name='book_ranking_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookranking',
+            index=models.Index(fields=['period', '-review_count', 'book'], name='book_ranking_reviews_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookranking',
+            constraint=models.UniqueConstraint(fields=('period', 'book'), name='unique_book_ranking_per_period'),
+        ),
+        migrations.AddIndex(
+            model_name='authorranking',
+            index=models.Index(fields=['period', '-score', 'author'], name='author_ranking_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authorranking',
+            index=models.Index(fields=['period', '-review_count', 'author'], name='author_ranking_reviews_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='authorranking',
+            constraint=models.UniqueConstraint(fields=('period', 'author'), name='unique_author_ranking_per_period'),
+        ),
+    ]
@@ -1,8 +1,14 @@
 from typing import Any
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Now, NullIf
 from django.core.validators import MinLengthValidator, MinValueValidator, MaxValueValidator
 from accounts.models import User
 
+from .signals import catalogue_bulk_changed
+
 
 class Author(models.Model):
     name = models.CharField(max_length=120)
@@ -11,19 +17,68 @@ class Author(models.Model):
     image = models.ImageField(upload_to="author_img", default="dp.png")
     birth_date = models.DateField(blank=True, null=True)
     death_date = models.DateField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} {self.last_name}"
+
+    class Meta:
+        indexes = [
+            # The admin lists authors by last name, then name.
+            models.Index(fields=["last_name", "name"], name="author_last_name_name_idx"),
+        ]
     
 
 
+def format_isbn(isbn):
+    return f"{isbn[0:3]}-{isbn[3:5]}-{isbn[5:11]}-{isbn[11]}-{isbn[12]}"
+
+
 class BookManager(models.Manager):
     def create(self, **kwargs): 
-        isbn = kwargs.get("ISBN")
-        isbn = f"{isbn[0:3]}-{isbn[3:5]}-{isbn[5:11]}-{isbn[11]}-{isbn[12]}"
+        isbn = format_isbn(kwargs.get("ISBN"))
         kwargs.pop("ISBN")
         return super().create(ISBN=isbn, **kwargs)
-        
+
+    def apply_review_delta(self, book_id, count=0, rated=0, rating_sum=0):
+        """Shift the stored rating aggregates of one book by the given deltas and touch it."""
+        new_rated = F("rating_count") + rated
+        new_sum = F("rating_sum") + rating_sum
+        return self.filter(pk=book_id).update(
+            review_count=F("review_count") + count,
+            rating_count=new_rated,
+            rating_sum=new_sum,
+            average_rating=average_expression(new_sum, new_rated),
+            updated_at=Now(),
+        )
+
+    def rebuild_rating_aggregates(self, book_ids=None):
+        """Recompute the stored rating aggregates of every book (or of `book_ids`) from its reviews."""
+        books = self.all() if book_ids is None else self.filter(pk__in=book_ids)
+        reviews = Review.objects.filter(book=OuterRef("pk")).order_by().values("book")
+        with transaction.atomic():
+            books.update(
+                review_count=aggregate_subquery(reviews, Count("id")),
+                rating_count=aggregate_subquery(reviews, Count("rating")),
+                rating_sum=aggregate_subquery(reviews, Sum("rating")),
+            )
+            updated = books.update(
+                average_rating=average_expression(F("rating_sum"), F("rating_count")),
+                updated_at=Now(),
+            )
+            if book_ids is None:
+                book_ids = list(books.values_list("pk", flat=True))
+            catalogue_bulk_changed.send(sender=Book, models=[Book], book_ids=book_ids)
+        return updated
+
+
+def aggregate_subquery(reviews, aggregate):
+    return Coalesce(Subquery(reviews.annotate(value=aggregate).values("value")), 0)
+
+
+def average_expression(rating_sum, rating_count):
+    return Coalesce(Cast(rating_sum, FloatField()) / NullIf(rating_count, 0), Value(0.0))
+
 
 class Book(models.Model):
     author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name="written_books")
@@ -32,9 +87,25 @@ class Book(models.Model):
     description = models.TextField(blank=True, null=True)
     published = models.DateField(blank=True, null=True)
     ISBN = models.CharField(validators=[MinLengthValidator(13)], max_length=13, unique=True)
+    # Also touched by every review change, see BookManager.apply_review_delta.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Denormalized review aggregates, kept in sync by Review.save and the
+    # post_delete receiver below. Rebuild with `manage.py rebuild_book_ratings`.
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(default=0, editable=False)
 
     objects = BookManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["published"], name="book_published_idx"),
+            # Incremental leaderboard refreshes and `export --since` look up recently touched books.
+            models.Index(fields=["updated_at"], name="book_updated_idx"),
+        ]
+
     def __str__(self):
         return self.title
     
@@ -47,7 +118,138 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "book"], name="unique_review_per_owner_and_book"),
+        ]
+        indexes = [
+            # Serve the per-book and per-user review lists, including their
+            # (created_at, id) cursor ordering, without sorting the matches.
+            models.Index(fields=["book", "created_at"], name="review_book_created_idx"),
+            models.Index(fields=["owner", "created_at"], name="review_owner_created_idx"),
+            # Reviews leaving a leaderboard period's window, see books.rankings.
+            models.Index(fields=["created_at"], name="review_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.owner} {self.book}"
-    
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_rating = instance._rating_state()
+        return instance
+
+    def _rating_state(self):
+        # Deferred fields are missing from __dict__; don't trigger a query for them.
+        if "book_id" not in self.__dict__ or "rating" not in self.__dict__:
+            return None
+        return self.book_id, self.rating
+
+    def save(self, *args, **kwargs):
+        previous = None if self._state.adding else getattr(self, "_stored_rating", None)
+        if not self._state.adding and previous is None:
+            previous = Review.objects.filter(pk=self.pk).values_list("book_id", "rating").first()
+
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+            if previous is None:
+                Book.objects.apply_review_delta(self.book_id, *rating_delta(self.rating))
+            elif previous[0] == self.book_id:
+                # Still issued for body-only edits, it moves the book's updated_at.
+                added, removed = rating_delta(self.rating), rating_delta(previous[1], -1)
+                Book.objects.apply_review_delta(self.book_id, 0, added[1] + removed[1], added[2] + removed[2])
+            else:
+                Book.objects.apply_review_delta(previous[0], *rating_delta(previous[1], -1))
+                Book.objects.apply_review_delta(self.book_id, *rating_delta(self.rating))
+
+        self._stored_rating = self._rating_state()
+
+
+def rating_delta(rating, sign=1):
+    """(review_count, rating_count, rating_sum) deltas for adding or removing one review."""
+    return sign, sign * int(rating is not None), sign * (rating or 0)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_book_aggregates(sender, instance, origin=None, **kwargs):
+    # Reviews deleted through the cascade of their book, or of its author, have nothing
+    # left to update.
+    origin_model = type(origin) if isinstance(origin, models.Model) else getattr(origin, "model", None)
+    if origin_model in (Author, Book):
+        return
+    book_id, rating = getattr(instance, "_stored_rating", None) or (instance.book_id, instance.rating)
+    Book.objects.apply_review_delta(book_id, *rating_delta(rating, -1))
+
+
+@receiver(post_save, sender=User)
+def touch_books_reviewed_by_user(sender, instance, created, update_fields=None, **kwargs):
+    # Review payloads embed the owner's username, so a rename must move the books' updated_at.
+    if created or not instance.username_changed or (update_fields is not None and "username" not in update_fields):
+        return
+    Book.objects.filter(reviews__owner=instance).update(updated_at=Now())
+
+
+class Ranking(models.Model):
+    """
+    Precomputed leaderboard entry for one period, maintained by books.rankings. Only
+    books and authors with at least LEADERBOARD_MIN_REVIEWS reviews in the period have one.
+    """
+    period = models.CharField(max_length=10)
+    review_count = models.PositiveIntegerField()
+    rating_count = models.PositiveIntegerField()
+    rating_sum = models.PositiveIntegerField()
+    # Bayesian average rating, see books.rankings.bayesian_average.
+    score = models.FloatField()
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0.0
+
+
+class BookRanking(Ranking):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="rankings")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["period", "book"], name="unique_book_ranking_per_period"),
+        ]
+        indexes = [
+            models.Index(fields=["period", "-score", "book"], name="book_ranking_score_idx"),
+            models.Index(fields=["period", "-review_count", "book"], name="book_ranking_reviews_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} ({self.period})"
+
+
+class AuthorRanking(Ranking):
+    author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name="rankings")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["period", "author"], name="unique_author_ranking_per_period"),
+        ]
+        indexes = [
+            models.Index(fields=["period", "-score", "author"], name="author_ranking_score_idx"),
+            models.Index(fields=["period", "-review_count", "author"], name="author_ranking_reviews_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.author_id} ({self.period})"
+
+
+class RankingPeriod(models.Model):
+    """Refresh bookkeeping of one leaderboard period."""
+    name = models.CharField(max_length=10, primary_key=True)
+    # Mean rating of the period, the prior of the Bayesian averages; set by full refreshes.
+    prior_mean = models.FloatField()
+    # Start of the last refresh of any kind, and of the last full one.
+    refreshed_at = models.DateTimeField()
+    full_refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,169 @@
+"""
+Book and author leaderboards, precomputed into BookRanking and AuthorRanking rows.
+
+Every period of `LEADERBOARD_PERIODS` (all time, or the last N days by review date) ranks
+the books and authors with at least `LEADERBOARD_MIN_REVIEWS` reviews in it, by review
+count and by Bayesian average: ratings with few votes are pulled towards the mean rating
+of the period, weighted as `LEADERBOARD_PRIOR_WEIGHT` extra votes.
+
+`refresh()` is incremental. It recomputes the books touched since the previous refresh
+(every review change moves Book.updated_at), the books whose reviews have since aged out
+of a period's window, and their authors, so its cost follows the changed reviews rather
+than the size of the catalogue. The prior mean only changes on full refreshes, which
+rebuild a period from scratch every `LEADERBOARD_FULL_REFRESH_INTERVAL` seconds; they also
+catch up on authors that lost a book to another author.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import AuthorRanking, Book, BookRanking, RankingPeriod, Review
+from .signals import catalogue_bulk_changed
+
+
+# Slack for the clock difference between the database's Now() and this process.
+OVERLAP = timedelta(seconds=5)
+# Ids per IN (...) lookup, below SQLite's variable limit.
+CHUNK_SIZE = 500
+# Prior of a period without any rating: the middle of the 1-5 scale.
+DEFAULT_PRIOR_MEAN = 3.0
+
+
+def bayesian_average(rating_sum, rating_count, prior_mean):
+    weight = settings.LEADERBOARD_PRIOR_WEIGHT
+    return (prior_mean * weight + rating_sum) / (weight + rating_count)
+
+
+def window_start(period, now):
+    days = settings.LEADERBOARD_PERIODS[period]
+    return None if days is None else now - timedelta(days=days)
+
+
+def chunks(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _totals(queryset, key, review_count, rating_count, rating_sum):
+    return (queryset.order_by().values(key)
+            .annotate(reviews=review_count, rated=rating_count, total=rating_sum)
+            .values_list(key, "reviews", "rated", "total"))
+
+
+def _stats(rows):
+    return {pk: (review_count, rating_count, rating_sum or 0) for pk, review_count, rating_count, rating_sum in rows}
+
+
+def book_stats(period, now, book_ids=None):
+    """{book id: (review count, rating count, rating sum)} in the period, for books with reviews in it."""
+    start = window_start(period, now)
+    if start is None:
+        # All time is what the denormalized aggregates on Book already hold.
+        books = Book.objects.filter(review_count__gt=0)
+        if book_ids is not None:
+            books = books.filter(pk__in=book_ids)
+        return _stats(books.values_list("pk", "review_count", "rating_count", "rating_sum"))
+
+    reviews = Review.objects.filter(created_at__gte=start)
+    if book_ids is not None:
+        reviews = reviews.filter(book_id__in=book_ids)
+    return _stats(_totals(reviews, "book", Count("id"), Count("rating"), Sum("rating")))
+
+
+def author_stats(period, now, author_ids=None):
+    """`book_stats` summed over the books of each author."""
+    start = window_start(period, now)
+    if start is None:
+        books = Book.objects.filter(review_count__gt=0)
+        if author_ids is not None:
+            books = books.filter(author_id__in=author_ids)
+        return _stats(_totals(books, "author", Sum("review_count"), Sum("rating_count"), Sum("rating_sum")))
+
+    reviews = Review.objects.filter(created_at__gte=start)
+    if author_ids is not None:
+        reviews = reviews.filter(book__author_id__in=author_ids)
+    return _stats(_totals(reviews, "book__author", Count("id"), Count("rating"), Sum("rating")))
+
+
+def prior_mean(period, now):
+    start = window_start(period, now)
+    if start is None:
+        totals = Book.objects.aggregate(rated=Sum("rating_count"), total=Sum("rating_sum"))
+    else:
+        totals = Review.objects.filter(created_at__gte=start).aggregate(rated=Count("rating"), total=Sum("rating"))
+    return totals["total"] / totals["rated"] if totals["rated"] else DEFAULT_PRIOR_MEAN
+
+
+def store(model, key, period, stats, prior, ids=None):
+    """Replace the rows of `ids` (every row when None) in `period` by those `stats` qualifies."""
+    rows = model.objects.filter(period=period)
+    if ids is not None:
+        rows = rows.filter(**{f"{key}__in": ids})
+    rows.delete()
+
+    model.objects.bulk_create([
+        model(period=period, review_count=review_count, rating_count=rating_count, rating_sum=rating_sum,
+              score=bayesian_average(rating_sum, rating_count, prior), **{f"{key}_id": pk})
+        for pk, (review_count, rating_count, rating_sum) in stats.items()
+        if review_count >= settings.LEADERBOARD_MIN_REVIEWS
+    ], batch_size=CHUNK_SIZE)
+
+
+def changed_books(period, since, now):
+    """Books whose standing in `period` may have changed between `since` and `now`."""
+    changed = set(Book.objects.filter(updated_at__gte=since).values_list("pk", flat=True))
+    start = window_start(period, now)
+    if start is not None:
+        aged_out = Review.objects.filter(created_at__gte=window_start(period, since), created_at__lt=start)
+        changed.update(aged_out.order_by().values_list("book_id", flat=True).distinct())
+    return changed
+
+
+def rebuild_period(period, now):
+    prior = prior_mean(period, now)
+    store(BookRanking, "book", period, book_stats(period, now), prior)
+    store(AuthorRanking, "author", period, author_stats(period, now), prior)
+    return prior
+
+
+def update_period(period, now, prior, book_ids):
+    author_ids = set()
+    for ids in chunks(book_ids):
+        store(BookRanking, "book", period, book_stats(period, now, ids), prior, ids)
+        author_ids.update(Book.objects.filter(pk__in=ids).values_list("author_id", flat=True))
+    for ids in chunks(author_ids):
+        store(AuthorRanking, "author", period, author_stats(period, now, ids), prior, ids)
+    return author_ids
+
+
+def refresh(full=False, now=None):
+    """
+    Bring every leaderboard period up to date. Returns {period: number of books
+    recomputed, or None for a full rebuild}.
+    """
+    now = now or timezone.now()
+    full_before = now - timedelta(seconds=settings.LEADERBOARD_FULL_REFRESH_INTERVAL)
+    states = RankingPeriod.objects.in_bulk(list(settings.LEADERBOARD_PERIODS))
+    refreshed = {}
+
+    for period in settings.LEADERBOARD_PERIODS:
+        state = states.get(period)
+        with transaction.atomic():
+            if full or state is None or state.full_refreshed_at <= full_before:
+                prior = rebuild_period(period, now)
+                RankingPeriod.objects.update_or_create(name=period, defaults={
+                    "prior_mean": prior, "refreshed_at": now, "full_refreshed_at": now,
+                })
+                refreshed[period] = None
+            else:
+                book_ids = changed_books(period, state.refreshed_at - OVERLAP, now)
+                update_period(period, now, state.prior_mean, book_ids)
+                RankingPeriod.objects.filter(name=period).update(refreshed_at=now)
+                refreshed[period] = len(book_ids)
+
+    catalogue_bulk_changed.send(sender=BookRanking, models=[BookRanking, AuthorRanking])
+    return refreshed
@@ -0,0 +1,237 @@
+"""
+Full-text search over books and authors.
+
+SQLite uses the FTS5 table `books_search_index`. Saves are indexed by background tasks
+(see books.tasks), deletes are removed right away by the receivers below.
+Rows are keyed by rowid = 2 * pk + kind (0 for books, 1 for authors), so syncing one
+object is a rowid lookup rather than a scan. PostgreSQL builds tsvectors at query time,
+any other backend falls back to `icontains` matching without ranking.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Author, Book
+
+
+KINDS = ("book", "author")
+
+SearchHit = namedtuple("SearchHit", ["kind", "object", "score"])
+
+
+def tokenize(query):
+    return re.findall(r"\w+", query.lower())
+
+
+class SearchBackend:
+    """ORM based matching, every term must appear in one of the searched fields."""
+
+    book_fields = ["title", "ISBN", "description", "author__name", "author__last_name"]
+    author_fields = ["name", "last_name", "bio"]
+
+    def index_book(self, book):
+        pass
+
+    def index_author(self, author):
+        pass
+
+    def index_many(self, books=(), authors=()):
+        pass
+
+    def remove(self, kind, pk):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def _filter(self, fields, terms):
+        condition = Q()
+        for term in terms:
+            condition &= Q(*[Q(**{f"{field}__icontains": term}) for field in fields], _connector=Q.OR)
+        return condition
+
+    def book_hits(self, query):
+        return (Book.objects.filter(self._filter(self.book_fields, tokenize(query)))
+                .annotate(kind=Value("book"), score=Value(1.0, output_field=FloatField())))
+
+    def author_hits(self, query):
+        return (Author.objects.filter(self._filter(self.author_fields, tokenize(query)))
+                .annotate(kind=Value("author"), score=Value(1.0, output_field=FloatField())))
+
+    def _hits_queryset(self, query, kind):
+        querysets = []
+        if kind in (None, "book"):
+            querysets.append(self.book_hits(query).values_list("kind", "id", "score"))
+        if kind in (None, "author"):
+            querysets.append(self.author_hits(query).values_list("kind", "id", "score"))
+        hits = querysets[0].union(*querysets[1:]) if len(querysets) > 1 else querysets[0]
+        return hits.order_by("-score", "kind", "id")
+
+    def count(self, query, kind=None):
+        return self._hits_queryset(query, kind).count()
+
+    def hits(self, query, kind, start, stop):
+        """(kind, pk, score) tuples ranked best first."""
+        return list(self._hits_queryset(query, kind)[start:stop])
+
+
+class PostgresSearchBackend(SearchBackend):
+    def book_hits(self, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = (SearchVector("title", "ISBN", weight="A")
+                  + SearchVector("author__name", "author__last_name", weight="B")
+                  + SearchVector("description", weight="C"))
+        search_query = SearchQuery(query, search_type="websearch")
+        return (Book.objects.annotate(document=vector).filter(document=search_query)
+                .annotate(kind=Value("book"), score=SearchRank(vector, search_query)))
+
+    def author_hits(self, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = SearchVector("name", "last_name", weight="A") + SearchVector("bio", weight="C")
+        search_query = SearchQuery(query, search_type="websearch")
+        return (Author.objects.annotate(document=vector).filter(document=search_query)
+                .annotate(kind=Value("author"), score=SearchRank(vector, search_query)))
+
+
+class SQLiteSearchBackend(SearchBackend):
+    table = "books_search_index"
+
+    # bm25 weights for title, isbn, people, description.
+    weights = (10.0, 5.0, 4.0, 1.0)
+
+    create_sql = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        "title, isbn, people, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    optimize_sql = "INSERT INTO {table}({table}) VALUES ('optimize')"
+    insert_sql = "INSERT INTO {table}(rowid, title, isbn, people, description) VALUES (%s, %s, %s, %s, %s)"
+
+    def match_expression(self, query):
+        return " ".join(f'"{term}"*' for term in tokenize(query))
+
+    def _where(self, kind):
+        if kind is None:
+            return f"{self.table} MATCH %s"
+        return f"{self.table} MATCH %s AND rowid %% 2 = {KINDS.index(kind)}"
+
+    def hits_sql(self, kind=None):
+        weights = ", ".join(str(weight) for weight in self.weights)
+        return (f"SELECT rowid, -bm25({self.table}, {weights}) AS score FROM {self.table} "
+                f"WHERE {self._where(kind)} ORDER BY bm25({self.table}, {weights}) LIMIT %s OFFSET %s")
+
+    def count(self, query, kind=None):
+        match = self.match_expression(query)
+        if not match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {self.table} WHERE {self._where(kind)}", [match])
+            return cursor.fetchone()[0]
+
+    def hits(self, query, kind, start, stop):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(self.hits_sql(kind), [match, stop - start, start])
+            return [(KINDS[rowid % 2], rowid // 2, score) for rowid, score in cursor.fetchall()]
+
+    def _replace(self, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(self.insert_sql.format(table=self.table), rows)
+
+    def book_row(self, book, author):
+        return (2 * book.pk, book.title, f"{book.ISBN} {book.ISBN.replace('-', '')}",
+                f"{author.name} {author.last_name}", book.description or "")
+
+    def author_row(self, author):
+        return (2 * author.pk + 1, f"{author.name} {author.last_name}", "", "", author.bio or "")
+
+    def index_book(self, book):
+        self._replace([self.book_row(book, book.author)])
+
+    def index_author(self, author):
+        books = Book.objects.filter(author=author).only("id", "title", "ISBN", "description")
+        self._replace([self.author_row(author)] + [self.book_row(book, author) for book in books])
+
+    def index_many(self, books=(), authors=()):
+        """Index freshly bulk created rows; each book must have its author instance attached."""
+        rows = [self.author_row(author) for author in authors]
+        rows += [self.book_row(book, book.author) for book in books]
+        if rows:
+            self._replace(rows)
+
+    def remove(self, kind, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [2 * pk + KINDS.index(kind)])
+
+    def rebuild(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table}(rowid, title, isbn, people, description) "
+                "SELECT 2 * b.id, b.title, b.ISBN || ' ' || replace(b.ISBN, '-', ''), "
+                "a.name || ' ' || a.last_name, coalesce(b.description, '') "
+                "FROM books_book b JOIN books_author a ON a.id = b.author_id"
+            )
+            cursor.execute(
+                f"INSERT INTO {self.table}(rowid, title, isbn, people, description) "
+                "SELECT 2 * id + 1, name || ' ' || last_name, '', '', coalesce(bio, '') FROM books_author"
+            )
+            cursor.execute(self.optimize_sql.format(table=self.table))
+            cursor.execute(f"SELECT count(*) FROM {self.table}")
+            return cursor.fetchone()[0]
+
+
+def get_backend():
+    if connection.vendor == "sqlite":
+        return SQLiteSearchBackend()
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return SearchBackend()
+
+
+class SearchResults:
+    """
+    Lazy ranked result set. Supports count() and slicing, so it can be handed to a
+    paginator; each slice costs one ranked query plus one query per result kind.
+    """
+
+    def __init__(self, query, kind=None, backend=None):
+        self.query = query
+        self.kind = kind
+        self.backend = backend or get_backend()
+
+    def count(self):
+        return self.backend.count(self.query, self.kind)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        hits = self.backend.hits(self.query, self.kind, index.start or 0, index.stop)
+
+        ids = {kind: [pk for hit_kind, pk, _ in hits if hit_kind == kind] for kind in KINDS}
+        objects = {
+            "book": Book.objects.select_related("author").in_bulk(ids["book"]) if ids["book"] else {},
+            "author": Author.objects.in_bulk(ids["author"]) if ids["author"] else {},
+        }
+        return [SearchHit(kind, objects[kind][pk], score) for kind, pk, score in hits if pk in objects[kind]]
+
+
+@receiver(post_delete, sender=Book)
+def remove_book(sender, instance, **kwargs):
+    get_backend().remove("book", instance.pk)
+
+
+@receiver(post_delete, sender=Author)
+def remove_author(sender, instance, **kwargs):
+    get_backend().remove("author", instance.pk)
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+
+# Sent after bulk writes that bypass Model.save (and so post_save), with the
+# affected model classes as `models` and, for review writes and rating rebuilds,
+# the ids of the books whose reviews or aggregates changed as `book_ids`.
+catalogue_bulk_changed = Signal()
@@ -0,0 +1,71 @@
+"""Background tasks for the catalogue and the post_save receivers that enqueue them."""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from tasks.queue import task
+
+from . import rankings
+from .images import generate_variants
+from .models import Author, Book
+from .search import get_backend
+
+
+logger = logging.getLogger(__name__)
+
+MODELS = {"book": Book, "author": Author}
+
+
+@task()
+def generate_image_variants(kind, pk):
+    instance = MODELS[kind].objects.filter(pk=pk).only("image").first()
+    if instance is None or not instance.image:
+        return
+    try:
+        generate_variants(instance.image)
+    except (OSError, ValueError):
+        # A broken upload will not get better on retry; URLs fall back to the original.
+        logger.warning("Could not create derivatives of %s", instance.image.name, exc_info=True)
+
+
+@task()
+def index_for_search(kind, pk):
+    backend = get_backend()
+    if kind == "book":
+        book = Book.objects.select_related("author").filter(pk=pk).first()
+        if book is not None:
+            backend.index_book(book)
+    else:
+        author = Author.objects.filter(pk=pk).first()
+        if author is not None:
+            backend.index_author(author)
+
+
+@task(max_attempts=1)
+def rebuild_book_ratings():
+    Book.objects.rebuild_rating_aggregates()
+
+
+@task(max_attempts=1)
+def refresh_rankings(full=False):
+    rankings.refresh(full=full)
+
+
+def request_rankings_refresh():
+    """Queue a leaderboard refresh unless this process queued one in the last LEADERBOARD_REFRESH_INTERVAL."""
+    if cache.add("books:rankings:refresh-queued", True, timeout=settings.LEADERBOARD_REFRESH_INTERVAL):
+        refresh_rankings.enqueue()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+def enqueue_post_save_work(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    kind = "book" if sender is Book else "author"
+    index_for_search.enqueue(kind, instance.pk)
+    if instance.image:
+        generate_image_variants.enqueue(kind, instance.pk)
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ["name", "status", "attempts", "run_at"]
+    list_filter = ["status"]
+
+
+admin.site.register(Task, TaskAdmin)
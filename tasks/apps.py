@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+
+
+def start_pool(sender, **kwargs):
+    # Started by the first request rather than here: the pool queries the database
+    # right away to recover leftover tasks.
+    if settings.TASKS_MODE == "thread":
+        from .queue import get_executor
+        get_executor()
+        request_started.disconnect(start_pool, dispatch_uid="tasks.start_pool")
+
+
+class TasksConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'tasks'
+
+    def ready(self):
+        request_started.connect(start_pool, dispatch_uid="tasks.start_pool")
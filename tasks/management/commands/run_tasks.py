@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks.queue import run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks. Several workers may run side by side."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run the tasks that are due now, then exit.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                ran = run_pending(limit=options["batch_size"])
+                total += ran
+                if options["once"] and ran < options["batch_size"]:
+                    break
+                if not ran:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Ran {total} tasks."))
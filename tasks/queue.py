@@ -0,0 +1,156 @@
+"""
+Lightweight task queue backed by the `Task` table.
+
+Functions decorated with `@task()` get an `enqueue(*args, **kwargs)` method; arguments
+must be JSON serializable. What happens next depends on `settings.TASKS_MODE`:
+
+- "thread": the row is handed to a thread pool inside this process once the current
+  transaction commits. Retries wait on timers of that process, so when the pool starts
+  (on the first request, see TasksConfig) it also picks up the rows an earlier process
+  left behind: due and stale rows at once, the others as they come due.
+- "worker": the row waits for `manage.py run_tasks`.
+- "immediate": the function runs inline and no row is written.
+
+Claiming a row is a conditional UPDATE, so any number of threads and worker processes
+can share the table. Failures are retried with exponential backoff up to
+`max_attempts`, after which the row is kept with status "failed".
+"""
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from .models import Task
+
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = timedelta(minutes=10)
+RETRY_DELAY = 2
+
+_registry = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def task(name=None, max_attempts=3):
+    def decorator(func):
+        func.task_name = name or f"{func.__module__}.{func.__name__}"
+        func.max_attempts = max_attempts
+        func.enqueue = lambda *args, **kwargs: enqueue(func, *args, **kwargs)
+        _registry[func.task_name] = func
+        return func
+    return decorator
+
+
+def enqueue(func, *args, **kwargs):
+    if settings.TASKS_MODE == "immediate":
+        func(*args, **kwargs)
+        return None
+
+    queued = Task.objects.create(name=func.task_name, args=list(args), kwargs=kwargs, max_attempts=func.max_attempts)
+    if settings.TASKS_MODE == "thread":
+        transaction.on_commit(lambda: submit(queued.pk))
+    return queued
+
+
+def run_task(task_id):
+    """Claim and run one due task. Returns the retry delay in seconds if it was rescheduled."""
+    now = timezone.now()
+    claimed = Task.objects.filter(pk=task_id, status=Task.QUEUED, run_at__lte=now).update(
+        status=Task.RUNNING, locked_until=now + LOCK_TIMEOUT, attempts=F("attempts") + 1,
+    )
+    if not claimed:
+        return None
+
+    queued = Task.objects.get(pk=task_id)
+    try:
+        func = _registry[queued.name]
+        func(*queued.args, **queued.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if queued.attempts < queued.max_attempts:
+            delay = RETRY_DELAY ** queued.attempts
+            Task.objects.filter(pk=task_id).update(
+                status=Task.QUEUED, run_at=timezone.now() + timedelta(seconds=delay), locked_until=None, last_error=error,
+            )
+            return delay
+        logger.error("Task %s (%s) failed after %s attempts", queued.name, task_id, queued.attempts)
+        Task.objects.filter(pk=task_id).update(status=Task.FAILED, locked_until=None, last_error=error)
+        return None
+
+    Task.objects.filter(pk=task_id).delete()
+    return None
+
+
+def run_pending(limit=100):
+    """Run due tasks in this thread, releasing rows whose worker died mid-task first. Returns how many ran."""
+    now = timezone.now()
+    Task.objects.filter(status=Task.RUNNING, locked_until__lt=now).update(status=Task.QUEUED, locked_until=None)
+
+    due = list(Task.objects.filter(status=Task.QUEUED, run_at__lte=now).order_by("run_at").values_list("pk", flat=True)[:limit])
+    for task_id in due:
+        run_task(task_id)
+    return len(due)
+
+
+def next_leftover_at(started):
+    """When the next row created before `started` is due or stale, or None when none is left."""
+    leftovers = Task.objects.filter(created_at__lt=started)
+    due = leftovers.filter(status=Task.QUEUED).aggregate(at=Min("run_at"))["at"]
+    stale = leftovers.filter(status=Task.RUNNING).aggregate(at=Min("locked_until"))["at"]
+    return min(filter(None, [due, stale]), default=None)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.TASKS_THREADS, thread_name_prefix="tasks")
+            _executor.submit(_recover_in_thread, timezone.now())
+        return _executor
+
+
+def submit(task_id):
+    get_executor().submit(_run_in_thread, task_id)
+
+
+def schedule(delay, func, *args):
+    timer = threading.Timer(delay, func, args=args)
+    timer.daemon = True
+    timer.start()
+
+
+def _run_in_thread(task_id):
+    try:
+        delay = run_task(task_id)
+    except Exception:
+        logger.exception("Task %s could not be run", task_id)
+        delay = None
+    finally:
+        connection.close()
+
+    if delay is not None:
+        schedule(delay, submit, task_id)
+
+
+def _recover_in_thread(started):
+    try:
+        run_pending()
+        next_at = next_leftover_at(started)
+    except Exception:
+        logger.exception("Leftover tasks could not be recovered")
+        next_at = None
+    finally:
+        connection.close()
+
+    if next_at is not None:
+        delay = max((next_at - timezone.now()).total_seconds(), 0) + 1
+        schedule(delay, lambda: get_executor().submit(_recover_in_thread, started))
@@ -0,0 +1,99 @@
+import time
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .models import Task
+from .queue import run_pending, task
+
+
+calls = []
+
+
+@task(name="tasks.tests.record")
+def record(value):
+    calls.append(value)
+
+
+@task(name="tasks.tests.flaky", max_attempts=2)
+def flaky():
+    calls.append("flaky")
+    raise RuntimeError("boom")
+
+
+@override_settings(TASKS_MODE="worker")
+class WorkerQueueTests(TestCase):
+    def setUp(self) -> None:
+        calls.clear()
+
+    def test_enqueued_task_runs_and_is_removed(self):
+        queued = record.enqueue("hello")
+
+        self.assertEqual(queued.name, "tasks.tests.record")
+        self.assertEqual(calls, [])
+
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, ["hello"])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failing_task_is_retried_then_marked_failed(self):
+        queued = flaky.enqueue()
+
+        run_pending()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.QUEUED)
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn("RuntimeError: boom", queued.last_error)
+
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        run_pending()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertEqual(queued.attempts, 2)
+        self.assertEqual(calls, ["flaky", "flaky"])
+
+    def test_stale_running_task_is_released(self):
+        Task.objects.create(name="tasks.tests.record", args=["stale"], status=Task.RUNNING,
+                            locked_until=timezone.now() - timedelta(seconds=1))
+
+        run_pending()
+
+        self.assertEqual(calls, ["stale"])
+
+    @override_settings(TASKS_MODE="immediate")
+    def test_immediate_mode_runs_inline(self):
+        self.assertIsNone(record.enqueue("now"))
+        self.assertEqual(calls, ["now"])
+        self.assertFalse(Task.objects.exists())
+
+
+@override_settings(TASKS_MODE="thread")
+class ThreadQueueTests(TransactionTestCase):
+    def test_task_runs_in_pool_after_commit(self):
+        calls.clear()
+        record.enqueue("threaded")
+
+        deadline = time.monotonic() + 5
+        while Task.objects.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.assertEqual(calls, ["threaded"])
+
+    def test_pool_recovers_leftover_tasks(self):
+        # Rows of a process that stopped: due, stuck running, and waiting for a retry.
+        calls.clear()
+        now = timezone.now()
+        Task.objects.create(name="tasks.tests.record", args=["due"])
+        Task.objects.create(name="tasks.tests.record", args=["stale"], status=Task.RUNNING,
+                            locked_until=now - timedelta(seconds=1))
+        Task.objects.create(name="tasks.tests.record", args=["retry"], run_at=now + timedelta(milliseconds=500))
+
+        queue._recover_in_thread(timezone.now())
+        self.assertCountEqual(calls, ["due", "stale"])
+
+        deadline = time.monotonic() + 5
+        while Task.objects.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertCountEqual(calls, ["due", "stale", "retry"])